@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'user',
     'rental_unit',
@@ -95,6 +96,31 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/ref/settings/#caches
+# every worker process must share the cache, cached listing responses and
+# their invalidation rely on it: Redis when REDIS_URL is set, otherwise a
+# database table created with python manage.py createcachetable
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -144,11 +170,16 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CursorPagination',
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
+# optional in process search index of rental units, see rental_unit/listing_index.py
+LISTING_INDEX_ENABLED = os.environ.get('LISTING_INDEX_ENABLED') == '1'
+LISTING_INDEX_SNAPSHOT = os.environ.get('LISTING_INDEX_SNAPSHOT', '')
+
 
 STRIPE_SECRET_KEY = 'sk_test_51NL7quGUEUxNYBQMBDjg15i1SvVAOsN4oo3EXJLqZ7luTuKunfXC5ggM6HdMA7zxR5gAgfXf1mGoKSubJaY9zMSg00aFkSvYla'
\ No newline at end of file
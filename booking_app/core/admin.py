@@ -55,7 +55,9 @@ admin.site.register(models.Guidebook)
 admin.site.register(models.Place)
 admin.site.register(models.ReservationRequest)
 admin.site.register(models.Reservation)
+admin.site.register(models.LineItem)
 admin.site.register(models.CancellationRequest)
 admin.site.register(models.ChangeRequest)
 admin.site.register(models.Photo)
 admin.site.register(models.Payment)
+admin.site.register(models.Refund)
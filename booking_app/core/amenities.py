@@ -0,0 +1,87 @@
+"""
+Bit packed amenities of rental units
+
+Every boolean amenity of AmenitiesList is also stored as one bit of the
+amenity_bits columns, so that "wifi AND pool AND free parking" is a
+bitwise AND on a few narrow integer columns instead of a wide multi column
+WHERE. Bits are assigned in the declaration order of the boolean fields,
+new amenities must be declared after the existing ones.
+"""
+from functools import lru_cache, reduce
+
+from django.db.models import BooleanField, F, Q
+
+
+BITS_PER_COLUMN = 63
+BIT_COLUMNS = ('amenity_bits_0', 'amenity_bits_1', 'amenity_bits_2')
+
+
+@lru_cache(maxsize=None)
+def amenity_fields(model):
+    """return the names of the boolean amenity fields of a model, in bit order"""
+    return tuple(field.name for field in model._meta.concrete_fields if isinstance(field, BooleanField))
+
+
+def _count_bits(bits):
+    """return the number of bits set in an integer"""
+    return bin(bits).count('1')
+
+
+# int.bit_count is only available from Python 3.10
+popcount = getattr(int, 'bit_count', _count_bits)
+
+
+def _bit(index):
+    """return the (column, bit value) of an amenity index"""
+    return index // BITS_PER_COLUMN, 1 << (index % BITS_PER_COLUMN)
+
+
+def pack(fields, values):
+    """return the amenity bit columns of a mapping of amenity names to booleans"""
+    bits = [0] * len(BIT_COLUMNS)
+    for index, name in enumerate(fields):
+        if values.get(name):
+            column, bit = _bit(index)
+            bits[column] |= bit
+    return bits
+
+
+def pack_instance(instance):
+    """return the amenity bit columns of an AmenitiesList"""
+    fields = amenity_fields(type(instance))
+    return pack(fields, {name: getattr(instance, name) for name in fields})
+
+
+def unpack(fields, bits):
+    """return the names of the amenities enabled in amenity bit columns"""
+    enabled = []
+    for index, name in enumerate(fields):
+        column, bit = _bit(index)
+        if bits[column] & bit:
+            enabled.append(name)
+    return enabled
+
+
+def masks(fields, names):
+    """return the bit masks per column of amenity names, raise ValueError for unknown names"""
+    indexes = {name: index for index, name in enumerate(fields)}
+    bits = [0] * len(BIT_COLUMNS)
+    for name in names:
+        if name not in indexes:
+            raise ValueError(name)
+        column, bit = _bit(indexes[name])
+        bits[column] |= bit
+    return bits
+
+
+def with_amenities(queryset, bits, prefix=''):
+    """narrow a queryset to the rows having every amenity of bit masks"""
+    conditions = []
+    for column, mask in zip(BIT_COLUMNS, bits):
+        if mask:
+            alias = f'{column}_matched'
+            queryset = queryset.alias(**{alias: F(f'{prefix}{column}').bitand(mask)})
+            conditions.append(Q(**{alias: mask}))
+    if not conditions:
+        return queryset
+    return queryset.filter(reduce(lambda a, b: a & b, conditions))
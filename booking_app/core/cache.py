@@ -0,0 +1,62 @@
+"""
+Cache helpers for listing data
+
+Cached listing responses are keyed with the generations of the data they
+are built from: the tables of one rental unit for its listing page, the
+searchable tables of every rental unit for facets and map clusters, the
+calendars for availability searches and places for nearby places. A
+change replaces only the generations of the data it touches, so stale
+entries are never read and simply expire while unrelated ones are kept.
+Generations are random tokens rather than counters so that an evicted
+generation can never bring back entries of an older one. The cache must
+be shared by every worker process, see CACHES in the settings.
+"""
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+
+
+SEARCH = 'search'
+CALENDAR = 'calendar'
+PLACES = 'places'
+DEFAULT_TIMEOUT = 300
+
+
+def rental_unit_scope(rental_unit_id):
+    """return the scope of the listing tables of one rental unit"""
+    return f'unit:{rental_unit_id}'
+
+
+def _generation_key(scope):
+    return f'listings:generation:{scope}'
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def generations(scopes):
+    """return the current generation of scopes of listing data"""
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_generations(scopes):
+    """invalidate the cached listing responses built from scopes of listing data"""
+    if scopes:
+        cache.set_many({_generation_key(scope): _new_generation() for scope in scopes}, timeout=None)
+
+
+def listing_cache_key(prefix, params=None, scopes=(SEARCH,)):
+    """return a cache key for a listing response, the generations it depends on and its parameters"""
+    digest = hashlib.md5(
+        json.dumps(params or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'listings:{":".join(generations(scopes))}:{prefix}:{digest}'
@@ -0,0 +1,198 @@
+"""
+Cancellation policies of rental units
+
+The refund of a cancellation is a fraction of the reservation total that
+depends on the Rulebook.cancellation_policy of the rental unit, the
+number of days left before check in and the number of days since the
+reservation was made.
+
+Policies are declared as tier tables. Each tier gives the refund for a
+cancellation made at least `min_days` before check in, optionally only
+when the reservation was booked less than `booked_within` days ago. The
+first matching tier wins and no match means no refund. Long term
+policies only apply to stays of `min_nights` or more, shorter stays fall
+back to `short_stay_policy`.
+
+The tables are compiled into one NumPy array of refunds indexed by
+policy, recent booking and days before check in, so that evaluate_batch
+evaluates many reservations with array indexing instead of a loop.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+
+from core import money
+
+
+Tier = namedtuple('Tier', ['min_days', 'refund', 'booked_within'])
+Policy = namedtuple('Policy', ['tiers', 'min_nights', 'short_stay_policy'])
+
+FULL = Decimal('1')
+HALF = Decimal('0.5')
+NONE = Decimal('0')
+LONG_TERM_NIGHTS = 28
+GRACE_DAYS = 2
+
+
+def tier(min_days, refund, booked_within=None):
+    """declare a refund tier of a policy"""
+    return Tier(min_days, refund, booked_within)
+
+
+def policy(*tiers, min_nights=0, short_stay_policy=None):
+    """declare a policy from its tiers, the first matching tier wins"""
+    return Policy(tiers, min_nights, short_stay_policy)
+
+
+POLICIES = {
+    'Flexible': policy(
+        tier(1, FULL),
+    ),
+    'Moderate': policy(
+        tier(5, FULL),
+        tier(1, HALF),
+    ),
+    'Firm': policy(
+        tier(30, FULL),
+        tier(14, FULL, booked_within=GRACE_DAYS),
+        tier(7, HALF),
+    ),
+    'Strict': policy(
+        tier(14, FULL, booked_within=GRACE_DAYS),
+        tier(7, HALF),
+    ),
+    'Firm Long Term': policy(
+        tier(30, FULL),
+        min_nights=LONG_TERM_NIGHTS,
+        short_stay_policy='Firm',
+    ),
+    'Strict Long Term': policy(
+        tier(28, FULL, booked_within=GRACE_DAYS),
+        min_nights=LONG_TERM_NIGHTS,
+        short_stay_policy='Strict',
+    ),
+    'Super Strict 30': policy(
+        tier(30, HALF),
+    ),
+    'Non-refundable': policy(),
+}
+
+RefundPreview = namedtuple(
+    'RefundPreview',
+    ['policy', 'days_before_check_in', 'days_since_booking', 'refund', 'amount']
+)
+
+
+def _compile(tiers, horizon):
+    """
+    return the refunds in basis points of a policy indexed by recent
+    booking and days before check in up to a horizon, the last day applies
+    to every later day
+    """
+    table = np.zeros((2, horizon + 1), dtype=np.int64)
+    for recent in (0, 1):
+        for days in range(horizon + 1):
+            for t in tiers:
+                if days >= t.min_days and (t.booked_within is None or recent):
+                    table[recent, days] = money.to_basis_points(t.refund)
+                    break
+    return table
+
+
+HORIZON = max(t.min_days for p in POLICIES.values() for t in p.tiers)
+POLICY_NAMES = list(POLICIES)
+# the code of every policy, unknown policies get the last code that never refunds
+POLICY_CODES = {name: code for code, name in enumerate(POLICY_NAMES)}
+NO_POLICY = len(POLICY_NAMES)
+REFUNDS = np.stack(
+    [_compile(POLICIES[name].tiers, HORIZON) for name in POLICY_NAMES]
+    + [np.zeros((2, HORIZON + 1), dtype=np.int64)]
+)
+MIN_NIGHTS = np.array([POLICIES[name].min_nights for name in POLICY_NAMES] + [0])
+SHORT_STAY_CODES = np.array(
+    [POLICY_CODES.get(POLICIES[name].short_stay_policy, NO_POLICY) for name in POLICY_NAMES] + [NO_POLICY]
+)
+
+
+def _resolve(codes, nights):
+    """return the codes of the policies that apply to stays of numbers of nights"""
+    # long term policies fall back to another policy, which may fall back again
+    for _ in range(len(POLICY_NAMES)):
+        short = nights < MIN_NIGHTS[codes]
+        if not short.any():
+            break
+        codes = np.where(short, SHORT_STAY_CODES[codes], codes)
+    return codes
+
+
+def evaluate_batch(policies, days_before_check_in, days_since_booking, nights):
+    """
+    return the refunds in basis points of many cancellations
+
+    Every argument is a sequence with one entry per cancellation, policies
+    may also be a single policy name applied to all of them.
+    """
+    days = np.asarray(days_before_check_in, dtype=np.int64)
+    if isinstance(policies, str):
+        codes = np.full(len(days), POLICY_CODES.get(policies, NO_POLICY))
+    else:
+        codes = np.fromiter((POLICY_CODES.get(name, NO_POLICY) for name in policies), dtype=np.intp, count=len(days))
+    codes = _resolve(codes, np.asarray(nights, dtype=np.int64))
+    recent = np.asarray(days_since_booking, dtype=np.int64) < GRACE_DAYS
+
+    refunds = REFUNDS[codes, recent.astype(np.intp), np.clip(days, 0, HORIZON)]
+    refunds[days <= 0] = 0
+
+    return refunds.tolist()
+
+
+def refund_fraction(policy_name, days_before_check_in, days_since_booking, nights):
+    """return the refunded fraction of a reservation cancelled under a policy"""
+    refund = evaluate_batch(policy_name, [days_before_check_in], [days_since_booking], [nights])[0]
+    return money.from_basis_points(refund)
+
+
+def reservation_nights(reservation):
+    """return the nights of a reservation, counting them from the dates if needed"""
+    if reservation.nights is not None:
+        return reservation.nights
+    return (reservation.check_out - reservation.check_in).days
+
+
+def evaluate_reservations(reservations, policies, cancellation_dates):
+    """
+    return (refund basis points, refund amount in cents) for each of a
+    list of reservations cancelled under policies on cancellation dates,
+    policies and cancellation_dates may be sequences or single values
+    """
+    if not isinstance(cancellation_dates, (list, tuple)):
+        cancellation_dates = [cancellation_dates] * len(reservations)
+
+    refunds = evaluate_batch(
+        policies,
+        [(r.check_in - d).days for r, d in zip(reservations, cancellation_dates)],
+        [(d - r.creation_date.date()).days for r, d in zip(reservations, cancellation_dates)],
+        [reservation_nights(r) for r in reservations],
+    )
+    amounts = [
+        money.apply_rate(money.to_cents(r.total), refund)
+        for r, refund in zip(reservations, refunds)
+    ]
+
+    return list(zip(refunds, amounts))
+
+
+def preview_refund(reservation, policy_name, cancellation_date):
+    """return the refund a reservation would get if it were cancelled on a date"""
+    days_before_check_in = (reservation.check_in - cancellation_date).days
+    days_since_booking = (cancellation_date - reservation.creation_date.date()).days
+    refund, amount = evaluate_reservations([reservation], policy_name, cancellation_date)[0]
+
+    return RefundPreview(
+        policy=policy_name,
+        days_before_check_in=days_before_check_in,
+        days_since_booking=days_since_booking,
+        refund=money.from_basis_points(refund),
+        amount=money.from_cents(amount),
+    )
@@ -0,0 +1,45 @@
+"""
+Capacity of rental units aggregated from their rooms
+
+The bedrooms, beds and baths of a rental unit are stored on RentalUnit
+and indexed, so that searching for a number of bedrooms is an index
+lookup instead of a join counting rooms. They are recomputed by signals
+whenever a room of the unit changes. A half bathroom counts as half a
+bath.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from core.models import RentalUnit, Room
+
+
+BEDROOM = 'Bedroom'
+FULL_BATHROOM = 'Bathroom (full)'
+HALF_BATHROOM = 'Bathroom (half)'
+
+
+def capacities(rooms):
+    """return the (bedrooms, beds, baths) per rental unit of a Room queryset"""
+    rows = rooms.order_by().values('rental_unit').annotate(
+        bedrooms=Count('id', filter=Q(room_type=BEDROOM)),
+        beds=Sum('beds'),
+        full_baths=Count('id', filter=Q(room_type=FULL_BATHROOM)),
+        half_baths=Count('id', filter=Q(room_type=HALF_BATHROOM)),
+    )
+    return {
+        row['rental_unit']: (
+            row['bedrooms'],
+            row['beds'] or 0,
+            row['full_baths'] + Decimal('0.5') * row['half_baths'],
+        )
+        for row in rows
+    }
+
+
+def update_capacity(rental_unit_ids):
+    """recompute the bedrooms, beds and baths of rental units from their rooms"""
+    counts = capacities(Room.objects.filter(rental_unit_id__in=rental_unit_ids))
+    for rental_unit_id in rental_unit_ids:
+        bedrooms, beds, baths = counts.get(rental_unit_id, (0, 0, 0))
+        RentalUnit.objects.filter(id=rental_unit_id).update(bedrooms=bedrooms, beds=beds, baths=baths)
@@ -0,0 +1,86 @@
+"""
+Full text search of rental units
+
+Every rental unit stores a weighted tsvector of its listing text in
+RentalUnit.search_vector, indexed with GIN. The vector is rebuilt by
+signals whenever the rental unit, its location or its guidebook change.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, TextField, Value
+from django.db.models.functions import Cast
+
+from core.models import RentalUnit
+
+
+SEARCH_CONFIG = 'english'
+
+WEIGHTS = (
+    ('title', 'A'),
+    ('location__city', 'A'),
+    ('description', 'B'),
+    ('location__neighborhood_description', 'C'),
+    ('guidebook__house_manual', 'D'),
+)
+
+# a quoted lexeme of the text of a tsvector or tsquery, quotes are doubled
+LEXEME = re.compile(r"'((?:[^']|'')*)'")
+
+
+def _vector(row):
+    """return the weighted search vector of a row of listing text"""
+    vectors = [
+        SearchVector(Value(row[field] or '', output_field=TextField()), weight=weight, config=SEARCH_CONFIG)
+        for field, weight in WEIGHTS
+    ]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+def update_search_vectors(rental_unit_ids):
+    """rebuild the stored search vectors of rental units"""
+    rows = RentalUnit.objects.filter(id__in=rental_unit_ids).values('id', *[field for field, _ in WEIGHTS])
+    for row in rows:
+        RentalUnit.objects.filter(id=row['id']).update(search_vector=_vector(row))
+
+
+def search_query(text):
+    """return the search query of user entered keywords"""
+    return SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def search(queryset, text):
+    """narrow a RentalUnit queryset to the units matching keywords"""
+    return queryset.filter(search_vector=search_query(text))
+
+
+def rank(queryset, text):
+    """annotate a RentalUnit queryset with the rank of its units for keywords"""
+    # a double precision rank reads back exactly from the position of a page cursor
+    return queryset.annotate(rank=Cast(SearchRank(F('search_vector'), search_query(text)), FloatField()))
+
+
+def _lexemes(text):
+    return [lexeme.replace("''", "'") for lexeme in LEXEME.findall(text)]
+
+
+def vector_lexemes(search_vector):
+    """return the lexemes of a stored search vector"""
+    return _lexemes(search_vector or '')
+
+
+def query_lexemes(text):
+    """
+    return the lexemes a search vector must all have to match keywords, None
+    when the keywords also have alternatives, exclusions or phrases
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT websearch_to_tsquery(%s::regconfig, %s)::text', [SEARCH_CONFIG, text])
+        query = cursor.fetchone()[0]
+    if LEXEME.sub('', query).replace('&', '').strip():
+        return None
+    return _lexemes(query)
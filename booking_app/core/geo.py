@@ -0,0 +1,143 @@
+"""
+Geographic helpers
+
+Locations are indexed by geohash: the world is split in a grid of cells
+named by base32 strings, every extra character splits a cell in 32 and
+cells sharing a prefix are inside the same larger cell. A geo search
+first narrows candidates to the cells covering its bounding box with
+indexed prefix lookups and then refines them with the haversine distance.
+"""
+import math
+
+import numpy as np
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+MAX_CELLS = 32
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+MAX_ZOOM = 22
+
+# geohash precision of the map clusters of each zoom level, starting at zoom 0
+ZOOM_PRECISION = (1, 1, 1, 2, 2, 3, 3, 3, 4, 4, 5, 5, 5, 6, 6, 7, 7, 7, 8, 8, 9, 9, 9)
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """return the geohash of a coordinate"""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            coordinate, bounds = longitude, lon_range
+        else:
+            coordinate, bounds = latitude, lat_range
+        middle = (bounds[0] + bounds[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            bounds[0] = middle
+        else:
+            value = value * 2
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """return the (latitude, longitude) size in degrees of the cells of a precision"""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for_zoom(zoom):
+    """return the geohash precision of the map clusters of a zoom level"""
+    return ZOOM_PRECISION[max(0, min(MAX_ZOOM, zoom))]
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _cell_range(low, high, origin, size, limit):
+    """return the indexes of the grid cells of a size covering a range"""
+    first = int((low - origin) // size)
+    last = min(int((high - origin) // size), limit - 1)
+    return range(first, last + 1)
+
+
+def covering_cells(south, west, north, east, max_cells=MAX_CELLS):
+    """
+    return the geohashes of the smallest cells covering a bounding box
+    without using more than max_cells of them
+    """
+    south, north = _clamp(south, -90.0, 90.0), _clamp(north, -90.0, 90.0)
+    west, east = _clamp(west, -180.0, 180.0), _clamp(east, -180.0, 180.0)
+
+    cells = ['']
+    for precision in range(1, PRECISION + 1):
+        lat_size, lon_size = cell_size(precision)
+        rows = _cell_range(south, north, -90.0, lat_size, round(180.0 / lat_size))
+        columns = _cell_range(west, east, -180.0, lon_size, round(360.0 / lon_size))
+        if len(rows) * len(columns) > max_cells:
+            break
+        cells = [
+            encode(-90.0 + (row + 0.5) * lat_size, -180.0 + (column + 0.5) * lon_size, precision)
+            for row in rows
+            for column in columns
+        ]
+
+    return cells
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """return the (south, west, north, east) bounding box of a circle"""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_latitude = math.cos(math.radians(latitude))
+    if cos_latitude < 1e-6:
+        lon_delta = 180.0
+    else:
+        lon_delta = min(radius_km / (KM_PER_DEGREE * cos_latitude), 180.0)
+
+    return (
+        latitude - lat_delta,
+        longitude - lon_delta,
+        latitude + lat_delta,
+        longitude + lon_delta,
+    )
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """return a NumPy array of the haversine distances in km from a coordinate to sequences of coordinates"""
+    lat1 = math.radians(float(latitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64)) - math.radians(float(longitude))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_expression(latitude, longitude, latitude_field, longitude_field):
+    """return a query expression of the haversine distance in km from a coordinate to coordinate fields"""
+    lat1 = math.radians(float(latitude))
+    lat2 = Radians(Cast(F(latitude_field), FloatField()))
+    lon2 = Radians(Cast(F(longitude_field), FloatField()))
+    half_dlat = (lat2 - Value(lat1)) / Value(2.0)
+    half_dlon = (lon2 - Value(math.radians(float(longitude)))) / Value(2.0)
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin(half_dlon), 2)
+
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
@@ -0,0 +1,84 @@
+"""
+Denormalized listing documents of rental units
+
+Searches filter rental units by columns spread over RentalUnit, Location,
+Pricing and AmenitiesList. ListingDocument copies those columns into one
+narrow row per rental unit so that a search joins a single indexed table.
+Text columns are stored lower case so that filters compare them exactly.
+Documents are rebuilt by signals whenever one of their source rows changes
+and can be rebuilt from scratch with the rebuild_listing_documents command.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import RentalUnit, ListingDocument
+
+
+# document field -> RentalUnit lookup of its value
+SOURCES = (
+    ('user_id', 'user_id'),
+    ('title', 'title'),
+    ('unit_type', 'unit_type'),
+    ('status', 'status'),
+    ('max_guests', 'max_guests'),
+    ('city', 'location__city'),
+    ('country', 'location__country'),
+    ('latitude', 'location__latitude'),
+    ('longitude', 'location__longitude'),
+    ('geohash', 'location__geohash'),
+    ('night_price', 'pricing__night_price'),
+    ('amenity_bits_0', 'amenitieslist__amenity_bits_0'),
+    ('amenity_bits_1', 'amenitieslist__amenity_bits_1'),
+    ('amenity_bits_2', 'amenitieslist__amenity_bits_2'),
+)
+
+LOWER_CASE = ('unit_type', 'city', 'country')
+
+
+def document_values(row):
+    """return the document values of a row of SOURCES"""
+    values = {field: row[source] for field, source in SOURCES}
+    for field in LOWER_CASE:
+        values[field] = (values[field] or '').lower()
+    values['geohash'] = values['geohash'] or ''
+    for field in ('amenity_bits_0', 'amenity_bits_1', 'amenity_bits_2'):
+        values[field] = values[field] or 0
+    return values
+
+
+def _rows(rental_unit_ids):
+    return RentalUnit.objects.filter(id__in=rental_unit_ids).values('id', *[source for _, source in SOURCES])
+
+
+def rebuild_documents(rental_unit_ids):
+    """
+    rewrite the listing documents of rental units, creating the missing ones,
+    the ranking columns of existing documents are kept
+    """
+    documents = [ListingDocument(rental_unit_id=row['id'], **document_values(row)) for row in _rows(rental_unit_ids)]
+    existing = set(
+        ListingDocument.objects.filter(rental_unit_id__in=rental_unit_ids).values_list('rental_unit_id', flat=True)
+    )
+    now = timezone.now()
+    for document in documents:
+        document.updated = now
+    with transaction.atomic():
+        ListingDocument.objects.bulk_update(
+            [document for document in documents if document.rental_unit_id in existing],
+            [field for field, _ in SOURCES] + ['updated'],
+            batch_size=500,
+        )
+        ListingDocument.objects.bulk_create(
+            [document for document in documents if document.rental_unit_id not in existing]
+        )
+
+
+def update_documents(rental_unit_ids):
+    """
+    update the existing listing documents of rental units, documents are not
+    created here so that a rental unit being deleted is not given a new one
+    """
+    for row in _rows(rental_unit_ids):
+        ListingDocument.objects.filter(rental_unit_id=row['id']).update(
+            updated=timezone.now(), **document_values(row)
+        )
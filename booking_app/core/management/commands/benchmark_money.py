@@ -0,0 +1,75 @@
+"""
+Django command to benchmark the integer cents money path against Decimal
+"""
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core import money
+
+
+def decimal_report(rows):
+    """sum reservation totals with Decimal arithmetic, for comparison"""
+    total = Decimal(0)
+    for night_price, nights, tax in rows:
+        subtotal = night_price * nights
+        total += (subtotal + (subtotal * tax / 100)).quantize(money.CENT)
+    return total
+
+
+def cents_report(rows):
+    """sum reservation totals with the integer cents money module"""
+    total = 0
+    for night_price, nights, tax in rows:
+        total += money.stay_totals(night_price, nights, tax).total
+    return money.from_cents(total)
+
+
+def cents_report_preconverted(rows):
+    """sum reservation totals when prices and rates are already in minor units"""
+    total = 0
+    for night_price, nights, rate in rows:
+        subtotal = night_price * nights
+        total += subtotal + money.apply_rate(subtotal, rate)
+    return money.from_cents(total)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark money calculations for batch reporting"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        rows = [
+            (
+                Decimal(rng.randint(2000, 90000)) / 100,
+                rng.randint(1, 30),
+                Decimal(rng.randint(0, 2500)) / 100,
+            )
+            for _ in range(options['rows'])
+        ]
+        converted = [
+            (money.to_cents(price), nights, money.tax_rate(tax))
+            for price, nights, tax in rows
+        ]
+
+        benchmarks = (
+            ('decimal', decimal_report, rows),
+            ('cents', cents_report, rows),
+            ('cents (preconverted)', cents_report_preconverted, converted),
+        )
+        for name, report, data in benchmarks:
+            seconds = min(timeit.repeat(
+                lambda: report(data),
+                number=1,
+                repeat=options['repeat'],
+            ))
+            self.stdout.write(
+                f'{name:<22} {len(data)} rows in {seconds * 1000:.1f} ms '
+                f'(sum {report(data)})'
+            )
@@ -0,0 +1,18 @@
+"""
+Django command to update the ranking scores of rental units
+"""
+from django.core.management.base import BaseCommand
+
+from core import ranking
+
+
+class Command(BaseCommand):
+    """Django command to recompute the popularity and recommended scores of every listing document"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = ranking.update_scores(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated the scores of {count} rental units'))
@@ -0,0 +1,22 @@
+"""
+Django command to rebuild the full text search vectors of rental units
+"""
+from django.core.management.base import BaseCommand
+
+from core import fulltext
+from core.models import RentalUnit
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the search vectors of every rental unit"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = list(RentalUnit.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(ids), batch_size):
+            fulltext.update_search_vectors(ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(ids)} rental units'))
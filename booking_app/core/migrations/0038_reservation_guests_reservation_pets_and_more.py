@@ -0,0 +1,56 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:11
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='guests',
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='pets',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='transport',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='guests',
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='pets',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='transport',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='LineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('quantity', models.IntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='core.reservation')),
+            ],
+        ),
+    ]
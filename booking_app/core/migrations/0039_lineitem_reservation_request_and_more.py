@@ -0,0 +1,50 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:14
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_reservation_guests_reservation_pets_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineitem',
+            name='reservation_request',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='core.reservationrequest'),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='night_price',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='nights',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='taxes',
+            field=models.DecimalField(decimal_places=2, max_digits=3, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='reservationrequest',
+            name='total',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AlterField(
+            model_name='lineitem',
+            name='reservation',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='core.reservation'),
+        ),
+    ]
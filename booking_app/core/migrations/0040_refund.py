@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_lineitem_reservation_request_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Refund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('currency', models.CharField(default='usd', max_length=30)),
+                ('status', models.CharField(choices=[('Pending', 'pending'), ('Succeeded', 'succeeded'), ('Failed', 'failed')], default='Pending', max_length=30)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.reservation')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_refund'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentalunit',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='rentalunit',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_rental_search__9871a1_gin'),
+        ),
+        # the same weighted vector as core.fulltext, for the existing rental units
+        migrations.RunSQL(
+            """
+            UPDATE core_rentalunit AS unit SET search_vector =
+                setweight(to_tsvector('english', coalesce(unit.title, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(location.city, '')), 'A')
+                || setweight(to_tsvector('english', coalesce(unit.description, '')), 'B')
+                || setweight(to_tsvector('english', coalesce(location.neighborhood_description, '')), 'C')
+                || setweight(to_tsvector('english', coalesce(guidebook.house_manual, '')), 'D')
+            FROM core_rentalunit AS listing
+            LEFT JOIN core_location AS location ON location.rental_unit_id = listing.id
+            LEFT JOIN core_guidebook AS guidebook ON guidebook.rental_unit_id = listing.id
+            WHERE unit.id = listing.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
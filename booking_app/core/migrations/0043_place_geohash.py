@@ -0,0 +1,63 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+# frozen copy of core.geo.encode as it was when this migration was written
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """return the geohash of a coordinate"""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            coordinate, bounds = longitude, lon_range
+        else:
+            coordinate, bounds = latitude, lat_range
+        middle = (bounds[0] + bounds[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            bounds[0] = middle
+        else:
+            value = value * 2
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def encode_geohashes(apps, schema_editor):
+    Place = apps.get_model('core', 'Place')
+    places = list(Place.objects.all())
+    for place in places:
+        place.geohash = encode(place.latitude, place.longitude)
+    Place.objects.bulk_update(places, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_location_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(encode_geohashes, migrations.RunPython.noop),
+    ]
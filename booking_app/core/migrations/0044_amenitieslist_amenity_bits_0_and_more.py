@@ -0,0 +1,51 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:41
+
+from django.db import migrations, models
+
+
+# frozen copy of the bit layout of core.amenities when this migration was written
+BITS_PER_COLUMN = 63
+BIT_COLUMNS = ('amenity_bits_0', 'amenity_bits_1', 'amenity_bits_2')
+
+
+def pack_amenities(apps, schema_editor):
+    AmenitiesList = apps.get_model('core', 'AmenitiesList')
+    fields = [
+        field.name for field in AmenitiesList._meta.concrete_fields
+        if isinstance(field, models.BooleanField)
+    ]
+    rows = list(AmenitiesList.objects.all())
+    for row in rows:
+        bits = [0] * len(BIT_COLUMNS)
+        for index, name in enumerate(fields):
+            if getattr(row, name):
+                bits[index // BITS_PER_COLUMN] |= 1 << (index % BITS_PER_COLUMN)
+        for column, value in zip(BIT_COLUMNS, bits):
+            setattr(row, column, value)
+    AmenitiesList.objects.bulk_update(rows, list(BIT_COLUMNS), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_place_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amenitieslist',
+            name='amenity_bits_0',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='amenitieslist',
+            name='amenity_bits_1',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='amenitieslist',
+            name='amenity_bits_2',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(pack_amenities, migrations.RunPython.noop),
+    ]
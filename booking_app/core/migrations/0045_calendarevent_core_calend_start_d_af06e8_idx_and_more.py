@@ -0,0 +1,45 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_amenitieslist_amenity_bits_0_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(fields=['-start_date', '-id'], name='core_calend_start_d_af06e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cancellationrequest',
+            index=models.Index(fields=['user', '-creation_date', '-id'], name='core_cancel_user_id_3249f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['user', '-creation_date', '-id'], name='core_change_user_id_5f1f62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fee',
+            index=models.Index(fields=['-rental_unit', '-id'], name='core_fee_rental__d7c9f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['-rental_unit', '-id'], name='core_place_rental__c98bd9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', '-check_in', '-id'], name='core_reserv_user_id_33ed49_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservationrequest',
+            index=models.Index(fields=['-check_in', '-id'], name='core_reserv_check_i_7d6a95_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservationrequest',
+            index=models.Index(fields=['user', '-check_in', '-id'], name='core_reserv_user_id_fb3e2f_idx'),
+        ),
+    ]
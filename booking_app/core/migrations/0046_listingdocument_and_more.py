@@ -0,0 +1,90 @@
+# Generated by Django 4.0.10 on 2026-10-19 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# frozen copy of the document columns of core.listing_documents when this
+# migration was written: document field -> RentalUnit lookup of its value
+SOURCES = (
+    ('user_id', 'user_id'),
+    ('title', 'title'),
+    ('unit_type', 'unit_type'),
+    ('status', 'status'),
+    ('max_guests', 'max_guests'),
+    ('city', 'location__city'),
+    ('country', 'location__country'),
+    ('latitude', 'location__latitude'),
+    ('longitude', 'location__longitude'),
+    ('geohash', 'location__geohash'),
+    ('night_price', 'pricing__night_price'),
+    ('amenity_bits_0', 'amenitieslist__amenity_bits_0'),
+    ('amenity_bits_1', 'amenitieslist__amenity_bits_1'),
+    ('amenity_bits_2', 'amenitieslist__amenity_bits_2'),
+)
+LOWER_CASE = ('unit_type', 'city', 'country')
+
+
+def document_values(row):
+    values = {field: row[source] for field, source in SOURCES}
+    for field in LOWER_CASE:
+        values[field] = (values[field] or '').lower()
+    values['geohash'] = values['geohash'] or ''
+    for field in ('amenity_bits_0', 'amenity_bits_1', 'amenity_bits_2'):
+        values[field] = values[field] or 0
+    return values
+
+
+def build_listing_documents(apps, schema_editor):
+    RentalUnit = apps.get_model('core', 'RentalUnit')
+    ListingDocument = apps.get_model('core', 'ListingDocument')
+    rows = RentalUnit.objects.values('id', *[source for _, source in SOURCES])
+    ListingDocument.objects.bulk_create(
+        [ListingDocument(rental_unit_id=row['id'], **document_values(row)) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_calendarevent_core_calend_start_d_af06e8_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDocument',
+            fields=[
+                ('rental_unit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.rentalunit')),
+                ('title', models.CharField(max_length=255)),
+                ('unit_type', models.CharField(max_length=30)),
+                ('status', models.BooleanField()),
+                ('max_guests', models.IntegerField()),
+                ('city', models.CharField(blank=True, max_length=1024)),
+                ('country', models.CharField(blank=True, max_length=3)),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9, null=True)),
+                ('geohash', models.CharField(blank=True, db_index=True, max_length=12)),
+                ('night_price', models.DecimalField(decimal_places=2, max_digits=8, null=True)),
+                ('amenity_bits_0', models.BigIntegerField(default=0)),
+                ('amenity_bits_1', models.BigIntegerField(default=0)),
+                ('amenity_bits_2', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['city', 'night_price'], name='core_listin_city_53475f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['night_price'], name='core_listin_night_p_2b8901_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['max_guests'], name='core_listin_max_gue_6b885a_idx'),
+        ),
+        migrations.RunPython(build_listing_documents, migrations.RunPython.noop),
+    ]
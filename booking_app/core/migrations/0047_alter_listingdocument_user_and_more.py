@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_listingdocument_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingdocument',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['country', 'city'], name='core_listin_country_fd75e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['unit_type', 'night_price'], name='core_listin_unit_ty_b4616d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['status', 'night_price'], name='core_listin_status_5801da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['user', 'status'], name='core_listin_user_id_dfc062_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_alter_listingdocument_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingdocument',
+            name='popularity_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listingdocument',
+            name='recommended_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listingdocument',
+            name='reservation_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listingdocument',
+            name='view_count',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['-popularity_score', '-rental_unit'], name='core_listin_popular_1e5dd4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdocument',
+            index=models.Index(fields=['-recommended_score', '-rental_unit'], name='core_listin_recomme_4caf04_idx'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:12
+
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+import django.db.models.deletion
+
+
+# frozen copy of the room types core.capacity counts when this migration was written
+BEDROOM = 'Bedroom'
+FULL_BATHROOM = 'Bathroom (full)'
+HALF_BATHROOM = 'Bathroom (half)'
+
+
+def aggregate_capacity(apps, schema_editor):
+    RentalUnit = apps.get_model('core', 'RentalUnit')
+    Room = apps.get_model('core', 'Room')
+    rows = Room.objects.filter(rental_unit__isnull=False).order_by().values('rental_unit').annotate(
+        bedrooms=models.Count('id', filter=models.Q(room_type=BEDROOM)),
+        beds=models.Sum('beds'),
+        full_baths=models.Count('id', filter=models.Q(room_type=FULL_BATHROOM)),
+        half_baths=models.Count('id', filter=models.Q(room_type=HALF_BATHROOM)),
+    )
+    units = [
+        RentalUnit(
+            id=row['rental_unit'],
+            bedrooms=row['bedrooms'],
+            beds=row['beds'] or 0,
+            baths=row['full_baths'] + Decimal('0.5') * row['half_baths'],
+        )
+        for row in rows
+    ]
+    RentalUnit.objects.bulk_update(units, ['bedrooms', 'beds', 'baths'], batch_size=1000)
+
+
+def check_single_rooms(apps, schema_editor):
+    """rooms can only be keyed by their rental unit again while every unit has at most one"""
+    Room = apps.get_model('core', 'Room')
+    shared = Room.objects.order_by().values('rental_unit').annotate(count=models.Count('id')).filter(count__gt=1)
+    if Room.objects.filter(rental_unit__isnull=True).exists() or shared.exists():
+        raise IrreversibleError('Some rental units have several rooms or some rooms have no rental unit.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_listingdocument_popularity_score_and_more'),
+    ]
+
+    operations = [
+        # rooms were keyed by their rental unit, give them their own id
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        'ALTER TABLE core_room DROP CONSTRAINT core_room_pkey',
+                        'ALTER TABLE core_room ALTER COLUMN rental_unit_id DROP NOT NULL',
+                        'ALTER TABLE core_room ADD COLUMN id bigserial NOT NULL PRIMARY KEY',
+                        'CREATE INDEX core_room_rental_unit_id_eb4f09ca ON core_room (rental_unit_id)',
+                    ],
+                    reverse_sql=[
+                        'DROP INDEX core_room_rental_unit_id_eb4f09ca',
+                        'ALTER TABLE core_room DROP COLUMN id',
+                        'ALTER TABLE core_room ALTER COLUMN rental_unit_id SET NOT NULL',
+                        'ALTER TABLE core_room ADD CONSTRAINT core_room_pkey PRIMARY KEY (rental_unit_id)',
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='room',
+                    name='rental_unit',
+                    field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.rentalunit'),
+                ),
+                migrations.AddField(
+                    model_name='room',
+                    name='id',
+                    field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+                    preserve_default=False,
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='beds',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['-rental_unit', '-id'], name='core_room_rental__b6d827_idx'),
+        ),
+        migrations.AddField(
+            model_name='rentalunit',
+            name='bedrooms',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rentalunit',
+            name='beds',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rentalunit',
+            name='baths',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, editable=False, max_digits=4),
+        ),
+        migrations.RunPython(aggregate_capacity, check_single_rooms),
+    ]
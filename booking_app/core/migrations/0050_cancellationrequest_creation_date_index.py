@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_room_multiple_rooms_and_rentalunit_capacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cancellationrequest',
+            index=models.Index(fields=['creation_date'], name='core_cancel_creatio_558ff3_idx'),
+        ),
+    ]
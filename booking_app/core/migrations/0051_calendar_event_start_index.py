@@ -0,0 +1,32 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:43
+
+import datetime
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_cancellationrequest_creation_date_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='calendarevent',
+            name='core_calend_start_d_af06e8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fee',
+            name='core_fee_rental__d7c9f0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='place',
+            name='core_place_rental__c98bd9_idx',
+        ),
+        migrations.AddIndex(
+            model_name='calendarevent',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.functions.comparison.Coalesce('start_date', django.db.models.expressions.Value(datetime.date(1, 1, 1))), descending=True), django.db.models.expressions.OrderBy(django.db.models.expressions.F('id'), descending=True), name='core_calend_start_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_calendar_event_start_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingdocument',
+            name='pending_views',
+            field=models.IntegerField(default=0),
+        ),
+    ]
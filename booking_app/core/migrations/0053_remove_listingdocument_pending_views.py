@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0052_listingdocument_pending_views'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='listingdocument',
+            name='pending_views',
+        ),
+    ]
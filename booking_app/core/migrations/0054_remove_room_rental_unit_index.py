@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_remove_listingdocument_pending_views'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='room',
+            name='core_room_rental__b6d827_idx',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.10 on 2026-10-19 03:08
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0054_remove_room_rental_unit_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='taxes',
+            field=models.DecimalField(decimal_places=4, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='reservationrequest',
+            name='taxes',
+            field=models.DecimalField(decimal_places=4, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+    ]
@@ -1,21 +1,26 @@
 """
 Database models
 """
-from datetime import time
+from datetime import date, time
 import uuid
 import os
 
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from core import amenities, geo
+
 def rental_unit_image_file_path(instance, filename):
     """Generate file path for new rental unit image"""
     ext = os.path.splitext(filename)[1]
@@ -94,6 +99,16 @@ class RentalUnit(models.Model):
     image = models.ImageField(null=True, upload_to=rental_unit_image_file_path)
     unit_type = models.CharField(max_length=30, choices=UNIT_CHOICES, default='hotel')
     max_guests = models.IntegerField(default=1)
+    # aggregated from the rooms of the unit
+    bedrooms = models.IntegerField(default=0, editable=False, db_index=True)
+    beds = models.IntegerField(default=0, editable=False, db_index=True)
+    baths = models.DecimalField(max_digits=4, decimal_places=1, default=0, editable=False, db_index=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+        ]
     
     def __str__(self):
         return self.title
@@ -242,6 +257,16 @@ class AmenitiesList(models.Model):
     safety_no_parking_on_property = models.BooleanField(default=False)
     safety_some_spaces_are_shared = models.BooleanField(default=False)
     safety_weapons_on_property = models.BooleanField(default=False)
+    amenity_bits_0 = models.BigIntegerField(default=0, editable=False)
+    amenity_bits_1 = models.BigIntegerField(default=0, editable=False)
+    amenity_bits_2 = models.BigIntegerField(default=0, editable=False)
+    
+    def save(self, *args, **kwargs):
+        """keep the amenity bits in sync with the amenity booleans"""
+        self.amenity_bits_0, self.amenity_bits_1, self.amenity_bits_2 = amenities.pack_instance(self)
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | set(amenities.BIT_COLUMNS)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Amenities for rental unit #{self.rental_unit.id}."
@@ -259,6 +284,14 @@ class Location(models.Model):
     country = models.CharField(verbose_name="Country",max_length=3, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, default=0)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, default=0)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        """keep the geohash in sync with the coordinates"""
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'geohash'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Location for rental unit #{self.rental_unit.id}."
@@ -287,13 +320,15 @@ BED_TYPE_CHOICES = (
 
 class Room(models.Model):
     """a room or space in a rental unit"""
-    rental_unit = models.OneToOneField(RentalUnit, primary_key=True, on_delete=models.CASCADE)
+    rental_unit = models.ForeignKey(RentalUnit, on_delete=models.CASCADE, null=True)
     name = models.CharField(max_length=255, blank=True)
     room_type = models.CharField(max_length=20,choices=ROOM_TYPE_CHOICES, blank=True)
     bed_type = models.CharField(max_length=20,choices=BED_TYPE_CHOICES, blank=True)
+    beds = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     tv = models.BooleanField(default=False)
     accessible = models.BooleanField(default=False)
     
+    
 CURRENCY_CHOICES = (
     ('usd', 'usd'),
     ('gbp', 'gbp'),
@@ -310,6 +345,7 @@ class Pricing(models.Model):
     currency = models.CharField(max_length=30, choices=CURRENCY_CHOICES, default='usd')
     week_discount = models.IntegerField(default=0)
     month_discount = models.IntegerField(default=0)
+    # a percentage, ex: 7.00 for 7%
     tax = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     
 FEE_CHOICES = (
@@ -374,6 +410,10 @@ EVENT_CHOICES = (
     ('Reservation', 'reservation'),
     ('Blocked', 'blocked'),
 )
+
+# the start date calendar events are listed by, events without one come last
+CALENDAR_EVENT_START = Coalesce('start_date', models.Value(date.min))
+
     
 class CalendarEvent(models.Model):
     """a log of an event happening in a rental unit"""
@@ -382,6 +422,11 @@ class CalendarEvent(models.Model):
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
     creation_date = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(CALENDAR_EVENT_START.desc(), models.F('id').desc(), name='core_calend_start_id_idx'),
+        ]
 
 
 CANCELLATION_CHOICES = (
@@ -448,6 +493,59 @@ class Place(models.Model):
     country = models.CharField(verbose_name="Country", max_length=3, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, default=0, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, default=0, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    
+    def save(self, *args, **kwargs):
+        """keep the geohash in sync with the coordinates"""
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'geohash'}
+        super().save(*args, **kwargs)
+    
+    
+class ListingDocument(models.Model):
+    """
+    denormalized search row of a rental unit, kept in sync with its listing
+    tables by signals
+    """
+    rental_unit = models.OneToOneField(RentalUnit, primary_key=True, on_delete=models.CASCADE)
+    # indexed by the (user, status) index
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    title = models.CharField(max_length=255)
+    unit_type = models.CharField(max_length=30)
+    status = models.BooleanField()
+    max_guests = models.IntegerField()
+    city = models.CharField(max_length=1024, blank=True)
+    country = models.CharField(max_length=3, blank=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+    night_price = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    amenity_bits_0 = models.BigIntegerField(default=0)
+    amenity_bits_1 = models.BigIntegerField(default=0)
+    amenity_bits_2 = models.BigIntegerField(default=0)
+    # ranking columns, written by the update_listing_scores command only
+    view_count = models.FloatField(default=0)
+    reservation_count = models.IntegerField(default=0)
+    popularity_score = models.FloatField(default=0)
+    recommended_score = models.FloatField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-popularity_score', '-rental_unit']),
+            models.Index(fields=['-recommended_score', '-rental_unit']),
+            models.Index(fields=['city', 'night_price']),
+            models.Index(fields=['country', 'city']),
+            models.Index(fields=['unit_type', 'night_price']),
+            models.Index(fields=['status', 'night_price']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['night_price']),
+            models.Index(fields=['max_guests']),
+        ]
+    
+    def __str__(self):
+        return f"Listing document for rental unit #{self.rental_unit_id}."
     
     
 class ReservationRequest(models.Model):
@@ -459,9 +557,31 @@ class ReservationRequest(models.Model):
     )
     check_in = models.DateField()
     check_out = models.DateField() 
+    guests = models.IntegerField(default=1, validators=[MinValueValidator(1)])
+    pets = models.BooleanField(default=False)
+    transport = models.BooleanField(default=False)
+    nights = models.IntegerField(null=True)
+    night_price = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    subtotal = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    taxes = models.DecimalField(
+        max_digits=5, 
+        decimal_places=4, 
+        null=True, 
+        validators=[
+            MinValueValidator(0),
+            MaxValueValidator(1)
+        ]
+    )
+    total = models.DecimalField(max_digits=8, decimal_places=2, null=True)
     creation_date = models.DateTimeField(auto_now_add=True)
     status = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-check_in', '-id']),
+            models.Index(fields=['user', '-check_in', '-id']),
+        ]
+    
     
 class Reservation(models.Model):
     """a reservation made by a guest for a rental unit"""
@@ -473,12 +593,15 @@ class Reservation(models.Model):
     )
     check_in = models.DateField()
     check_out = models.DateField() 
+    guests = models.IntegerField(default=1, validators=[MinValueValidator(1)])
+    pets = models.BooleanField(default=False)
+    transport = models.BooleanField(default=False)
     nights = models.IntegerField(null=True) 
     night_price = models.DecimalField(max_digits=8, decimal_places=2, null=True)
     subtotal = models.DecimalField(max_digits=8, decimal_places=2, null=True)
     taxes = models.DecimalField(
-        max_digits=3, 
-        decimal_places=2, 
+        max_digits=5, 
+        decimal_places=4, 
         null=True, 
         validators=[
             MinValueValidator(0),
@@ -489,6 +612,11 @@ class Reservation(models.Model):
     status = models.BooleanField(default=True)
     creation_date = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-check_in', '-id']),
+        ]
+    
     # def get_nightly_subtotal(self):
     #     """get the nightly subtotal for the reservation"""
     #     delta = self.end_date - self.start_date 
@@ -496,6 +624,21 @@ class Reservation(models.Model):
     #     return subtotal
     
 
+class LineItem(models.Model):
+    """a priced line of a reservation or of the quote of a reservation request, ex: nights, a fee or taxes"""
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, null=True, related_name='line_items')
+    reservation_request = models.ForeignKey(
+        ReservationRequest, 
+        on_delete=models.CASCADE, 
+        null=True, 
+        related_name='line_items'
+    )
+    name = models.CharField(max_length=255)
+    quantity = models.IntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    
+
 class CancellationRequest(models.Model):
     """a user request to cancel a confirmed reservation"""
     user = models.ForeignKey(
@@ -516,6 +659,12 @@ class CancellationRequest(models.Model):
         ]                            
     )
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-creation_date', '-id']),
+            models.Index(fields=['creation_date']),
+        ]
+    
 class ChangeRequest(models.Model):
     """a user request to cancel a confirmed reservation"""
     user = models.ForeignKey(
@@ -528,6 +677,11 @@ class ChangeRequest(models.Model):
     status = models.BooleanField(default=False)
     creation_date = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-creation_date', '-id']),
+        ]
+    
     
 class Photo(models.Model):
     rental_unit = models.ForeignKey(RentalUnit, on_delete=models.CASCADE, null=True)
@@ -542,4 +696,23 @@ class Payment(models.Model):
     )
     amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     currency = models.CharField(max_length=30, default='usd')
-    secret_id = models.CharField(max_length=255, blank=True)
\ No newline at end of file
+    secret_id = models.CharField(max_length=255, blank=True)
+    
+    
+REFUND_STATUS_CHOICES = (
+    ('Pending', 'pending'),
+    ('Succeeded', 'succeeded'),
+    ('Failed', 'failed'),
+)
+    
+class Refund(models.Model):
+    """a refund owed to a guest, queued until it is paid out"""
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    currency = models.CharField(max_length=30, default='usd')
+    status = models.CharField(max_length=30, choices=REFUND_STATUS_CHOICES, default='Pending')
+    creation_date = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,136 @@
+"""
+Money helpers that work in integer minor units (cents)
+
+Amounts are converted to cents once at the edge, all arithmetic is done
+on ints and the result is converted back to a two place Decimal before it
+is stored in a DecimalField. Rates (tax, refund fractions) are kept as
+integer basis points so that no float ever enters a price calculation.
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+
+CENT = Decimal('0.01')
+RATE = Decimal('0.01')
+# the precision of a rate kept at full basis point precision, ex: 0.0725
+BASIS_POINT = Decimal('0.0001')
+BASIS_POINTS = 10000
+# digits of the minor unit of the currencies that do not have two, ex: the yen has none
+CURRENCY_EXPONENTS = {'yen': 0, 'jpy': 0}
+# the ISO 4217 codes of the currency choices that are not codes
+ISO_CURRENCIES = {'yen': 'jpy'}
+
+StayTotals = namedtuple(
+    'StayTotals',
+    ['nights', 'night_price', 'subtotal', 'tax_rate', 'taxes', 'total']
+)
+
+
+def _round_div(numerator, denominator):
+    """integer division rounding half away from zero"""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def _to_decimal(value):
+    """return value as a Decimal, going through str for floats"""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
+
+def _to_integer(value):
+    """round a Decimal half up to an int"""
+    integer = int(value)
+    if integer == value:
+        return integer
+    return int(value.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_cents(amount):
+    """convert a Decimal, int or str amount to integer cents"""
+    if amount is None:
+        return 0
+    if isinstance(amount, int):
+        return amount * 100
+    return _to_integer(_to_decimal(amount) * 100)
+
+
+def to_minor_units(amount, currency):
+    """convert an amount to integer minor units of its currency, cents for most, yen for the yen"""
+    exponent = CURRENCY_EXPONENTS.get(currency.lower(), 2)
+    return _to_integer(_to_decimal(amount or 0) * 10 ** exponent)
+
+
+def iso_currency(currency):
+    """return the ISO 4217 code of a currency choice"""
+    currency = currency.lower()
+    return ISO_CURRENCIES.get(currency, currency)
+
+
+def from_cents(cents):
+    """convert integer cents to a two place Decimal"""
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def to_basis_points(rate):
+    """convert a fraction such as Decimal('0.5') to basis points (5000)"""
+    if rate is None:
+        return 0
+    if isinstance(rate, int):
+        return rate * BASIS_POINTS
+    return _to_integer(_to_decimal(rate) * BASIS_POINTS)
+
+
+def from_basis_points(basis_points, quantum=RATE):
+    """convert basis points to a two place fraction, ex: 5000 -> 0.50, or to the places of quantum"""
+    return (Decimal(basis_points) / BASIS_POINTS).quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+def tax_rate(tax):
+    """
+    return the tax of a Pricing as basis points
+
+    Pricing.tax is a percentage (ex: 7.00 for 7%) while Reservation.taxes
+    holds a fraction, the rate is capped at 100%.
+    """
+    return min(to_basis_points(_to_decimal(tax or 0) / 100), BASIS_POINTS)
+
+
+def apply_rate(cents, basis_points):
+    """return cents multiplied by a rate in basis points, rounded half up"""
+    return _round_div(cents * basis_points, BASIS_POINTS)
+
+
+def apply_rates(cents, basis_points):
+    """return NumPy arrays of cents multiplied by rates in basis points, rounded half up like apply_rate"""
+    product = np.asarray(cents, dtype=np.int64) * np.asarray(basis_points, dtype=np.int64)
+    return np.sign(product) * ((np.abs(product) + BASIS_POINTS // 2) // BASIS_POINTS)
+
+
+def stay_totals(night_price, nights, tax):
+    """return the nightly subtotal, taxes and total of a stay in cents"""
+    night_price = to_cents(night_price)
+    rate = tax_rate(tax)
+    subtotal = night_price * nights
+    taxes = apply_rate(subtotal, rate)
+
+    return StayTotals(
+        nights=nights,
+        night_price=night_price,
+        subtotal=subtotal,
+        tax_rate=rate,
+        taxes=taxes,
+        total=subtotal + taxes,
+    )
+
+
+def refund_amount(total, fraction):
+    """return the refunded part of a reservation total as a Decimal"""
+    return from_cents(apply_rate(to_cents(total), to_basis_points(fraction)))
@@ -0,0 +1,140 @@
+"""
+Pagination of list endpoints
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    cursor pagination over the ordering of the view queryset
+
+    The cursor holds the values of every ordering field of the last row of
+    a page and the next page starts after that row in the whole ordering,
+    so that long runs of ties on the first field are paged by their ids
+    rather than by an offset. The primary key is appended to an ordering
+    that does not end with it, ordering fields should be non null.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        """return the ordering of the view queryset ending with its primary key"""
+        ordering = tuple(
+            field for field in queryset.query.order_by if isinstance(field, str)
+        ) or (self.ordering,)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-pk',)
+        return ordering
+
+    def _after(self, position, reverse):
+        """return the condition of the rows after a position in the ordering, before it when reversed"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        if reverse:
+            queryset = queryset.order_by(*(
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+
+        try:
+            results = list(queryset[:self.page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            # a position whose values do not fit the ordering fields
+            raise NotFound(self.invalid_cursor_message)
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+        # an empty page keeps the position it was asked from
+        self.next_position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else position
+        self.previous_position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def page_ids(self, request, ids):
+        """
+        return the ids of the rows a request asks for among matching ids, in a
+        queryset ordered by descending id, so that only those are read
+        """
+        self.ordering = ('-id',)
+        cursor = self.decode_cursor(request)
+        limit = self.get_page_size(request) + 1
+        ids = sorted(ids, reverse=True)
+        if cursor is None or cursor.position is None:
+            return ids[:limit]
+        try:
+            position = int(cursor.position[0])
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor.reverse:
+            return [row_id for row_id in ids if row_id > position][-limit:]
+        return [row_id for row_id in ids if row_id < position][:limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def decode_cursor(self, request):
+        """return the cursor of a request, its position decoded to the values of the ordering fields"""
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            # dates and decimals are written as text, which their fields parse back exactly
+            cursor = cursor._replace(position=json.dumps(cursor.position, default=str))
+        return super().encode_cursor(cursor)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """return the values of the ordering fields of a row"""
+        if isinstance(instance, dict):
+            return [instance[field.lstrip('-')] for field in ordering]
+        return [getattr(instance, field.lstrip('-')) for field in ordering]
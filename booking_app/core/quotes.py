@@ -0,0 +1,185 @@
+"""
+Pricing pipeline for reservations
+
+A quote combines the nightly price, the fees of a rental unit and taxes.
+All amounts in a Quote are integer cents, see core.money.
+"""
+from collections import namedtuple
+
+from core import money
+from core.models import RentalUnit, ReservationRequest, LineItem
+
+
+Quote = namedtuple(
+    'Quote',
+    ['nights', 'night_price', 'subtotal', 'fees', 'tax_rate', 'taxes', 'total', 'line_items']
+)
+QuoteLine = namedtuple('QuoteLine', ['name', 'quantity', 'unit_price', 'amount'])
+
+QUOTE_FIELDS = ['nights', 'night_price', 'subtotal', 'taxes', 'total']
+PRICED_FIELDS = ['rental_unit', 'check_in', 'check_out', 'guests', 'pets', 'transport']
+
+
+def get_priced_rental_unit(rental_unit_id):
+    """return a rental unit with its pricing and all of its fees loaded"""
+    return RentalUnit.objects.select_related('pricing').prefetch_related('fee_set').get(id=rental_unit_id)
+
+
+def fee_lines(rental_unit, nights, guests=1, pets=False, transport=False):
+    """return the fee lines that apply to a stay"""
+    lines = []
+    for fee in rental_unit.fee_set.all():
+        unit_price = money.to_cents(fee.price)
+        if fee.name == 'Pet' and pets:
+            quantity = 1
+        elif fee.name == 'Transport' and transport:
+            quantity = 1
+        elif fee.name == 'Extra guest' and guests > rental_unit.max_guests:
+            quantity = (guests - rental_unit.max_guests) * nights
+        else:
+            continue
+        lines.append(QuoteLine(fee.name, quantity, unit_price, unit_price * quantity))
+
+    return lines
+
+
+def quote_stay(rental_unit, check_in, check_out, guests=1, pets=False, transport=False):
+    """
+    return the Quote of a stay in a rental unit
+
+    Extra guest fees are charged per night for every guest above the
+    max_guests of the rental unit, pet and transport fees once per stay.
+    Taxes apply to the nightly subtotal and the fees.
+    """
+    pricing = rental_unit.pricing
+    nights = (check_out - check_in).days
+    night_price = money.to_cents(pricing.night_price)
+    subtotal = night_price * nights
+
+    fees = fee_lines(rental_unit, nights, guests=guests, pets=pets, transport=transport)
+    fees_total = sum(line.amount for line in fees)
+    tax_rate = money.tax_rate(pricing.tax)
+    taxes = money.apply_rate(subtotal + fees_total, tax_rate)
+
+    line_items = [QuoteLine('Nights', nights, night_price, subtotal)] + fees
+    if taxes:
+        line_items.append(QuoteLine('Taxes', 1, taxes, taxes))
+
+    return Quote(
+        nights=nights,
+        night_price=night_price,
+        subtotal=subtotal,
+        fees=fees_total,
+        tax_rate=tax_rate,
+        taxes=taxes,
+        total=subtotal + fees_total + taxes,
+        line_items=line_items,
+    )
+
+
+def reservation_fields(quote):
+    """return the Reservation (or ReservationRequest) field values of a quote"""
+    return {
+        'nights': quote.nights,
+        'night_price': money.from_cents(quote.night_price),
+        'subtotal': money.from_cents(quote.subtotal),
+        'taxes': money.from_basis_points(quote.tax_rate, money.BASIS_POINT),
+        'total': money.from_cents(quote.total),
+    }
+
+
+def quote_request(rental_unit, reservation_request):
+    """return the Quote of a reservation request"""
+    return quote_stay(
+        rental_unit,
+        reservation_request.check_in,
+        reservation_request.check_out,
+        guests=reservation_request.guests,
+        pets=reservation_request.pets,
+        transport=reservation_request.transport,
+    )
+
+
+def _line_items(quote, **owner):
+    """return unsaved LineItem objects for the lines of a quote"""
+    return [
+        LineItem(
+            name=line.name,
+            quantity=line.quantity,
+            unit_price=money.from_cents(line.unit_price),
+            amount=money.from_cents(line.amount),
+            **owner
+        )
+        for line in quote.line_items
+    ]
+
+
+def save_line_items(quote, reservation=None, reservation_request=None):
+    """replace the line items of a reservation or reservation request with the lines of a quote"""
+    if reservation is not None:
+        LineItem.objects.filter(reservation=reservation).delete()
+    else:
+        LineItem.objects.filter(reservation_request=reservation_request).delete()
+    LineItem.objects.bulk_create(
+        _line_items(quote, reservation=reservation, reservation_request=reservation_request)
+    )
+
+
+def save_request_quote(rental_unit, reservation_request):
+    """quote a reservation request and store the quote on it"""
+    quote = quote_request(rental_unit, reservation_request)
+    for field, value in reservation_fields(quote).items():
+        setattr(reservation_request, field, value)
+    reservation_request.save(update_fields=QUOTE_FIELDS)
+    save_line_items(quote, reservation_request=reservation_request)
+
+    return quote
+
+
+def stored_quote_fields(reservation_request):
+    """return the quote stored on a reservation request as Reservation field values"""
+    return {field: getattr(reservation_request, field) for field in QUOTE_FIELDS}
+
+
+def move_line_items(reservation_request, reservation):
+    """attach the quoted line items of a reservation request to its reservation"""
+    LineItem.objects.filter(reservation_request=reservation_request).update(reservation=reservation)
+
+
+def pending_requests(rental_unit_id):
+    """return the reservation requests of a rental unit still waiting for approval"""
+    return ReservationRequest.objects.filter(
+        rental_unit_id=rental_unit_id,
+        status=False,
+        reservation__isnull=True,
+    )
+
+
+def reprice_pending_requests(rental_unit_id):
+    """
+    recompute the stored quote of every pending reservation request of a
+    rental unit, ex: after the host changed its Pricing or fees
+
+    The requests are written with one bulk update and their line items
+    replaced with one delete and one bulk insert.
+    """
+    try:
+        rental_unit = get_priced_rental_unit(rental_unit_id)
+    except RentalUnit.DoesNotExist:
+        return 0
+    if not hasattr(rental_unit, 'pricing'):
+        return 0
+
+    requests = list(pending_requests(rental_unit_id))
+    line_items = []
+    for reservation_request in requests:
+        quote = quote_request(rental_unit, reservation_request)
+        for field, value in reservation_fields(quote).items():
+            setattr(reservation_request, field, value)
+        line_items += _line_items(quote, reservation_request=reservation_request)
+
+    ReservationRequest.objects.bulk_update(requests, QUOTE_FIELDS, batch_size=500)
+    LineItem.objects.filter(reservation_request__in=requests).delete()
+    LineItem.objects.bulk_create(line_items, batch_size=500)
+
+    return len(requests)
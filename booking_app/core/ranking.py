@@ -0,0 +1,106 @@
+"""
+Ranking scores of rental units
+
+Listing views are counted in the shared cache, so that a page view never
+writes a table, and reservations are read from their table. The
+update_listing_scores command, meant to run periodically, flushes the
+counted views and folds both into the popularity and recommended scores
+of the listing documents, so that sorting a search by them reads an
+indexed column and never computes a score per row at request time.
+"""
+from datetime import date, timedelta
+import math
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from core import amenities
+from core.models import ListingDocument, Reservation
+
+
+RESERVATION_WINDOW_DAYS = 90
+VIEW_DECAY = 0.9
+RESERVATION_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+POPULARITY_SHARE = 0.7
+AMENITIES_SHARE = 0.3
+
+
+def _views_key(rental_unit_id):
+    return f'listings:views:{rental_unit_id}'
+
+
+def record_view(rental_unit_id):
+    """count a view of a rental unit listing"""
+    key = _views_key(rental_unit_id)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # flushed meanwhile
+            cache.set(key, 1, timeout=None)
+
+
+def _drain_views(rental_unit_ids, batch_size):
+    """return and remove the views counted since the last update of rental units"""
+    views = {}
+    for start in range(0, len(rental_unit_ids), batch_size):
+        keys = {_views_key(rental_unit_id): rental_unit_id for rental_unit_id in rental_unit_ids[start:start + batch_size]}
+        for key, count in cache.get_many(list(keys)).items():
+            if count:
+                # decrement instead of delete so that views counted meanwhile are kept
+                cache.decr(key, count)
+                views[keys[key]] = count
+    return views
+
+
+def popularity(reservations, views):
+    """return the popularity score of reservation and view counts"""
+    return RESERVATION_WEIGHT * math.log1p(reservations) + VIEW_WEIGHT * math.log1p(views)
+
+
+def update_scores(batch_size=1000):
+    """
+    update the view and reservation counts, popularity and recommended
+    scores of every listing document, return the number of documents
+    """
+    since = date.today() - timedelta(days=RESERVATION_WINDOW_DAYS)
+    reservations = dict(
+        Reservation.objects.filter(status=True, check_in__gte=since)
+        .values('rental_unit').annotate(count=Count('id'))
+        .values_list('rental_unit', 'count')
+    )
+    rows = list(ListingDocument.objects.values_list(
+        'rental_unit_id', 'view_count', *amenities.BIT_COLUMNS
+    ))
+    views = _drain_views([row[0] for row in rows], batch_size)
+
+    documents = []
+    amenity_counts = []
+    for rental_unit_id, view_count, *bits in rows:
+        view_count = view_count * VIEW_DECAY + views.get(rental_unit_id, 0)
+        count = reservations.get(rental_unit_id, 0)
+        documents.append(ListingDocument(
+            rental_unit_id=rental_unit_id,
+            view_count=view_count,
+            reservation_count=count,
+            popularity_score=popularity(count, view_count),
+        ))
+        amenity_counts.append(sum(amenities.popcount(column) for column in bits))
+
+    highest_popularity = max([document.popularity_score for document in documents], default=0) or 1
+    most_amenities = max(amenity_counts, default=0) or 1
+    for document, amenity_count in zip(documents, amenity_counts):
+        document.recommended_score = (
+            POPULARITY_SHARE * document.popularity_score / highest_popularity
+            + AMENITIES_SHARE * amenity_count / most_amenities
+        )
+
+    with transaction.atomic():
+        ListingDocument.objects.bulk_update(
+            documents,
+            ['view_count', 'reservation_count', 'popularity_score', 'recommended_score'],
+            batch_size=batch_size,
+        )
+    return len(documents)
@@ -0,0 +1,119 @@
+"""
+Signal handlers for core models
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core import capacity, fulltext, listing_documents, quotes
+from core import cache as listing_cache
+from core.models import (
+    RentalUnit,
+    AmenitiesList,
+    Location,
+    Room,
+    Pricing,
+    Fee,
+    Availability,
+    Rulebook,
+    Guidebook,
+    CalendarEvent,
+    Place,
+    Photo,
+)
+
+
+# the tables read by search filters, facets and map clusters
+SEARCHABLE_MODELS = (RentalUnit, AmenitiesList, Location, Pricing, Guidebook, Room)
+
+
+@receiver(post_save, sender=Pricing)
+@receiver(post_save, sender=Fee)
+@receiver(post_delete, sender=Fee)
+def reprice_pending_requests(sender, instance, **kwargs):
+    """reprice the pending reservation requests of a rental unit once its pricing or fees are saved"""
+    rental_unit_id = instance.rental_unit_id
+    if rental_unit_id is None:
+        return
+    transaction.on_commit(lambda: quotes.reprice_pending_requests(rental_unit_id))
+
+
+@receiver(post_save, sender=RentalUnit)
+@receiver(post_delete, sender=RentalUnit)
+@receiver(post_save, sender=AmenitiesList)
+@receiver(post_delete, sender=AmenitiesList)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+@receiver(post_save, sender=Guidebook)
+@receiver(post_delete, sender=Guidebook)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Fee)
+@receiver(post_delete, sender=Fee)
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+@receiver(post_save, sender=Rulebook)
+@receiver(post_delete, sender=Rulebook)
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def invalidate_listing_cache(sender, instance, **kwargs):
+    """drop the cached listing responses built from the data that changed"""
+    rental_unit_id = instance.id if sender is RentalUnit else instance.rental_unit_id
+    scopes = []
+    if rental_unit_id is not None:
+        scopes.append(listing_cache.rental_unit_scope(rental_unit_id))
+    if sender in SEARCHABLE_MODELS:
+        scopes.append(listing_cache.SEARCH)
+    elif sender is CalendarEvent:
+        scopes.append(listing_cache.CALENDAR)
+    elif sender is Place:
+        scopes.append(listing_cache.PLACES)
+    # once committed, a read in between would cache the old rows under the new generations
+    transaction.on_commit(lambda: listing_cache.bump_generations(scopes))
+
+
+@receiver(post_save, sender=RentalUnit)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Guidebook)
+@receiver(post_delete, sender=Guidebook)
+def update_search_vector(sender, instance, **kwargs):
+    """rebuild the search vector of a rental unit once its listing text changes"""
+    rental_unit_id = instance.id if sender is RentalUnit else instance.rental_unit_id
+    fulltext.update_search_vectors([rental_unit_id])
+
+
+@receiver(post_save, sender=RentalUnit)
+def rebuild_listing_document(sender, instance, **kwargs):
+    """rebuild the listing document of a rental unit once it is saved"""
+    listing_documents.rebuild_documents([instance.id])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+@receiver(post_save, sender=AmenitiesList)
+@receiver(post_delete, sender=AmenitiesList)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+@receiver(post_save, sender=Guidebook)
+@receiver(post_delete, sender=Guidebook)
+def update_listing_document(sender, instance, **kwargs):
+    """update the listing document of a rental unit once its location, pricing, amenities, calendar or guidebook change"""
+    listing_documents.update_documents([instance.rental_unit_id])
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def update_rental_unit_capacity(sender, instance, **kwargs):
+    """recompute the bedrooms, beds and baths of a rental unit once its rooms change"""
+    if instance.rental_unit_id is None:
+        return
+    capacity.update_capacity([instance.rental_unit_id])
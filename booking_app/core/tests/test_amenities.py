@@ -0,0 +1,56 @@
+"""
+tests for bit packed amenities
+"""
+from django.test import SimpleTestCase
+
+from core import amenities
+from core.models import AmenitiesList
+
+
+FIELDS = amenities.amenity_fields(AmenitiesList)
+
+
+class AmenitiesBitsTests(SimpleTestCase):
+    """test packing amenities into bit columns"""
+
+    def test_capacity(self):
+        """test every amenity has a bit"""
+        self.assertLessEqual(len(FIELDS), amenities.BITS_PER_COLUMN * len(amenities.BIT_COLUMNS))
+
+    def test_pack_unpack(self):
+        """test packed amenities unpack to the same amenities"""
+        enabled = [FIELDS[0], FIELDS[62], FIELDS[63], FIELDS[-1]]
+
+        bits = amenities.pack(FIELDS, {name: True for name in enabled})
+
+        last = len(FIELDS) - 1
+        expected = [1 | 1 << 62, 1, 0]
+        expected[last // 63] |= 1 << (last % 63)
+        self.assertEqual(bits, expected)
+        self.assertEqual(amenities.unpack(FIELDS, bits), enabled)
+
+    def test_pack_instance(self):
+        """test the bits of a model instance"""
+        instance = AmenitiesList(popular_wifi=True, popular_pool=True)
+
+        self.assertEqual(
+            amenities.unpack(FIELDS, amenities.pack_instance(instance)),
+            ['popular_pool', 'popular_wifi'],
+        )
+
+    def test_masks(self):
+        """test masks of amenity names match their packed bits"""
+        names = ['popular_wifi', FIELDS[-1]]
+
+        self.assertEqual(
+            amenities.masks(FIELDS, names),
+            amenities.pack(FIELDS, {name: True for name in names}),
+        )
+        with self.assertRaises(ValueError):
+            amenities.masks(FIELDS, ['helipad'])
+
+    def test_popcount(self):
+        """test counting the amenities of a bit column"""
+        for bits in (0, 1, 1 << 62, (1 << 63) - 1, 0b1011):
+            self.assertEqual(amenities.popcount(bits), bin(bits).count('1'))
+            self.assertEqual(amenities._count_bits(bits), bin(bits).count('1'))
@@ -0,0 +1,122 @@
+"""
+tests for the cancellation policy engine
+"""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from core import cancellation
+from core.models import CANCELLATION_CHOICES
+
+
+def first_matching_tier(policy_name, days, since, nights):
+    """return the refund of the first matching tier of a policy, read from its declaration"""
+    policy = cancellation.POLICIES.get(policy_name)
+    if policy is None:
+        return Decimal('0')
+    if nights < policy.min_nights:
+        return first_matching_tier(policy.short_stay_policy, days, since, nights)
+    if days <= 0:
+        return Decimal('0')
+    for tier in policy.tiers:
+        if days >= tier.min_days and (tier.booked_within is None or since < tier.booked_within):
+            return tier.refund
+    return Decimal('0')
+
+
+class CancellationPolicyTests(SimpleTestCase):
+    """test refund tiers of cancellation policies"""
+
+    def assertRefund(self, policy, days, expected, since=5, nights=7):
+        """assert the refund of a cancellation under a policy"""
+        self.assertEqual(
+            cancellation.refund_fraction(policy, days, since, nights),
+            Decimal(expected),
+            f'{policy} cancelled {days} days before check in',
+        )
+
+    def test_every_policy_has_a_table(self):
+        """test every cancellation policy choice is declared"""
+        for policy, _ in CANCELLATION_CHOICES:
+            self.assertIn(policy, cancellation.POLICIES)
+
+    def test_flexible(self):
+        """test refunds of the flexible policy"""
+        self.assertRefund('Flexible', 1, '1')
+        self.assertRefund('Flexible', 0, '0')
+
+    def test_moderate(self):
+        """test refunds of the moderate policy"""
+        self.assertRefund('Moderate', 5, '1')
+        self.assertRefund('Moderate', 4, '0.5')
+        self.assertRefund('Moderate', 0, '0')
+
+    def test_firm(self):
+        """test refunds of the firm policy"""
+        self.assertRefund('Firm', 30, '1')
+        self.assertRefund('Firm', 20, '0.5')
+        self.assertRefund('Firm', 20, '1', since=1)
+        self.assertRefund('Firm', 7, '0.5')
+        self.assertRefund('Firm', 6, '0')
+
+    def test_strict(self):
+        """test refunds of the strict policy"""
+        self.assertRefund('Strict', 14, '1', since=0)
+        self.assertRefund('Strict', 14, '0.5')
+        self.assertRefund('Strict', 7, '0.5')
+        self.assertRefund('Strict', 6, '0')
+
+    def test_long_term(self):
+        """test refunds of long term policies"""
+        self.assertRefund('Firm Long Term', 30, '1', nights=28)
+        self.assertRefund('Firm Long Term', 29, '0', nights=28)
+        self.assertRefund('Strict Long Term', 28, '1', since=1, nights=30)
+        self.assertRefund('Strict Long Term', 28, '0', nights=30)
+
+    def test_long_term_short_stay_falls_back(self):
+        """test long term policies use the standard policy for stays under 28 nights"""
+        self.assertRefund('Firm Long Term', 20, '0.5', nights=10)
+        self.assertRefund('Strict Long Term', 10, '0.5', nights=10)
+
+    def test_strict_policies(self):
+        """test refunds of super strict and non-refundable policies"""
+        self.assertRefund('Super Strict 30', 30, '0.5')
+        self.assertRefund('Super Strict 30', 29, '0')
+        self.assertRefund('Non-refundable', 100, '0')
+
+    def test_unknown_policy(self):
+        """test an unknown policy gives no refund"""
+        self.assertRefund('Unknown', 100, '0')
+
+    def test_evaluate_batch(self):
+        """test evaluating many cancellations at once matches single evaluations"""
+        policies = [policy for policy, _ in CANCELLATION_CHOICES] * 40
+        days = [n % 45 - 2 for n in range(len(policies))]
+        since = [n % 3 for n in range(len(policies))]
+        nights = [7 + (n % 30) for n in range(len(policies))]
+
+        refunds = cancellation.evaluate_batch(policies, days, since, nights)
+
+        for refund, args in zip(refunds, zip(policies, days, since, nights)):
+            self.assertEqual(Decimal(refund) / 10000, cancellation.refund_fraction(*args))
+            self.assertEqual(Decimal(refund) / 10000, first_matching_tier(*args))
+
+    def test_evaluate_reservations(self):
+        """test refund amounts of reservations"""
+        created = datetime(2023, 6, 1, tzinfo=timezone.utc)
+        reservations = [
+            SimpleNamespace(
+                check_in=date(2023, 7, 1), check_out=date(2023, 7, 5),
+                nights=None, total=Decimal('99.99'), creation_date=created
+            ),
+            SimpleNamespace(
+                check_in=date(2023, 6, 12), check_out=date(2023, 6, 15),
+                nights=3, total=Decimal('300.00'), creation_date=created
+            ),
+        ]
+
+        results = cancellation.evaluate_reservations(reservations, 'Moderate', date(2023, 6, 10))
+
+        self.assertEqual(results, [(10000, 9999), (5000, 15000)])
@@ -0,0 +1,44 @@
+"""
+tests for geographic helpers
+"""
+from django.test import SimpleTestCase
+
+from core import geo
+
+
+class GeoTests(SimpleTestCase):
+    """test geohash encoding and cell covering"""
+
+    def test_encode(self):
+        """test geohash of a known coordinate"""
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode(57.64911, 10.40744, 5), 'u4pru')
+
+    def test_covering_cells(self):
+        """test the cells covering a box contain every point inside it"""
+        south, west, north, east = 40.0, -4.0, 40.5, -3.5
+        cells = geo.covering_cells(south, west, north, east)
+
+        self.assertLessEqual(len(cells), geo.MAX_CELLS)
+        for latitude in (south, 40.25, north):
+            for longitude in (west, -3.75, east):
+                geohash = geo.encode(latitude, longitude)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells), geohash)
+
+    def test_bounding_box(self):
+        """test the bounding box of a circle"""
+        south, west, north, east = geo.bounding_box(0, 0, geo.KM_PER_DEGREE)
+
+        self.assertAlmostEqual(south, -1)
+        self.assertAlmostEqual(north, 1)
+        self.assertAlmostEqual(west, -1)
+        self.assertAlmostEqual(east, 1)
+
+    def test_haversine(self):
+        """test distances between known coordinates"""
+        madrid, barcelona = (40.4168, -3.7038), (41.3874, 2.1686)
+
+        distances = geo.haversine_km(*madrid, [madrid[0], barcelona[0]], [madrid[1], barcelona[1]])
+
+        self.assertAlmostEqual(distances[0], 0)
+        self.assertAlmostEqual(distances[1], 505, delta=1)
@@ -0,0 +1,82 @@
+"""
+tests for denormalized listing documents
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import amenities
+from core.models import RentalUnit, AmenitiesList, Location, Pricing, ListingDocument
+
+
+class ListingDocumentTests(TestCase):
+    """test listing documents follow their rental units"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.rental_unit = RentalUnit.objects.create(
+            user=self.user, title='Beach house', unit_type='House', max_guests=4
+        )
+
+    def test_document_created(self):
+        """test saving a rental unit creates its document"""
+        document = ListingDocument.objects.get(rental_unit=self.rental_unit)
+
+        self.assertEqual(document.user, self.user)
+        self.assertEqual(document.title, 'Beach house')
+        self.assertEqual(document.unit_type, 'house')
+        self.assertEqual(document.max_guests, 4)
+        self.assertTrue(document.status)
+        self.assertIsNone(document.night_price)
+        self.assertIsNone(document.latitude)
+
+    def test_document_follows_listing_tables(self):
+        """test the document is updated when the location, pricing or amenities change"""
+        location = Location.objects.create(
+            rental_unit=self.rental_unit, city='Cadiz', country='ESP',
+            latitude=Decimal('36.529700'), longitude=Decimal('-6.292700'),
+        )
+        Pricing.objects.create(rental_unit=self.rental_unit, night_price=Decimal('80.00'))
+        AmenitiesList.objects.create(rental_unit=self.rental_unit, popular_wifi=True)
+        self.rental_unit.status = False
+        self.rental_unit.save()
+
+        document = ListingDocument.objects.get(rental_unit=self.rental_unit)
+        self.assertEqual(document.city, 'cadiz')
+        self.assertEqual(document.country, 'esp')
+        self.assertEqual(document.geohash, location.geohash)
+        self.assertEqual(document.night_price, Decimal('80.00'))
+        self.assertFalse(document.status)
+        fields = amenities.amenity_fields(AmenitiesList)
+        self.assertEqual(
+            amenities.unpack(fields, [document.amenity_bits_0, document.amenity_bits_1, document.amenity_bits_2]),
+            ['popular_wifi'],
+        )
+
+        location.delete()
+        document.refresh_from_db()
+        self.assertEqual(document.city, '')
+        self.assertIsNone(document.latitude)
+
+    def test_document_deleted(self):
+        """test deleting a rental unit deletes its document"""
+        Location.objects.create(rental_unit=self.rental_unit, city='Cadiz')
+        Pricing.objects.create(rental_unit=self.rental_unit, night_price=Decimal('80.00'))
+
+        self.rental_unit.delete()
+
+        self.assertFalse(ListingDocument.objects.exists())
+
+    def test_rebuild_command(self):
+        """test the rebuild command restores missing and stale documents"""
+        other = RentalUnit.objects.create(user=self.user, title='Flat')
+        ListingDocument.objects.filter(rental_unit=self.rental_unit).delete()
+        ListingDocument.objects.filter(rental_unit=other).update(title='Stale')
+
+        call_command('rebuild_listing_documents', stdout=StringIO())
+
+        titles = dict(ListingDocument.objects.values_list('rental_unit_id', 'title'))
+        self.assertEqual(titles, {self.rental_unit.id: 'Beach house', other.id: 'Flat'})
@@ -0,0 +1,92 @@
+"""
+tests for the money helpers
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from core import money
+
+
+class MoneyTests(SimpleTestCase):
+    """test integer cents money calculations"""
+
+    def test_to_cents(self):
+        """test converting amounts to integer cents"""
+        self.assertEqual(money.to_cents(Decimal('123.45')), 12345)
+        self.assertEqual(money.to_cents(7), 700)
+        self.assertEqual(money.to_cents('0.005'), 1)
+        self.assertEqual(money.to_cents(None), 0)
+
+    def test_from_cents(self):
+        """test converting cents back to a two place Decimal"""
+        self.assertEqual(money.from_cents(12345), Decimal('123.45'))
+        self.assertEqual(str(money.from_cents(700)), '7.00')
+
+    def test_apply_rate_rounds_half_up(self):
+        """test applying a rate rounds half a cent up"""
+        self.assertEqual(money.apply_rate(5, 5000), 3)
+        self.assertEqual(money.apply_rate(-5, 5000), -3)
+        self.assertEqual(money.apply_rate(1000, 750), 75)
+
+    def test_apply_rates(self):
+        """test rates applied to arrays round like single rates"""
+        cents = [5, -5, 1000, 99999, 0, 12345]
+        basis_points = [5000, 5000, 750, 3333, 10000, 1]
+
+        rounded = money.apply_rates(cents, basis_points).tolist()
+
+        self.assertEqual(rounded, [money.apply_rate(c, b) for c, b in zip(cents, basis_points)])
+
+    def test_tax_rate_is_a_percentage(self):
+        """test a tax given as a percentage is stored as a fraction"""
+        self.assertEqual(money.tax_rate(Decimal('7.00')), 700)
+        self.assertEqual(money.tax_rate(Decimal('0.50')), 50)
+        self.assertEqual(money.tax_rate(Decimal('250.00')), money.BASIS_POINTS)
+        self.assertEqual(money.from_basis_points(money.tax_rate(Decimal('7.00'))), Decimal('0.07'))
+
+    def test_one_percent_tax(self):
+        """test a 1% tax is not mistaken for a 100% one"""
+        self.assertEqual(money.tax_rate(Decimal('1.00')), 100)
+
+        totals = money.stay_totals(Decimal('100.00'), 2, Decimal('1.00'))
+
+        self.assertEqual(totals.taxes, 200)
+        self.assertEqual(totals.total, 20200)
+
+    def test_fractional_tax_rate_kept(self):
+        """test a tax rate with basis points is stored without rounding"""
+        totals = money.stay_totals(Decimal('100.00'), 3, Decimal('7.25'))
+        taxes = money.from_basis_points(totals.tax_rate, money.BASIS_POINT)
+
+        self.assertEqual(taxes, Decimal('0.0725'))
+        self.assertEqual(money.to_cents(Decimal('300.00') * taxes), totals.taxes)
+
+    def test_to_minor_units(self):
+        """test amounts are scaled by the minor unit of their currency"""
+        self.assertEqual(money.to_minor_units(Decimal('12.34'), 'usd'), 1234)
+        self.assertEqual(money.to_minor_units(Decimal('1500'), 'yen'), 1500)
+        self.assertEqual(money.iso_currency('yen'), 'jpy')
+        self.assertEqual(money.iso_currency('gbp'), 'gbp')
+
+    def test_stay_totals(self):
+        """test the totals of a stay are computed in cents"""
+        totals = money.stay_totals(Decimal('99.99'), 3, Decimal('15.00'))
+
+        self.assertEqual(totals.subtotal, 29997)
+        self.assertEqual(totals.taxes, 4500)
+        self.assertEqual(totals.total, 34497)
+
+    def test_refund_amount(self):
+        """test computing the refunded part of a total"""
+        self.assertEqual(money.refund_amount(Decimal('100.01'), Decimal('0.5')), Decimal('50.01'))
+        self.assertEqual(money.refund_amount(Decimal('100.00'), 0), Decimal('0.00'))
+
+    def test_benchmark_command(self):
+        """test the money benchmark command runs"""
+        out = StringIO()
+        call_command('benchmark_money', rows=10, repeat=1, stdout=out)
+
+        self.assertIn('cents', out.getvalue())
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta, date
 import stripe
 
 
+from core import money
 from core.models import (
     RentalUnit, 
     AmenitiesList, 
@@ -45,8 +46,8 @@ class PaymentSerializer(serializers.ModelSerializer):
         stripe.api_key = settings.STRIPE_SECRET_KEY
 
         payment_intent = stripe.PaymentIntent.create(
-            amount=int(payment.amount), 
-            currency=payment.currency, 
+            amount=money.to_minor_units(payment.amount, payment.currency), 
+            currency=money.iso_currency(payment.currency), 
             payment_method_types=['card'],
             receipt_email=payment.customer.email
         )
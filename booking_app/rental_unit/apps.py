@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RentalUnitConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rental_unit'
+
+    def ready(self):
+        from rental_unit import signals  # noqa: F401
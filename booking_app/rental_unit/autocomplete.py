@@ -0,0 +1,289 @@
+"""
+search box suggestions of cities, countries and places
+
+Suggestions are kept in an in process prefix trie keyed by their accent
+folded lower case text, weighted by the number of locations or places
+using them. Every node caches the best suggestions of its subtree, the
+shortest prefixes at load time and the others once asked for, and
+changes update the caches along their path. A cache holds more
+suggestions than a query asks for, so that a suggestion losing weight
+can leave it without scanning the subtree again.
+Signals refresh single locations and places once committed. The trie is
+loaded in a background thread on first use and reloaded there after
+INDEX_TIMEOUT seconds so that every worker converges, the database
+answers until it is first loaded, without accent folding.
+"""
+from collections import Counter, namedtuple
+import heapq
+import threading
+import time
+import unicodedata
+
+from django.db.models import Count
+
+from core.models import Location, Place
+from rental_unit import reloading
+
+
+INDEX_TIMEOUT = 900
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+# the prefixes short enough to match most suggestions are ranked at load time
+WARM_DEPTH = 2
+# suggestions cached per node
+CACHE_SIZE = 2 * MAX_LIMIT
+
+Suggestion = namedtuple('Suggestion', ['kind', 'text', 'detail'])
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = None
+
+
+def normalize(text):
+    """return the accent folded lower case form of a text"""
+    decomposed = unicodedata.normalize('NFKD', text.strip().lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class _Node:
+    __slots__ = ('children', 'suggestions', 'best', 'complete')
+
+    def __init__(self):
+        self.children = {}
+        self.suggestions = set()
+        # the best suggestions of the subtree, complete when it holds all of them
+        self.best = None
+        self.complete = False
+
+
+class Trie:
+    """a prefix trie of weighted suggestions"""
+
+    def __init__(self):
+        self.root = _Node()
+        self.weights = {}
+
+    def _rank(self, suggestion):
+        return (-self.weights[suggestion], suggestion)
+
+    def _path(self, key, create=False):
+        """return the nodes from the root to a key, None when it is missing"""
+        nodes = [self.root]
+        for char in key:
+            node = nodes[-1].children.get(char)
+            if node is None:
+                if not create:
+                    return None
+                node = nodes[-1].children[char] = _Node()
+            nodes.append(node)
+        return nodes
+
+    def add(self, suggestion, weight=1):
+        """add to the weight of a suggestion, removing it once it drops to zero"""
+        key = normalize(suggestion.text)
+        if not key:
+            return
+        total = self.weights.get(suggestion, 0) + weight
+        nodes = self._path(key, create=total > 0)
+        if nodes is None:
+            return
+        if total > 0:
+            self.weights[suggestion] = total
+            nodes[-1].suggestions.add(suggestion)
+        else:
+            self.weights.pop(suggestion, None)
+            nodes[-1].suggestions.discard(suggestion)
+
+        # from the leaf up, a node ranked again reads the updated caches of its children
+        for node in reversed(nodes):
+            if node.best is not None:
+                self._update_best(node, suggestion, weight, total)
+
+    def _update_best(self, node, suggestion, weight, total):
+        """apply a weight change of a suggestion to the cached best suggestions of a node of its path"""
+        best = node.best
+        cached = suggestion in best
+        if cached:
+            best.remove(suggestion)
+        # unless every suggestion of the subtree is cached, one ranked after
+        # the last cached suggestion may be outranked by uncached ones
+        if total > 0 and (
+            node.complete
+            or (cached and weight > 0)
+            or (best and self._rank(suggestion) < self._rank(best[-1]))
+        ):
+            best.append(suggestion)
+            best.sort(key=self._rank)
+            if len(best) > CACHE_SIZE:
+                best.pop()
+                node.complete = False
+        if not node.complete and len(best) < MAX_LIMIT:
+            # ranked again on the write path so that queries never scan the subtree
+            node.best = None
+            self._best(node)
+
+    def _best(self, node):
+        """
+        return the best suggestions of the subtree of a node, merging the
+        caches of its children and scanning the subtrees of the others
+        """
+        if node.best is None:
+            suggestions = list(node.suggestions)
+            # suggestions ranked after the last cached one of a child may be outranked by its uncached ones
+            cutoff = None
+            complete = True
+            stack = list(node.children.values())
+            while stack:
+                current = stack.pop()
+                if current.best is not None:
+                    suggestions.extend(current.best)
+                    if not current.complete:
+                        complete = False
+                        last = self._rank(current.best[-1])
+                        cutoff = last if cutoff is None else min(cutoff, last)
+                    continue
+                suggestions.extend(current.suggestions)
+                stack.extend(current.children.values())
+            best = heapq.nsmallest(CACHE_SIZE + 1, suggestions, key=self._rank)
+            if cutoff is not None:
+                best = [suggestion for suggestion in best if self._rank(suggestion) <= cutoff]
+            node.complete = complete and len(best) <= CACHE_SIZE
+            node.best = best[:CACHE_SIZE]
+        return node.best
+
+    def warm(self, depth):
+        """cache the best suggestions of the nodes of the shortest prefixes"""
+        levels = [[self.root]]
+        for _ in range(depth):
+            levels.append([child for node in levels[-1] for child in node.children.values()])
+        # the deepest first, so that shorter prefixes merge the caches of their children
+        for nodes in reversed(levels[1:]):
+            for node in nodes:
+                self._best(node)
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """return the best suggestions starting with a prefix with their weights"""
+        nodes = self._path(normalize(prefix))
+        if nodes is None:
+            return []
+        return [(suggestion, self.weights[suggestion]) for suggestion in self._best(nodes[-1])[:limit]]
+
+
+def _location_suggestions(city, country):
+    suggestions = []
+    if city:
+        suggestions.append(Suggestion('city', city, country))
+    if country:
+        suggestions.append(Suggestion('country', country, ''))
+    return tuple(suggestions)
+
+
+def _place_suggestions(name, city):
+    return (Suggestion('place', name, city),) if name else ()
+
+
+class Index:
+    """the trie and the suggestions of every location and place it holds"""
+
+    def __init__(self):
+        self.trie = Trie()
+        self.sources = {}
+
+    def set_source(self, source, suggestions):
+        """replace the suggestions of a location or place, no suggestions removes it"""
+        for suggestion in self.sources.pop(source, ()):
+            self.trie.add(suggestion, -1)
+        for suggestion in suggestions:
+            self.trie.add(suggestion)
+        if suggestions:
+            self.sources[source] = suggestions
+
+
+def load():
+    """reload the suggestions of every location and place"""
+    global _index, _loaded_at
+    index = Index()
+    for rental_unit_id, city, country in Location.objects.values_list('rental_unit_id', 'city', 'country').iterator():
+        index.sources[('location', rental_unit_id)] = _location_suggestions(city, country)
+    for place_id, name, city in Place.objects.values_list('id', 'name', 'city').iterator():
+        index.sources[('place', place_id)] = _place_suggestions(name, city)
+    weights = Counter(suggestion for suggestions in index.sources.values() for suggestion in suggestions)
+    for suggestion, weight in weights.items():
+        index.trie.add(suggestion, weight)
+    index.trie.warm(WARM_DEPTH)
+    with _lock:
+        _index = index
+        _loaded_at = time.monotonic()
+
+
+def refresh_location(rental_unit_id):
+    """refresh the suggestions of one location, dropping them once deleted"""
+    if _loaded_at is None:
+        return
+    row = Location.objects.filter(rental_unit_id=rental_unit_id).values_list('city', 'country').first()
+    with _lock:
+        if _index is not None:
+            _index.set_source(('location', rental_unit_id), _location_suggestions(*row) if row else ())
+
+
+def refresh_place(place_id):
+    """refresh the suggestion of one place, dropping it once deleted"""
+    if _loaded_at is None:
+        return
+    row = Place.objects.filter(id=place_id).values_list('name', 'city').first()
+    with _lock:
+        if _index is not None:
+            _index.set_source(('place', place_id), _place_suggestions(*row) if row else ())
+
+
+def clear():
+    """drop the suggestions, they are loaded again in the background on the next query"""
+    global _index, _loaded_at
+    with _lock:
+        _index = None
+        _loaded_at = None
+
+
+def _database_completions(prefix, limit):
+    """return the best suggestions starting with a prefix with their weights, counted by the database"""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    weights = Counter()
+    cities = (
+        Location.objects.filter(city__istartswith=prefix).order_by()
+        .values('city', 'country').annotate(count=Count('rental_unit')).values_list('city', 'country', 'count')
+    )
+    for city, country, count in cities:
+        weights[Suggestion('city', city, country)] += count
+    countries = (
+        Location.objects.filter(country__istartswith=prefix).order_by()
+        .values('country').annotate(count=Count('rental_unit')).values_list('country', 'count')
+    )
+    for country, count in countries:
+        weights[Suggestion('country', country, '')] += count
+    places = (
+        Place.objects.filter(name__istartswith=prefix).order_by()
+        .values('name', 'city').annotate(count=Count('id')).values_list('name', 'city', 'count')
+    )
+    for name, city, count in places:
+        weights[Suggestion('place', name, city)] += count
+    return heapq.nsmallest(limit, weights.items(), key=lambda item: (-item[1], item[0]))
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    """return the most used cities, countries and places starting with a prefix"""
+    with _lock:
+        index, loaded_at = _index, _loaded_at
+    if index is None or time.monotonic() - loaded_at > INDEX_TIMEOUT:
+        reloading.reload_in_background(load)
+    if index is None:
+        completions = _database_completions(prefix, limit)
+    else:
+        with _lock:
+            completions = index.trie.complete(prefix, limit)
+    return [
+        {'kind': suggestion.kind, 'text': suggestion.text, 'detail': suggestion.detail, 'count': count}
+        for suggestion, count in completions
+    ]
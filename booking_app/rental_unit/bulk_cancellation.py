@@ -0,0 +1,99 @@
+"""
+bulk cancellation of the reservations of a rental unit
+"""
+from collections import namedtuple
+from datetime import datetime
+from functools import reduce
+import operator
+
+from django.db import transaction
+from django.db.models import Q
+
+from core import cancellation, money
+from core.models import (
+    Pricing,
+    Reservation,
+    CalendarEvent,
+    CancellationRequest,
+    Refund,
+)
+
+
+BulkCancellation = namedtuple('BulkCancellation', ['reservations', 'refunded'])
+
+
+def cancel_reservations(rental_unit, start_date, end_date, reason='', policy=None):
+    """
+    cancel every active reservation of a rental unit overlapping a date range
+
+    Host initiated cancellations are fully refunded unless a cancellation
+    policy is given. Everything happens in one transaction: the
+    reservations are locked and cancelled with one update, their
+    cancellation requests written in bulk, their calendar events deleted
+    with one query and a pending Refund is queued for each of them.
+    """
+    today = datetime.now().date()
+
+    with transaction.atomic():
+        reservations = list(
+            Reservation.objects.select_for_update().filter(
+                rental_unit=rental_unit,
+                status=True,
+                check_in__lt=end_date,
+                check_out__gt=start_date,
+            ).order_by('id')
+        )
+        if not reservations:
+            return BulkCancellation(reservations=[], refunded=money.from_cents(0))
+
+        if policy is None:
+            refunds = [
+                (money.BASIS_POINTS, money.to_cents(reservation.total))
+                for reservation in reservations
+            ]
+        else:
+            refunds = cancellation.evaluate_reservations(reservations, policy, today)
+
+        ids = [reservation.id for reservation in reservations]
+        Reservation.objects.filter(id__in=ids).update(status=False)
+
+        CalendarEvent.objects.filter(rental_unit=rental_unit, reason='Reservation').filter(
+            reduce(operator.or_, [
+                Q(start_date=reservation.check_in, end_date=reservation.check_out)
+                for reservation in reservations
+            ])
+        ).delete()
+
+        existing = {
+            request.reservation_id: request
+            for request in CancellationRequest.objects.filter(reservation_id__in=ids)
+        }
+        created = []
+        for reservation, (refund, _) in zip(reservations, refunds):
+            request = existing.get(reservation.id)
+            if request is None:
+                request = CancellationRequest(user_id=reservation.user_id, reservation=reservation)
+                created.append(request)
+            request.status = True
+            request.reason = reason
+            request.refund = money.from_basis_points(refund)
+        CancellationRequest.objects.bulk_update(existing.values(), ['status', 'reason', 'refund'])
+        CancellationRequest.objects.bulk_create(created)
+
+        pricing = Pricing.objects.filter(rental_unit=rental_unit).first()
+        currency = pricing.currency if pricing else 'usd'
+        Refund.objects.bulk_create([
+            Refund(
+                customer_id=reservation.user_id,
+                reservation=reservation,
+                amount=money.from_cents(amount),
+                currency=currency,
+            )
+            for reservation, (_, amount) in zip(reservations, refunds)
+            if amount
+        ])
+
+    return BulkCancellation(
+        reservations=reservations,
+        refunded=money.from_cents(sum(amount for _, amount in refunds)),
+    )
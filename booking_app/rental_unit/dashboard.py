@@ -0,0 +1,60 @@
+"""
+portfolio dashboard of the rental units of a host
+"""
+from datetime import date, timedelta
+
+from django.db.models import Count, DurationField, F, Min, Q, Sum, Value
+from django.db.models.functions import Greatest, Least
+
+
+WINDOW_DAYS = 30
+UPCOMING_DAYS = 30
+DASHBOARD_TIMEOUT = 60
+
+
+def _booked_nights(start, end):
+    """return the expression of the nights of a reservation inside a date range"""
+    return Least(F('reservation__check_out'), Value(end)) - Greatest(F('reservation__check_in'), Value(start))
+
+
+def host_dashboard(rental_units, today=None):
+    """
+    return the reservation count, upcoming check-ins, occupancy rate over the
+    last WINDOW_DAYS and revenue of rental units, aggregated in one query
+    """
+    today = today or date.today()
+    window_start = today - timedelta(days=WINDOW_DAYS)
+    upcoming_end = today + timedelta(days=UPCOMING_DAYS)
+    active = Q(reservation__status=True)
+    in_window = active & Q(reservation__check_in__lt=today, reservation__check_out__gt=window_start)
+    upcoming = active & Q(reservation__check_in__gte=today, reservation__check_in__lt=upcoming_end)
+
+    rows = rental_units.order_by('-id').values('id', 'title').annotate(
+        reservations=Count('reservation', filter=active),
+        upcoming_check_ins=Count('reservation', filter=upcoming),
+        next_check_in=Min('reservation__check_in', filter=upcoming),
+        booked=Sum(_booked_nights(window_start, today), filter=in_window, output_field=DurationField()),
+        revenue=Sum('reservation__total', filter=active),
+    )
+
+    units = []
+    for row in rows:
+        booked_nights = row.pop('booked').days if row['booked'] is not None else 0
+        row['booked_nights'] = booked_nights
+        row['occupancy_rate'] = round(booked_nights / WINDOW_DAYS, 4)
+        row['revenue'] = row['revenue'] or 0
+        units.append(row)
+
+    booked_nights = sum(unit['booked_nights'] for unit in units)
+    return {
+        'window_days': WINDOW_DAYS,
+        'units': units,
+        'totals': {
+            'rental_units': len(units),
+            'reservations': sum(unit['reservations'] for unit in units),
+            'upcoming_check_ins': sum(unit['upcoming_check_ins'] for unit in units),
+            'booked_nights': booked_nights,
+            'occupancy_rate': round(booked_nights / (WINDOW_DAYS * len(units)), 4) if units else 0,
+            'revenue': sum(unit['revenue'] for unit in units),
+        },
+    }
@@ -0,0 +1,466 @@
+"""
+in process search index of rental units
+
+An optional read tier for the list endpoint, enabled with the
+LISTING_INDEX_ENABLED setting. Every rental unit is a position in flat
+arrays of its night price, capacity, unit type and amenity bits, with an
+inverted index of the lexemes of its listing text and a bitmap of the days
+booked in its calendar over HORIZON_DAYS. The arrays are written to a
+snapshot file (LISTING_INDEX_SNAPSHOT, see the build_listing_index
+command) that workers memory map instead of querying the database, then
+catch up with the listing documents updated since the snapshot was built.
+The index is loaded in a background thread on first use and reloaded
+there after INDEX_TIMEOUT seconds, searches use the database until it is
+ready and the current index while it is reloaded.
+
+Changes are applied as an overlay of single units refreshed by signals,
+the overlay is copied so that running queries keep their own. Signals
+only run in the process making a change, so every search also compares
+the listing cache generations of the searchable tables and calendars
+(see core.cache) with those the index was last synced at, and applies
+the listing documents updated since when they moved. Filters the
+index cannot answer, like geo searches, fall back to the database, as do
+searches without filters or matching more than MAX_MATCHES units which
+the database narrows with its own indexes rather than a list of ids.
+Keywords are matched against the lexemes of the stored search vectors,
+parsed by the database like those of the full text search, keywords with
+alternatives, exclusions or phrases are searched in the database.
+"""
+from array import array
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import json
+import math
+import mmap
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import amenities, fulltext
+from core import cache as listing_cache
+from core.models import RentalUnit, CalendarEvent, ListingDocument
+from rental_unit import reloading
+
+
+MAGIC = b'LSTIDX01'
+HORIZON_DAYS = 368
+HORIZON_BYTES = HORIZON_DAYS // 8
+INDEX_TIMEOUT = 900
+MAX_MATCHES = 1000
+# the generations moved by the changes of the indexed data
+SYNC_SCOPES = (listing_cache.SEARCH, listing_cache.CALENDAR)
+# a document is updated before its transaction commits, the documents
+# updated this long before a sync are read again by the next one
+SYNC_LAG = timedelta(seconds=60)
+
+SUPPORTED_FILTERS = frozenset((
+    'q', 'unit_type', 'guests', 'min_price', 'max_price', 'amenities', 'check_in', 'check_out',
+))
+
+# array sections of a snapshot and their typecodes
+SECTIONS = (
+    ('ids', 'q'),
+    ('unit_types', 'q'),
+    ('max_guests', 'q'),
+    ('night_prices', 'd'),
+    ('amenity_bits_0', 'q'),
+    ('amenity_bits_1', 'q'),
+    ('amenity_bits_2', 'q'),
+    ('postings', 'q'),
+    ('booked', 'B'),
+)
+
+FIELDS = (
+    'id',
+    'listingdocument__unit_type',
+    'listingdocument__max_guests',
+    'listingdocument__night_price',
+    'listingdocument__amenity_bits_0',
+    'listingdocument__amenity_bits_1',
+    'listingdocument__amenity_bits_2',
+    'search_vector',
+)
+
+Entry = namedtuple('Entry', ['tokens', 'unit_type', 'max_guests', 'night_price', 'bits', 'booked'])
+Criteria = namedtuple('Criteria', ['tokens', 'unit_type', 'guests', 'min_price', 'max_price', 'masks', 'booked'])
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = None
+_generations = None
+_synced_at = None
+
+
+def _booked_days(rental_unit_ids, start):
+    """return the bitmaps of the days booked by rental units from a start date"""
+    end = start + timedelta(days=HORIZON_DAYS)
+    events = CalendarEvent.objects.filter(start_date__lt=end, end_date__gt=start)
+    if rental_unit_ids is not None:
+        events = events.filter(rental_unit_id__in=rental_unit_ids)
+    booked = {}
+    for rental_unit_id, start_date, end_date in events.values_list('rental_unit_id', 'start_date', 'end_date'):
+        first = max((start_date - start).days, 0)
+        last = min((end_date - start).days, HORIZON_DAYS)
+        if last <= first:
+            # an event ending before it starts books no day
+            continue
+        booked[rental_unit_id] = booked.get(rental_unit_id, 0) | ((1 << (last - first)) - 1) << first
+    return booked
+
+
+def _entries(queryset, start, rental_unit_ids=None):
+    """return the index entries of a RentalUnit queryset"""
+    booked = _booked_days(rental_unit_ids, start)
+    entries = {}
+    for row in queryset.values_list(*FIELDS).iterator(chunk_size=5000):
+        rental_unit_id, unit_type, max_guests, night_price, bits_0, bits_1, bits_2, search_vector = row
+        entries[rental_unit_id] = Entry(
+            tokens=frozenset(fulltext.vector_lexemes(search_vector)),
+            unit_type=unit_type or '',
+            max_guests=max_guests or 0,
+            night_price=float(night_price) if night_price is not None else math.nan,
+            bits=(bits_0 or 0, bits_1 or 0, bits_2 or 0),
+            booked=booked.get(rental_unit_id, 0),
+        )
+    return entries
+
+
+def _criteria(filters, start):
+    """return the criteria of parsed search filters, None when they cannot be answered by the index"""
+    booked = 0
+    if 'check_in' in filters:
+        first = (filters['check_in'] - start).days
+        last = (filters['check_out'] - start).days
+        if first < 0 or last > HORIZON_DAYS:
+            return None
+        booked = ((1 << (last - first)) - 1) << first
+    tokens = None
+    if 'q' in filters:
+        tokens = fulltext.query_lexemes(filters['q'])
+        if tokens is None:
+            return None
+    return Criteria(
+        tokens=tokens,
+        unit_type=filters.get('unit_type'),
+        guests=filters.get('guests'),
+        min_price=float(filters['min_price']) if 'min_price' in filters else None,
+        max_price=float(filters['max_price']) if 'max_price' in filters else None,
+        masks=filters.get('amenities'),
+        booked=booked,
+    )
+
+
+def _matches(criteria, unit_type, max_guests, night_price, bits, booked):
+    """return if the columns of a changed rental unit match criteria, keywords are checked by the caller"""
+    if criteria.unit_type is not None and unit_type != criteria.unit_type:
+        return False
+    if criteria.guests is not None and max_guests < criteria.guests:
+        return False
+    # comparisons with the nan of a missing price are false, like NULL in SQL
+    if criteria.min_price is not None and not night_price >= criteria.min_price:
+        return False
+    if criteria.max_price is not None and not night_price <= criteria.max_price:
+        return False
+    if criteria.masks is not None:
+        for column, mask in zip(bits, criteria.masks):
+            if column & mask != mask:
+                return False
+    if criteria.booked and booked & criteria.booked:
+        return False
+    return True
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+class ListingIndex:
+    """the arrays of a snapshot of rental units and an overlay of the units changed since"""
+
+    def __init__(self, built_at, start, unit_types, tokens, arrays, overlay=None):
+        self.built_at = built_at
+        self.start = start
+        self.unit_types = unit_types
+        self.tokens = tokens
+        self.arrays = arrays
+        self.overlay = overlay or {}
+        self.count = len(arrays['ids'])
+
+    @classmethod
+    def build(cls, start=None):
+        """build an index of every rental unit from the database"""
+        built_at = timezone.now()
+        start = start or date.today()
+        entries = _entries(RentalUnit.objects.order_by('id'), start)
+
+        unit_types = sorted({entry.unit_type for entry in entries.values()})
+        unit_type_codes = {unit_type: code for code, unit_type in enumerate(unit_types)}
+        arrays = {name: array(typecode) for name, typecode in SECTIONS}
+        postings = {}
+        booked = bytearray(HORIZON_BYTES * len(entries))
+        for position, (rental_unit_id, entry) in enumerate(entries.items()):
+            arrays['ids'].append(rental_unit_id)
+            arrays['unit_types'].append(unit_type_codes[entry.unit_type])
+            arrays['max_guests'].append(entry.max_guests)
+            arrays['night_prices'].append(entry.night_price)
+            for column, value in zip(amenities.BIT_COLUMNS, entry.bits):
+                arrays[column].append(value)
+            for token in entry.tokens:
+                postings.setdefault(token, []).append(position)
+            booked[position * HORIZON_BYTES:(position + 1) * HORIZON_BYTES] = entry.booked.to_bytes(HORIZON_BYTES, 'little')
+        arrays['booked'] = array('B', booked)
+
+        tokens = {}
+        for token, positions in postings.items():
+            tokens[token] = (len(arrays['postings']), len(positions))
+            arrays['postings'].extend(positions)
+
+        return cls(built_at, start, unit_types, tokens, arrays)
+
+    def save(self, path):
+        """write the arrays of the index to a snapshot file, the overlay is not saved"""
+        sections = {}
+        offset = 0
+        for name, typecode in SECTIONS:
+            nbytes = len(self.arrays[name]) * array(typecode).itemsize
+            sections[name] = (offset, nbytes)
+            offset = _aligned(offset + nbytes)
+        header = json.dumps({
+            'built_at': self.built_at.isoformat(),
+            'start': self.start.isoformat(),
+            'byteorder': sys.byteorder,
+            'unit_types': self.unit_types,
+            'tokens': self.tokens,
+            'sections': sections,
+        }).encode()
+
+        data_start = _aligned(len(MAGIC) + 8 + len(header))
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as snapshot:
+            snapshot.write(MAGIC)
+            snapshot.write(len(header).to_bytes(8, 'little'))
+            snapshot.write(header)
+            for name, _ in SECTIONS:
+                snapshot.seek(data_start + sections[name][0])
+                self.arrays[name].tofile(snapshot)
+            snapshot.truncate(data_start + offset)
+        os.replace(temporary, path)
+
+    @classmethod
+    def open(cls, path):
+        """memory map a snapshot file, raise ValueError when it is not a snapshot of this platform"""
+        with open(path, 'rb') as snapshot:
+            mapped = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a listing index snapshot')
+        header_size = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], 'little')
+        header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_size])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} was built on a {header["byteorder"]} endian platform')
+
+        data_start = _aligned(len(MAGIC) + 8 + header_size)
+        view = memoryview(mapped)
+        arrays = {}
+        for name, typecode in SECTIONS:
+            offset, nbytes = header['sections'][name]
+            arrays[name] = view[data_start + offset:data_start + offset + nbytes].cast(typecode)
+
+        return cls(
+            built_at=datetime.fromisoformat(header['built_at']),
+            start=date.fromisoformat(header['start']),
+            unit_types=header['unit_types'],
+            tokens={token: tuple(posting) for token, posting in header['tokens'].items()},
+            arrays=arrays,
+        )
+
+    def entries(self, rental_unit_ids):
+        """return the entries of rental units read again from the database, None for deleted units"""
+        entries = _entries(RentalUnit.objects.filter(id__in=rental_unit_ids), self.start, rental_unit_ids)
+        return {rental_unit_id: entries.get(rental_unit_id) for rental_unit_id in rental_unit_ids}
+
+    def with_overlay(self, entries):
+        """return a copy of the index with changed entries"""
+        overlay = dict(self.overlay)
+        overlay.update(entries)
+        return ListingIndex(self.built_at, self.start, self.unit_types, self.tokens, self.arrays, overlay)
+
+    def changed_entries(self, since):
+        """return the entries of the rental units whose listing document changed since a time"""
+        ids = list(ListingDocument.objects.filter(updated__gt=since).values_list('rental_unit_id', flat=True))
+        return self.entries(ids) if ids else {}
+
+    def caught_up(self):
+        """return a copy of the index with the rental units whose listing document changed since it was built"""
+        entries = self.changed_entries(self.built_at)
+        if not entries:
+            return self
+        return self.with_overlay(entries)
+
+    def _positions(self, tokens):
+        """return the positions of the snapshot units having every keyword"""
+        postings = self.arrays['postings']
+        matched = None
+        for token in tokens:
+            if token not in self.tokens:
+                return []
+            offset, length = self.tokens[token]
+            positions = set(postings[offset:offset + length])
+            matched = positions if matched is None else matched & positions
+        return sorted(matched)
+
+    def _snapshot_positions(self, criteria):
+        """
+        return the positions of the snapshot units matching criteria, every
+        criterion narrows the remaining positions in one pass over one array
+        """
+        arrays = self.arrays
+        positions = range(self.count) if criteria.tokens is None else self._positions(criteria.tokens)
+        if criteria.unit_type is not None:
+            if criteria.unit_type not in self.unit_types:
+                return []
+            code = self.unit_types.index(criteria.unit_type)
+            column = arrays['unit_types']
+            positions = [position for position in positions if column[position] == code]
+        if criteria.guests is not None:
+            column, guests = arrays['max_guests'], criteria.guests
+            positions = [position for position in positions if column[position] >= guests]
+        if criteria.min_price is not None:
+            column, price = arrays['night_prices'], criteria.min_price
+            positions = [position for position in positions if column[position] >= price]
+        if criteria.max_price is not None:
+            column, price = arrays['night_prices'], criteria.max_price
+            positions = [position for position in positions if column[position] <= price]
+        if criteria.masks is not None:
+            for name, mask in zip(amenities.BIT_COLUMNS, criteria.masks):
+                if mask:
+                    column = arrays[name]
+                    positions = [position for position in positions if column[position] & mask == mask]
+        if criteria.booked:
+            column, mask, width = arrays['booked'], criteria.booked, HORIZON_BYTES
+            from_bytes = int.from_bytes
+            positions = [
+                position for position in positions
+                if not from_bytes(column[position * width:(position + 1) * width], 'little') & mask
+            ]
+        return positions
+
+    def search(self, filters):
+        """return the ids of the rental units matching parsed search filters, None when the index cannot answer them"""
+        criteria = _criteria(filters, self.start)
+        if criteria is None:
+            return None
+        if criteria.tokens == []:
+            # keywords of stop words only match nothing
+            return []
+        ids = self.arrays['ids']
+        overlay = self.overlay
+
+        results = [ids[position] for position in self._snapshot_positions(criteria)]
+        if overlay:
+            results = [rental_unit_id for rental_unit_id in results if rental_unit_id not in overlay]
+        for rental_unit_id, entry in overlay.items():
+            if entry is None:
+                continue
+            if criteria.tokens is not None and not entry.tokens.issuperset(criteria.tokens):
+                continue
+            if _matches(criteria, entry.unit_type, entry.max_guests, entry.night_price, entry.bits, entry.booked):
+                results.append(rental_unit_id)
+
+        return results
+
+
+def load():
+    """load the index from its snapshot when there is one, build it from the database otherwise"""
+    global _index, _loaded_at, _generations, _synced_at
+    generations = listing_cache.generations(SYNC_SCOPES)
+    synced_at = timezone.now()
+    index = None
+    path = settings.LISTING_INDEX_SNAPSHOT
+    if path and os.path.exists(path):
+        try:
+            index = ListingIndex.open(path).caught_up()
+        except ValueError:
+            index = None
+    if index is None:
+        index = ListingIndex.build()
+    with _lock:
+        _index = index
+        _loaded_at = time.monotonic()
+        _generations = generations
+        _synced_at = synced_at
+
+
+def refresh_unit(rental_unit_id):
+    """apply the change of one rental unit to the loaded index"""
+    global _index
+    with _lock:
+        index = _index
+    if index is None:
+        return
+    entries = index.entries([rental_unit_id])
+    with _lock:
+        # the index may have been cleared or reloaded meanwhile, the booked
+        # days of the entries are only valid from the same start date
+        if _index is not None and _index.start == index.start:
+            _index = _index.with_overlay(entries)
+
+
+def clear():
+    """drop the index, it is loaded again in the background on the next query"""
+    global _index, _loaded_at, _generations, _synced_at
+    with _lock:
+        _index = None
+        _loaded_at = None
+        _generations = None
+        _synced_at = None
+
+
+def _get_index():
+    """return the loaded index or None, loading or reloading it in the background when missing or expired"""
+    with _lock:
+        index, loaded_at = _index, _loaded_at
+    if index is None or time.monotonic() - loaded_at > INDEX_TIMEOUT:
+        reloading.reload_in_background(load)
+    return index
+
+
+def _synced(index):
+    """return the index with the changes committed by other processes since it was last synced"""
+    global _index, _generations, _synced_at
+    generations = listing_cache.generations(SYNC_SCOPES)
+    with _lock:
+        if _index is None or generations == _generations:
+            return index
+        index, since = _index, _synced_at - SYNC_LAG
+    synced_at = timezone.now()
+    entries = index.changed_entries(since)
+    with _lock:
+        # entries applied meanwhile by signals are as recent, the booked
+        # days of the entries are only valid from the same start date
+        if _index is not None and _index.start == index.start:
+            _index = _index.with_overlay(entries)
+            _generations = generations
+            _synced_at = max(_synced_at, synced_at)
+            index = _index
+    return index
+
+
+def search(filters):
+    """
+    return the ids of the rental units matching parsed search filters, None
+    when the index is disabled, not loaded yet, cannot answer them or they
+    are not selective enough
+    """
+    if not filters or not settings.LISTING_INDEX_ENABLED or not set(filters) <= SUPPORTED_FILTERS:
+        return None
+    index = _get_index()
+    if index is None:
+        return None
+    ids = _synced(index).search(filters)
+    if ids is not None and len(ids) > MAX_MATCHES:
+        return None
+    return ids
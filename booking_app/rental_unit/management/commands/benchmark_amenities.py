@@ -0,0 +1,54 @@
+"""
+Django command to benchmark the compact amenities representation against the full one
+"""
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+
+from core import amenities
+from core.models import AmenitiesList
+from rental_unit.serializers import AmenitiesListSerializer
+
+
+def build_amenities_lists(rows, enabled):
+    """return unsaved amenities lists with a number of random enabled amenities"""
+    rng = random.Random(42)
+    fields = amenities.amenity_fields(AmenitiesList)
+    instances = []
+    for rental_unit_id in range(1, rows + 1):
+        instance = AmenitiesList(rental_unit_id=rental_unit_id)
+        for name in rng.sample(fields, enabled):
+            setattr(instance, name, True)
+        bits = amenities.pack_instance(instance)
+        for column, value in zip(amenities.BIT_COLUMNS, bits):
+            setattr(instance, column, value)
+        instances.append(instance)
+    return instances
+
+
+class Command(BaseCommand):
+    """Django command to compare payload size and serialization time of amenities representations"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--enabled', type=int, default=15)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        instances = build_amenities_lists(options['rows'], options['enabled'])
+
+        for representation in ('full', 'compact'):
+            def render():
+                serializer = AmenitiesListSerializer(
+                    instances, many=True, context={'representation': representation}
+                )
+                return JSONRenderer().render(serializer.data)
+
+            seconds = min(timeit.repeat(render, number=1, repeat=options['repeat']))
+            self.stdout.write(
+                f'{representation:<8} {len(instances)} rows in {seconds * 1000:.1f} ms, '
+                f'{len(render())} bytes'
+            )
@@ -0,0 +1,28 @@
+"""
+Django command to build the snapshot file of the listing search index
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rental_unit.listing_index import ListingIndex
+
+
+class Command(BaseCommand):
+    """Django command to build the listing search index from the database and save its snapshot"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.LISTING_INDEX_SNAPSHOT)
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Set LISTING_INDEX_SNAPSHOT or pass --output')
+
+        started = time.monotonic()
+        index = ListingIndex.build()
+        index.save(options['output'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {index.count} rental units in {time.monotonic() - started:.2f} s'
+        ))
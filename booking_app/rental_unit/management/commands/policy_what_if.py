@@ -0,0 +1,52 @@
+"""
+Django command to compare past refunds with the refunds under another cancellation policy
+"""
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cancellation import POLICIES
+from rental_unit.policy_analytics import policy_what_if
+
+
+def parse_date(value):
+    """parse an ISO formatted date argument"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date: {value}')
+
+
+class Command(BaseCommand):
+    """Django command for cancellation policy what-if analytics"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('policy', choices=sorted(POLICIES))
+        parser.add_argument('--start', type=parse_date)
+        parser.add_argument('--end', type=parse_date)
+        parser.add_argument('--unit', type=int, action='append', dest='units')
+        parser.add_argument('--owner', type=int)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        end = options['end'] or datetime.now().date()
+        start = options['start'] or end - timedelta(days=365)
+
+        result = policy_what_if(
+            options['policy'],
+            start,
+            end,
+            rental_units=options['units'],
+            owner=options['owner'],
+            chunk_size=options['chunk_size'],
+        )
+
+        self.stdout.write(f"{result['cancellations']} cancellations from {start} to {end}")
+        rows = [('all', result)] + list(result['by_current_policy'].items())
+        for name, summary in rows:
+            self.stdout.write(
+                f"{name:<18} {summary['cancellations']:>8} "
+                f"actual {summary['actual_refunds']:>12} "
+                f"{options['policy']} {summary['simulated_refunds']:>12} "
+                f"delta {summary['delta']:>12}"
+            )
@@ -0,0 +1,117 @@
+"""
+what-if analytics of cancellation policies over historical cancellations
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from core import cancellation, money
+from core.models import CancellationRequest
+
+
+CHUNK_SIZE = 2000
+
+FIELDS = (
+    'creation_date',
+    'refund',
+    'reservation__check_in',
+    'reservation__check_out',
+    'reservation__nights',
+    'reservation__total',
+    'reservation__creation_date',
+    'reservation__rental_unit__rulebook__cancellation_policy',
+)
+
+
+def _days(dates):
+    return np.array(dates, dtype='datetime64[D]')
+
+
+def _evaluate_chunk(rows, policy, totals):
+    """evaluate a chunk of cancellation rows under the current and the alternative policy"""
+    cancelled, stored_refunds, check_in, check_out, stays, reservation_totals, booked, current_policies = zip(*rows)
+    cancelled = _days([value.date() for value in cancelled])
+    check_in = _days(check_in)
+    days_before = (check_in - cancelled).astype(np.int64)
+    days_since = (cancelled - _days([value.date() for value in booked])).astype(np.int64)
+    stays = np.array([-1 if stay is None else stay for stay in stays], dtype=np.int64)
+    nights = np.where(stays < 0, (_days(check_out) - check_in).astype(np.int64), stays)
+
+    current_refunds = np.array(
+        cancellation.evaluate_batch(current_policies, days_before, days_since, nights), dtype=np.int64
+    )
+    simulated_refunds = cancellation.evaluate_batch(policy, days_before, days_since, nights)
+    # the refund a cancellation was actually given wins over its policy
+    stored = np.array(
+        [-1 if refund is None else money.to_basis_points(refund) for refund in stored_refunds], dtype=np.int64
+    )
+    current_refunds = np.where(stored >= 0, stored, current_refunds)
+
+    cents = np.array([money.to_cents(total) for total in reservation_totals], dtype=np.int64)
+    actual = money.apply_rates(cents, current_refunds)
+    simulated = money.apply_rates(cents, simulated_refunds)
+
+    keys = np.array([current or 'None' for current in current_policies], dtype=object)
+    groups = [('all', slice(None))] + [(key, keys == key) for key in set(keys.tolist())]
+    for key, selected in groups:
+        bucket = totals[key]
+        bucket['cancellations'] += len(actual[selected])
+        bucket['actual_refunds'] += int(actual[selected].sum())
+        bucket['simulated_refunds'] += int(simulated[selected].sum())
+
+
+def _start_of_day(day):
+    """return the aware datetime a day starts at, so that date ranges stay index range scans"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def policy_what_if(policy, start_date, end_date, rental_units=None, owner=None, chunk_size=CHUNK_SIZE):
+    """
+    return the refunds that cancellations between two dates got and would
+    have got under another cancellation policy, optionally only for some
+    rental units or for the portfolio of an owner
+
+    A cancellation is a request whose reservation was cancelled, whether
+    the guest cancelled it or the host approved it. Rows are streamed with
+    a server side cursor and evaluated in chunks so that a year of a whole
+    portfolio never has to fit in memory.
+    """
+    queryset = CancellationRequest.objects.filter(
+        reservation__status=False,
+        creation_date__gte=_start_of_day(start_date),
+        creation_date__lt=_start_of_day(end_date + timedelta(days=1)),
+    )
+    if rental_units:
+        queryset = queryset.filter(reservation__rental_unit__in=rental_units)
+    if owner is not None:
+        queryset = queryset.filter(reservation__rental_unit__user=owner)
+    rows = queryset.order_by().values_list(*FIELDS).iterator(chunk_size=chunk_size)
+
+    totals = defaultdict(lambda: {'cancellations': 0, 'actual_refunds': 0, 'simulated_refunds': 0})
+    totals['all']
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _evaluate_chunk(chunk, policy, totals)
+            chunk = []
+    if chunk:
+        _evaluate_chunk(chunk, policy, totals)
+
+    def summary(bucket):
+        return {
+            'cancellations': bucket['cancellations'],
+            'actual_refunds': money.from_cents(bucket['actual_refunds']),
+            'simulated_refunds': money.from_cents(bucket['simulated_refunds']),
+            'delta': money.from_cents(bucket['simulated_refunds'] - bucket['actual_refunds']),
+        }
+
+    result = summary(totals.pop('all'))
+    result['policy'] = policy
+    result['start_date'] = start_date
+    result['end_date'] = end_date
+    result['by_current_policy'] = {name: summary(bucket) for name, bucket in sorted(totals.items())}
+
+    return result
@@ -0,0 +1,42 @@
+"""
+reloads of the in process indexes off the request path
+
+An expired index is reloaded in a daemon thread while queries keep using
+the current one, at most one reload of an index runs at a time.
+"""
+import threading
+
+from django.db import connections
+
+
+_lock = threading.Lock()
+_running = {}
+
+
+def reload_in_background(load):
+    """run an index load in a thread unless it is already running, return the thread"""
+    with _lock:
+        if load in _running:
+            return None
+        thread = threading.Thread(target=_run, args=(load,), name=f'reload {load.__module__}', daemon=True)
+        _running[load] = thread
+    thread.start()
+    return thread
+
+
+def _run(load):
+    try:
+        load()
+    finally:
+        # the thread has its own database connections
+        connections.close_all()
+        with _lock:
+            _running.pop(load, None)
+
+
+def join(timeout=None):
+    """wait for the running reloads to finish"""
+    with _lock:
+        threads = list(_running.values())
+    for thread in threads:
+        thread.join(timeout)
@@ -0,0 +1,402 @@
+"""
+search filters and facets for rental units
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+import math
+import operator
+
+from django.db.models import Avg, Count, Exists, F, Min, OuterRef, Q
+from django.db.models.functions import Substr
+
+from rest_framework import serializers as drf_serializers
+
+from core import amenities, fulltext, geo
+from core.models import UNIT_CHOICES, CATEGORY_CHOICES, AmenitiesList, CalendarEvent, Place
+
+
+PRICE_BUCKETS = [0, 50, 100, 150, 200, 300, 500]
+GUEST_BUCKETS = [1, 2, 3, 4, 5, 6, 7, 8]
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 500
+DEFAULT_PLACES_RADIUS_KM = 2
+MAX_PLACES_RADIUS_KM = 50
+MAX_PLACES = 50
+DOCUMENT = 'listingdocument__'
+ORDERINGS = ('price', 'distance', 'popular', 'recommended')
+
+
+def _text(value):
+    return value.strip().lower()
+
+
+def _keywords(value):
+    value = value.strip()
+    if not value:
+        raise ValueError(value)
+    return value
+
+
+def _integer(value):
+    return int(value)
+
+
+def _boolean(value):
+    value = value.strip().lower()
+    if value not in ('true', 'false', '1', '0'):
+        raise ValueError(value)
+    return value in ('true', '1')
+
+
+def _price(value):
+    price = Decimal(value)
+    if not price.is_finite() or price < 0:
+        raise ValueError(value)
+    return price
+
+
+def _count(value):
+    count = int(value)
+    if count < 0:
+        raise ValueError(value)
+    return count
+
+
+def _baths(value):
+    """parse a number of baths, half bathrooms count as half a bath"""
+    baths = _price(value)
+    if baths * 2 != int(baths * 2):
+        raise ValueError(value)
+    return baths
+
+
+def _bounded(value, low, high):
+    number = float(value)
+    if not math.isfinite(number) or not low <= number <= high:
+        raise ValueError(value)
+    return number
+
+
+def _latitude(value):
+    return _bounded(value, -90, 90)
+
+
+def _longitude(value):
+    return _bounded(value, -180, 180)
+
+
+def _radius(value):
+    radius = _bounded(value, 0, MAX_RADIUS_KM)
+    if radius == 0:
+        raise ValueError(value)
+    return radius
+
+
+def _bbox(value):
+    """parse a south,west,north,east bounding box"""
+    south, west, north, east = value.split(',')
+    south, north = _latitude(south), _latitude(north)
+    west, east = _longitude(west), _longitude(east)
+    if south > north or west > east:
+        raise ValueError(value)
+    return (south, west, north, east)
+
+
+def _date(value):
+    return date.fromisoformat(value)
+
+
+def _amenities(value):
+    """parse a comma separated list of amenities into their bit masks"""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    return amenities.masks(amenities.amenity_fields(AmenitiesList), names)
+
+
+FILTERS = {
+    'q': _keywords,
+    'unit_type': _text,
+    'status': _boolean,
+    'owner': _integer,
+    'guests': _integer,
+    'bedrooms': _count,
+    'beds': _count,
+    'baths': _baths,
+    'min_price': _price,
+    'max_price': _price,
+    'city': _text,
+    'country': _text,
+    'lat': _latitude,
+    'lng': _longitude,
+    'radius': _radius,
+    'bbox': _bbox,
+    'check_in': _date,
+    'check_out': _date,
+    'amenities': _amenities,
+}
+
+
+def parse_filters(query_params):
+    """return the typed and normalized search filters of a request"""
+    filters = {}
+    for name, parse in FILTERS.items():
+        value = query_params.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            filters[name] = parse(value)
+        except (ValueError, InvalidOperation):
+            raise drf_serializers.ValidationError({name: f'Invalid value: {value}'})
+
+    if ('lat' in filters) != ('lng' in filters) or ('radius' in filters and 'lat' not in filters):
+        raise drf_serializers.ValidationError('lat and lng are required to search around a point.')
+    if 'lat' in filters:
+        filters.setdefault('radius', DEFAULT_RADIUS_KM)
+    if ('check_in' in filters) != ('check_out' in filters):
+        raise drf_serializers.ValidationError('check_in and check_out are required to search available dates.')
+    if 'check_in' in filters and filters['check_in'] >= filters['check_out']:
+        raise drf_serializers.ValidationError('Check in date cannot be on or after check out date.')
+
+    return filters
+
+
+def _within_box(queryset, south, west, north, east, prefix='location__'):
+    """narrow a queryset to the rows whose location is in a bounding box"""
+    cells = geo.covering_cells(south, west, north, east)
+    return queryset.filter(
+        reduce(operator.or_, [Q(**{f'{prefix}geohash__startswith': cell}) for cell in cells]),
+        **{
+            f'{prefix}latitude__gte': south,
+            f'{prefix}latitude__lte': north,
+            f'{prefix}longitude__gte': west,
+            f'{prefix}longitude__lte': east,
+        }
+    )
+
+
+def filter_rental_units(queryset, filters):
+    """
+    narrow a RentalUnit queryset with parsed search filters, reading the
+    columns of its listing document instead of joining every listing table
+    """
+    if 'q' in filters:
+        queryset = fulltext.search(queryset, filters['q'])
+    if 'unit_type' in filters:
+        queryset = queryset.filter(listingdocument__unit_type=filters['unit_type'])
+    if 'status' in filters:
+        queryset = queryset.filter(listingdocument__status=filters['status'])
+    if 'owner' in filters:
+        queryset = queryset.filter(listingdocument__user_id=filters['owner'])
+    if 'guests' in filters:
+        queryset = queryset.filter(listingdocument__max_guests__gte=filters['guests'])
+    if 'bedrooms' in filters:
+        queryset = queryset.filter(bedrooms__gte=filters['bedrooms'])
+    if 'beds' in filters:
+        queryset = queryset.filter(beds__gte=filters['beds'])
+    if 'baths' in filters:
+        queryset = queryset.filter(baths__gte=filters['baths'])
+    if 'min_price' in filters:
+        queryset = queryset.filter(listingdocument__night_price__gte=filters['min_price'])
+    if 'max_price' in filters:
+        queryset = queryset.filter(listingdocument__night_price__lte=filters['max_price'])
+    if 'city' in filters:
+        queryset = queryset.filter(listingdocument__city=filters['city'])
+    if 'country' in filters:
+        queryset = queryset.filter(listingdocument__country=filters['country'])
+    if 'bbox' in filters:
+        queryset = _within_box(queryset, *filters['bbox'], prefix=DOCUMENT)
+    if 'lat' in filters:
+        lat, lng, radius = filters['lat'], filters['lng'], filters['radius']
+        queryset = _within_box(queryset, *geo.bounding_box(lat, lng, radius), prefix=DOCUMENT).annotate(
+            distance=geo.distance_expression(lat, lng, f'{DOCUMENT}latitude', f'{DOCUMENT}longitude')
+        ).filter(distance__lte=radius)
+    if 'amenities' in filters:
+        queryset = amenities.with_amenities(queryset, filters['amenities'], prefix=DOCUMENT)
+    if 'check_in' in filters:
+        queryset = queryset.exclude(Exists(CalendarEvent.objects.filter(
+            rental_unit=OuterRef('pk'),
+            start_date__lt=filters['check_out'],
+            end_date__gt=filters['check_in'],
+        )))
+
+    return queryset
+
+
+def parse_ordering(query_params, filters):
+    """return the requested ordering of a search, None for the default one"""
+    ordering = query_params.get('ordering')
+    if ordering in (None, ''):
+        return None
+    if ordering not in ORDERINGS:
+        raise drf_serializers.ValidationError({'ordering': f'Invalid value: {ordering}'})
+    if ordering == 'distance' and 'lat' not in filters:
+        raise drf_serializers.ValidationError('lat and lng are required to sort by distance.')
+
+    return ordering
+
+
+def order_rental_units(queryset, ordering):
+    """
+    order a filtered RentalUnit queryset by a column of its listing document,
+    the columns are aliased so that the cursor pagination can read them,
+    rental units without pricing are left out of the price ordering
+    """
+    if ordering == 'price':
+        return queryset.filter(listingdocument__night_price__isnull=False).annotate(
+            price=F('listingdocument__night_price')
+        ).order_by('price', '-id')
+    if ordering == 'distance':
+        return queryset.order_by('distance', '-id')
+    if ordering == 'popular':
+        return queryset.annotate(popularity=F('listingdocument__popularity_score')).order_by('-popularity', '-id')
+    return queryset.annotate(recommended=F('listingdocument__recommended_score')).order_by('-recommended', '-id')
+
+
+def parse_viewport(query_params):
+    """return the bounding box and zoom level of a map viewport request"""
+    viewport = {}
+    for name, parse in (('bbox', _bbox), ('zoom', _integer)):
+        value = query_params.get(name)
+        if value in (None, ''):
+            raise drf_serializers.ValidationError({name: 'This parameter is required.'})
+        try:
+            viewport[name] = parse(value)
+        except ValueError:
+            raise drf_serializers.ValidationError({name: f'Invalid value: {value}'})
+    if not 0 <= viewport['zoom'] <= geo.MAX_ZOOM:
+        raise drf_serializers.ValidationError({'zoom': f'Invalid value: {viewport["zoom"]}'})
+
+    return viewport
+
+
+def cluster_locations(queryset, bbox, zoom):
+    """
+    return the map clusters of a Location queryset inside a viewport,
+    grouping locations by the geohash cell of the zoom level in one query
+    """
+    precision = geo.precision_for_zoom(zoom)
+    rows = _within_box(queryset, *bbox, prefix='').annotate(
+        cell=Substr('geohash', 1, precision)
+    ).values('cell').annotate(
+        count=Count('rental_unit'),
+        latitude=Avg('latitude'),
+        longitude=Avg('longitude'),
+        min_price=Min('rental_unit__pricing__night_price'),
+    ).order_by('cell')
+
+    return [
+        {
+            'cell': row['cell'],
+            'count': row['count'],
+            'latitude': round(row['latitude'], 6),
+            'longitude': round(row['longitude'], 6),
+            'min_price': row['min_price'],
+        }
+        for row in rows
+    ]
+
+
+def parse_places_filters(query_params):
+    """return the radius and category of a nearby places request"""
+    filters = {'radius': DEFAULT_PLACES_RADIUS_KM}
+    radius = query_params.get('radius')
+    if radius not in (None, ''):
+        try:
+            filters['radius'] = _radius(radius)
+        except ValueError:
+            raise drf_serializers.ValidationError({'radius': f'Invalid value: {radius}'})
+        if filters['radius'] > MAX_PLACES_RADIUS_KM:
+            raise drf_serializers.ValidationError({'radius': f'Invalid value: {radius}'})
+    category = query_params.get('category')
+    if category not in (None, ''):
+        if category not in dict(CATEGORY_CHOICES):
+            raise drf_serializers.ValidationError({'category': f'Invalid value: {category}'})
+        filters['category'] = category
+
+    return filters
+
+
+def nearby_places(location, radius, category=None):
+    """
+    return the places of any rental unit within a radius of a location,
+    nearest first, narrowed with the geohash index and refined by distance
+    """
+    latitude, longitude = float(location.latitude), float(location.longitude)
+    places = _within_box(
+        Place.objects.all(), *geo.bounding_box(latitude, longitude, radius), prefix=''
+    )
+    if category is not None:
+        places = places.filter(category=category)
+    rows = list(places.values(
+        'id', 'rental_unit', 'name', 'category', 'description', 'city', 'latitude', 'longitude'
+    ))
+    distances = geo.haversine_km(
+        latitude, longitude,
+        [row['latitude'] for row in rows],
+        [row['longitude'] for row in rows],
+    ).tolist()
+
+    nearby = []
+    for row, distance in zip(rows, distances):
+        if distance <= radius:
+            row['distance'] = round(distance, 3)
+            nearby.append(row)
+    nearby.sort(key=lambda row: (row['distance'], row['id']))
+
+    return nearby[:MAX_PLACES]
+
+
+def _price_label(index):
+    """return the label of a price bucket, the last bucket is open ended"""
+    if index == len(PRICE_BUCKETS) - 1:
+        return f'{PRICE_BUCKETS[index]}+'
+    return f'{PRICE_BUCKETS[index]}-{PRICE_BUCKETS[index + 1]}'
+
+
+def _guests_label(index):
+    """return the label of a guest capacity bucket, the last bucket is open ended"""
+    if index == len(GUEST_BUCKETS) - 1:
+        return f'{GUEST_BUCKETS[index]}+'
+    return str(GUEST_BUCKETS[index])
+
+
+def facet_counts(queryset):
+    """
+    return price histogram, unit type and guest capacity counts of a
+    RentalUnit queryset, computed with one aggregate query
+    """
+    aggregates = {'total': Count('id')}
+
+    for index, low in enumerate(PRICE_BUCKETS):
+        condition = Q(listingdocument__night_price__gte=low)
+        if index < len(PRICE_BUCKETS) - 1:
+            condition &= Q(listingdocument__night_price__lt=PRICE_BUCKETS[index + 1])
+        aggregates[f'price_{index}'] = Count('id', filter=condition)
+
+    for index, (unit_type, _) in enumerate(UNIT_CHOICES):
+        aggregates[f'unit_type_{index}'] = Count('id', filter=Q(listingdocument__unit_type=unit_type.lower()))
+
+    for index, guests in enumerate(GUEST_BUCKETS):
+        if index == len(GUEST_BUCKETS) - 1:
+            condition = Q(max_guests__gte=guests)
+        else:
+            condition = Q(max_guests=guests)
+        aggregates[f'guests_{index}'] = Count('id', filter=condition)
+
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'price': [
+            {'bucket': _price_label(index), 'count': counts[f'price_{index}']}
+            for index in range(len(PRICE_BUCKETS))
+        ],
+        'unit_type': [
+            {'unit_type': unit_type, 'count': counts[f'unit_type_{index}']}
+            for index, (unit_type, _) in enumerate(UNIT_CHOICES)
+        ],
+        'guests': [
+            {'bucket': _guests_label(index), 'count': counts[f'guests_{index}']}
+            for index in range(len(GUEST_BUCKETS))
+        ],
+    }
@@ -4,6 +4,7 @@ serializers for rental unit API
 from rest_framework import serializers
 from datetime import datetime, timedelta, date
 
+from core import amenities, cancellation, quotes
 from core.models import (
     RentalUnit, 
     AmenitiesList, 
@@ -18,11 +19,14 @@ from core.models import (
     Place,
     ReservationRequest,
     Reservation,
+    LineItem,
     CancellationRequest,
     ChangeRequest,
-    Photo
+    Photo,
+    CANCELLATION_CHOICES
 )
 
+from rest_framework import permissions as drf_permissions
 from rest_framework import serializers as drf_serializers
 
 
@@ -30,35 +34,126 @@ from rest_framework import serializers as drf_serializers
 now = date(2023, 6, 7)
 
 
-class RentalUnitSerializer(serializers.ModelSerializer):
-    """serializer for rental unit"""
-    class Meta:
-        model = RentalUnit
-        fields = '__all__'
-        read_only_fields = ['id']
-        
-    
-class RentalUnitDetailSerializer(RentalUnitSerializer):
-    """Serializer for rental unit detail view"""
-    
-    class Meta(RentalUnitSerializer.Meta):
-        fields = RentalUnitSerializer.Meta.fields 
-        
-    
+def _query_list(query_params, name):
+    """return the comma separated values of a query parameter"""
+    value = query_params.get(name) or ''
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class FieldsExpansionMixin:
+    """
+    Serializer mixin selecting fields with ?fields=a,b and inlining related
+    one to one objects with ?expand=x,y
+
+    Meta.expandable_fields maps an expansion to its serializer class and the
+    relation it reads. Fields are only narrowed on reads, a write validates
+    and returns every field whatever ?fields= says.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        fields, expand = self.requested_fields(request.query_params)
+
+        for name in expand:
+            serializer_class, source = self.Meta.expandable_fields[name]
+            kwargs = {'source': source} if source != name else {}
+            self.fields[name] = serializer_class(read_only=True, **kwargs)
+
+        if fields is not None and request.method in drf_permissions.SAFE_METHODS:
+            unknown = sorted(set(fields) - set(self.fields))
+            if unknown:
+                raise drf_serializers.ValidationError({'fields': f'Unknown fields: {", ".join(unknown)}'})
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, query_params):
+        """return the requested fields, None for every field, and the requested expansions"""
+        fields = _query_list(query_params, 'fields') or None
+        expand = _query_list(query_params, 'expand')
+        unknown = sorted(set(expand) - set(cls.Meta.expandable_fields))
+        if unknown:
+            raise drf_serializers.ValidationError({'expand': f'Unknown expansions: {", ".join(unknown)}'})
+        return fields, expand
+
+    @classmethod
+    def narrow_queryset(cls, queryset, query_params):
+        """load only the requested columns and join the requested expansions"""
+        fields, expand = cls.requested_fields(query_params)
+        relations = [cls.Meta.expandable_fields[name][1] for name in expand]
+        if relations:
+            queryset = queryset.select_related(*relations)
+        if fields is not None:
+            model = cls.Meta.model
+            columns = {field.name for field in model._meta.concrete_fields}
+            queryset = queryset.only(
+                model._meta.pk.name,
+                *[name for name in fields if name in columns],
+                *relations,
+            )
+        return queryset
+
+
 class AmenitiesListSerializer(serializers.ModelSerializer):
-    """Serializer for amenities list"""
+    """
+    Serializer for amenities list
+    
+    With representation=compact in the context only the enabled amenities
+    are listed, as {'rental_unit': id, 'amenities': [names]}. The same
+    shape is accepted on write, the list then replaces every amenity.
+    """
     
     class Meta:
         model = AmenitiesList
-        fields = '__all__'
+        exclude = ['amenity_bits_0', 'amenity_bits_1', 'amenity_bits_2']
         # read_only_fields = ['rental_unit']
+        
+    def to_internal_value(self, data):
+        """expand a compact list of enabled amenities into the amenity fields"""
+        if 'amenities' not in data:
+            return super().to_internal_value(data)
+        
+        if hasattr(data, 'getlist'):
+            enabled = data.getlist('amenities')
+        else:
+            enabled = data['amenities']
+        if isinstance(enabled, str):
+            enabled = [name for name in enabled.split(',') if name]
+        if not isinstance(enabled, list):
+            raise drf_serializers.ValidationError({'amenities': 'Expected a list of amenities.'})
+        
+        fields = amenities.amenity_fields(AmenitiesList)
+        unknown = sorted(set(enabled) - set(fields))
+        if unknown:
+            raise drf_serializers.ValidationError({'amenities': f'Unknown amenities: {", ".join(unknown)}'})
+        
+        expanded = {name: name in enabled for name in fields}
+        if 'rental_unit' in data:
+            expanded['rental_unit'] = data['rental_unit']
+        return super().to_internal_value(expanded)
+        
+    def to_representation(self, instance):
+        """list only the enabled amenities when a compact representation is requested"""
+        if self.context.get('representation') != 'compact':
+            return super().to_representation(instance)
+        
+        return {
+            'rental_unit': instance.rental_unit_id,
+            'amenities': amenities.unpack(
+                amenities.amenity_fields(AmenitiesList), 
+                [getattr(instance, column) for column in amenities.BIT_COLUMNS]
+            ),
+        }
 
 
 class AmenitiesListDetailSerializer(AmenitiesListSerializer):
     """Serializer for amenities list detail view"""
     
     class Meta(AmenitiesListSerializer.Meta):
-        fields = AmenitiesListSerializer.Meta.fields 
+        exclude = AmenitiesListSerializer.Meta.exclude
         
         
 class LocationSerializer(serializers.ModelSerializer):
@@ -250,6 +345,30 @@ class GuidebookDetailSerializer(GuidebookSerializer):
         fields = GuidebookSerializer.Meta.fields 
         
 
+class RentalUnitSerializer(FieldsExpansionMixin, serializers.ModelSerializer):
+    """serializer for rental unit"""
+    
+    class Meta:
+        model = RentalUnit
+        exclude = ['search_vector']
+        read_only_fields = ['id']
+        expandable_fields = {
+            'location': (LocationSerializer, 'location'),
+            'pricing': (PricingSerializer, 'pricing'),
+            'availability': (AvailabilitySerializer, 'availability'),
+            'amenities': (AmenitiesListSerializer, 'amenitieslist'),
+            'rulebook': (RulebookSerializer, 'rulebook'),
+            'guidebook': (GuidebookSerializer, 'guidebook'),
+        }
+        
+    
+class RentalUnitDetailSerializer(RentalUnitSerializer):
+    """Serializer for rental unit detail view"""
+    
+    class Meta(RentalUnitSerializer.Meta):
+        exclude = RentalUnitSerializer.Meta.exclude
+        
+    
 class PlaceSerializer(serializers.ModelSerializer):
     """Serializer for a place"""
 
@@ -272,7 +391,7 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReservationRequest
         fields = '__all__'
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'nights', 'night_price', 'subtotal', 'taxes', 'total']
         
     def validate(self, data):
         """validations for reservation requests"""
@@ -338,12 +457,9 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
         """create a return reservation request"""
         reservation_request = ReservationRequest.objects.create(**validated_data)
         availability = Availability.objects.get(rental_unit=reservation_request.rental_unit)
-        pricing = Pricing.objects.get(rental_unit=reservation_request.rental_unit)
+        rental_unit = quotes.get_priced_rental_unit(reservation_request.rental_unit_id)
+        quotes.save_request_quote(rental_unit, reservation_request)
         
-        night_price = pricing.night_price
-        stay_length = (reservation_request.check_out - reservation_request.check_in).days
-        subtotal = night_price * stay_length
-        total = subtotal + (subtotal * pricing.tax)
         if availability.instant_booking == True:
             reservation = Reservation.objects.create(
                 rental_unit=reservation_request.rental_unit,
@@ -351,13 +467,12 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
                 user=reservation_request.user,
                 check_in=reservation_request.check_in,
                 check_out=reservation_request.check_out,
-                nights=stay_length,
-                night_price=pricing.night_price,
-                subtotal=subtotal,
-                taxes=pricing.tax,
-                total=total
+                guests=reservation_request.guests,
+                pets=reservation_request.pets,
+                transport=reservation_request.transport,
+                **quotes.stored_quote_fields(reservation_request)
             )
-            reservation.save()
+            quotes.move_line_items(reservation_request, reservation)
             
             calendar_event = CalendarEvent.objects.create(
                 rental_unit=reservation_request.rental_unit,
@@ -373,12 +488,10 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
         if Reservation.objects.filter(reservation_request=instance.id).exists():
             raise drf_serializers.ValidationError("Error: cannot edit a reservation request for a confirmed reservation")
         
-        """create data to populate reservation fields after admin confirms reservation request"""
-        pricing = Pricing.objects.get(rental_unit=instance.rental_unit)
-        night_price = pricing.night_price
-        stay_length = (instance.check_out - instance.check_in).days
-        subtotal = night_price * stay_length
-        total = subtotal + (subtotal * pricing.tax)
+        requote = instance.total is None or any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in quotes.PRICED_FIELDS
+        )
         
         """status == True if admin confirms reservation request, if not, save request without creating reservation"""
         if 'status' in validated_data and validated_data['status'] == True:
@@ -387,8 +500,16 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
         instance.user = validated_data.get('user', instance.user)
         instance.check_in = validated_data.get('check_in', instance.check_in)
         instance.check_out = validated_data.get('check_out', instance.check_out)
+        instance.guests = validated_data.get('guests', instance.guests)
+        instance.pets = validated_data.get('pets', instance.pets)
+        instance.transport = validated_data.get('transport', instance.transport)
         instance.save()
         
+        """requote the request if its dates or options changed, the stored quote is kept current when pricing changes"""
+        if requote:
+            rental_unit = quotes.get_priced_rental_unit(instance.rental_unit_id)
+            quotes.save_request_quote(rental_unit, instance)
+        
         """create reservation and save to calendar if status == True"""
         if instance.status == True:
             calendar_event = CalendarEvent.objects.create(
@@ -405,12 +526,12 @@ class ReservationRequestSerializer(serializers.ModelSerializer):
                 user=instance.user,
                 check_in=instance.check_in,
                 check_out=instance.check_out,
-                night_price=pricing.night_price,
-                subtotal=subtotal,
-                taxes=pricing.tax,
-                total=total
+                guests=instance.guests,
+                pets=instance.pets,
+                transport=instance.transport,
+                **quotes.stored_quote_fields(instance)
             )
-            reservation.save()
+            quotes.move_line_items(instance, reservation)
     
         return instance
         
@@ -431,8 +552,18 @@ class ReservationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
         
         
+class LineItemSerializer(serializers.ModelSerializer):
+    """Serializer for the line items of a Reservation"""
+
+    class Meta:
+        model = LineItem
+        fields = ['id', 'name', 'quantity', 'unit_price', 'amount']
+        read_only_fields = fields
+
+
 class ReservationDetailSerializer(ReservationSerializer):
     """Serializer for Reservation detail view"""
+    line_items = LineItemSerializer(many=True, read_only=True)
     
     class Meta(ReservationSerializer.Meta):
         fields = ReservationSerializer.Meta.fields
@@ -469,157 +600,19 @@ class CancellationRequestSerializer(serializers.ModelSerializer):
         reservation = Reservation.objects.get(id=cancellation_request.reservation.id)
         # check cancellation policy for refund
         rulebook = Rulebook.objects.get(rental_unit=cancellation_request.reservation.rental_unit)
-        cancellation_policy = rulebook.cancellation_policy
-        
-        delta = reservation.check_in - cancellation_request.creation_date.date()
-        time_since_reservation = (
-            now - cancellation_request.creation_date.date()
-        ).days
-        
-        # if cancellation occurs the day of check in
-        if delta == 0:
-            cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
         
-        # if cancellation policy is flexible
-        if cancellation_policy == 'Flexible' and delta.days >= 1:
-            cancellation_request.refund = 1
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        # if cancellation policy is moderate
-        if cancellation_policy == 'Moderate':
-            if delta.days >= 5:
-                cancellation_request.refund = 1
-            if delta.days >= 1 and delta.days < 5:
-                cancellation_request.refund = 0.5
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        # if cancellation policy is firm
-        if cancellation_policy == 'Firm':
-            if delta.days >= 30:
-                cancellation_request.refund = 1
-            if delta.days >= 7 and delta.days < 30:
-                cancellation_request.refund = 0.5
-            if delta.days < 7:
-                cancellation_request.refund = 0
-            if delta.days >= 14 and time_since_reservation < 2:
-                cancellation_request.refund = 1
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        if cancellation_policy == 'Strict':
-            if delta.days >= 14 and time_since_reservation < 2:
-                cancellation_request.refund = 1
-            if delta.days >= 7 and delta.days < 14:
-                cancellation_request.refund = 0.5
-            if delta.days < 7:
-                cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        if cancellation_policy == 'Firm Long Term' and reservation.nights >= 28:
-            if delta.days >= 30:
-                cancellation_request.refund = 1
-            if delta.days < 30:
-                cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        if cancellation_policy == 'Strict Long Term' and reservation.nights >= 28:
-            if delta.days >= 28 and time_since_reservation < 2:
-                cancellation_request.refund = 1
-            if delta.days < 28:
-                cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
+        preview = cancellation.preview_refund(reservation, rulebook.cancellation_policy, now)
+        cancellation_request.refund = preview.refund
+        reservation.status = False
+        CalendarEvent.objects.filter(
+            rental_unit=reservation.rental_unit,
+            start_date=reservation.check_in,
+            end_date=reservation.check_out
+        ).delete()
+        reservation.save()
+        cancellation_request.save()
         
-        if cancellation_policy == 'Non-refundable':
-            cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
-        
-        if cancellation_policy == 'Super Strict 30':
-            if delta.days >= 30:
-                cancellation_request.refund = 0.5
-            if delta.days < 30:
-                cancellation_request.refund = 0
-            reservation.status = False
-            CalendarEvent.objects.filter(
-                rental_unit=reservation.rental_unit,
-                start_date=reservation.check_in,
-                end_date=reservation.check_out
-            ).delete()
-            reservation.save()
-            cancellation_request.save()
-            
-            return cancellation_request
+        return cancellation_request
         
 
 class CancellationRequestDetailSerializer(CancellationRequestSerializer):
@@ -629,6 +622,35 @@ class CancellationRequestDetailSerializer(CancellationRequestSerializer):
         fields = CancellationRequestSerializer.Meta.fields
         
         
+class BulkCancellationSerializer(serializers.Serializer):
+    """Serializer for cancelling the reservations of a rental unit in a date range"""
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
+    policy = serializers.ChoiceField(choices=CANCELLATION_CHOICES, required=False)
+    
+    def validate(self, data):
+        """check that the date range is valid"""
+        if data['start_date'] >= data['end_date']:
+            raise drf_serializers.ValidationError('Start date cannot be on or after end date, please choose another date.')
+        return data
+        
+        
+class PolicyWhatIfSerializer(serializers.Serializer):
+    """Serializer for the parameters of a cancellation policy what-if analysis"""
+    policy = serializers.ChoiceField(choices=CANCELLATION_CHOICES)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    rental_unit = serializers.ListField(child=serializers.IntegerField(), required=False)
+    owner = serializers.IntegerField(required=False)
+    
+    def validate(self, data):
+        """check that the date range is valid"""
+        if data['start_date'] > data['end_date']:
+            raise drf_serializers.ValidationError('Start date cannot be after end date, please choose another date.')
+        return data
+        
+        
 class ChangeRequestSerializer(serializers.ModelSerializer):
     """Serializer for a Change Requests"""
 
@@ -739,20 +761,22 @@ class ChangeRequestSerializer(serializers.ModelSerializer):
 
         if 'status' in validated_data and validated_data['status'] == True:
             reservation = Reservation.objects.get(id=instance.reservation.id)
-            pricing = Pricing.objects.get(rental_unit=instance.reservation.rental_unit)
-            stay_length = (instance.new_check_out - instance.new_check_in).days
-            subtotal = pricing.night_price * stay_length
-            total = subtotal + (subtotal * pricing.tax)
+            rental_unit = quotes.get_priced_rental_unit(reservation.rental_unit_id)
+            quote = quotes.quote_stay(
+                rental_unit,
+                instance.new_check_in,
+                instance.new_check_out,
+                guests=reservation.guests,
+                pets=reservation.pets,
+                transport=reservation.transport,
+            )
             
             Reservation.objects.filter(id=instance.reservation.id).update(
                 check_in=instance.new_check_in,
                 check_out=instance.new_check_out,
-                nights=stay_length,
-                night_price=pricing.night_price,
-                subtotal=subtotal,
-                taxes=pricing.tax,
-                total=total 
+                **quotes.reservation_fields(quote)
             )
+            quotes.save_line_items(quote, reservation=reservation)
             CalendarEvent.objects.filter(
                 rental_unit=reservation.rental_unit,
                 start_date=reservation.check_in,
@@ -804,6 +828,25 @@ class PhotoDetailSerializer(PhotoSerializer):
         fields = PhotoSerializer.Meta.fields
         
         
+class ListingSerializer(serializers.ModelSerializer):
+    """Serializer for a rental unit with every table of its listing page"""
+    amenities = AmenitiesListSerializer(source='amenitieslist', read_only=True)
+    location = LocationSerializer(read_only=True)
+    rooms = RoomSerializer(source='room_set', many=True, read_only=True)
+    pricing = PricingSerializer(read_only=True)
+    fees = FeeSerializer(source='fee_set', many=True, read_only=True)
+    availability = AvailabilitySerializer(read_only=True)
+    rulebook = RulebookSerializer(read_only=True)
+    guidebook = GuidebookSerializer(read_only=True)
+    places = PlaceSerializer(source='place_set', many=True, read_only=True)
+    photos = PhotoSerializer(source='photo_set', many=True, read_only=True)
+    
+    class Meta:
+        model = RentalUnit
+        exclude = ['search_vector']
+        read_only_fields = ['id']
+        
+        
 class PhotoImageSerializer(serializers.ModelSerializer):
     """serializer for uploading photos"""
     
@@ -0,0 +1,59 @@
+"""
+Signal handlers for rental unit listings
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import RentalUnit, AmenitiesList, Location, Pricing, CalendarEvent, Guidebook, Place
+from rental_unit import autocomplete, listing_index, similarity
+
+
+@receiver(post_save, sender=RentalUnit)
+@receiver(post_delete, sender=RentalUnit)
+@receiver(post_save, sender=AmenitiesList)
+@receiver(post_delete, sender=AmenitiesList)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+def refresh_similarity_index(sender, instance, **kwargs):
+    """refresh a rental unit in the similar listings index once its listing data is committed"""
+    rental_unit_id = instance.id if sender is RentalUnit else instance.rental_unit_id
+    transaction.on_commit(lambda: similarity.refresh_unit(rental_unit_id))
+
+
+@receiver(post_save, sender=RentalUnit)
+@receiver(post_delete, sender=RentalUnit)
+@receiver(post_save, sender=AmenitiesList)
+@receiver(post_delete, sender=AmenitiesList)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Pricing)
+@receiver(post_delete, sender=Pricing)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+@receiver(post_save, sender=Guidebook)
+@receiver(post_delete, sender=Guidebook)
+def refresh_listing_index(sender, instance, **kwargs):
+    """refresh a rental unit in the listing search index once its listing data is committed"""
+    rental_unit_id = instance.id if sender is RentalUnit else instance.rental_unit_id
+    if rental_unit_id is None:
+        return
+    transaction.on_commit(lambda: listing_index.refresh_unit(rental_unit_id))
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def refresh_location_suggestions(sender, instance, **kwargs):
+    """refresh the city and country suggestions of a location once committed"""
+    rental_unit_id = instance.rental_unit_id
+    transaction.on_commit(lambda: autocomplete.refresh_location(rental_unit_id))
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def refresh_place_suggestions(sender, instance, **kwargs):
+    """refresh the suggestion of a place once committed"""
+    place_id = instance.id
+    transaction.on_commit(lambda: autocomplete.refresh_place(place_id))
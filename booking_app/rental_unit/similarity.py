@@ -0,0 +1,302 @@
+"""
+similar listings ranked by amenities, unit type, price and distance
+
+The amenity bits, unit type, night price and coordinates of every active
+rental unit are kept in an in process feature matrix, one row of NumPy
+arrays per unit, so that scoring every unit against a listing is a few
+vectorized operations. Signals rewrite the row of a single unit in a copy
+of the arrays when its listing data changes, so that running queries keep
+a consistent snapshot. The index is loaded in a background thread on
+first use and reloaded there after INDEX_TIMEOUT seconds so that every
+worker converges. Until it is first loaded, the units of the same type
+closest in price are read from the database and scored the same way.
+"""
+from collections import namedtuple
+import threading
+import time
+
+import numpy as np
+from django.db.models import F
+from django.db.models.functions import Abs
+
+from core import amenities, geo
+from core.models import RentalUnit
+from rental_unit import reloading
+
+
+INDEX_TIMEOUT = 900
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# candidates re-ranked by distance per requested listing
+CANDIDATES_PER_RESULT = 4
+
+AMENITIES_WEIGHT = 0.6
+UNIT_TYPE_WEIGHT = 0.2
+PRICE_WEIGHT = 0.1
+DISTANCE_WEIGHT = 0.1
+DISTANCE_SCALE_KM = 10.0
+
+Entry = namedtuple('Entry', ['bits', 'count', 'unit_type', 'night_price', 'latitude', 'longitude'])
+Similar = namedtuple('Similar', ['rental_unit_id', 'score', 'amenities', 'distance'])
+# one array per feature, row i of every array describes the same rental unit
+Features = namedtuple('Features', ['ids', 'bits', 'counts', 'unit_types', 'prices', 'latitudes', 'longitudes'])
+
+FIELDS = (
+    'id',
+    'unit_type',
+    'amenitieslist__amenity_bits_0',
+    'amenitieslist__amenity_bits_1',
+    'amenitieslist__amenity_bits_2',
+    'pricing__night_price',
+    'location__latitude',
+    'location__longitude',
+)
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = None
+
+
+def _optional_float(value):
+    return float(value) if value is not None else np.nan
+
+
+def _entry(row):
+    """return the index entry of a row of FIELDS"""
+    _, unit_type, bits_0, bits_1, bits_2, night_price, latitude, longitude = row
+    bits = (bits_0 or 0, bits_1 or 0, bits_2 or 0)
+    return Entry(
+        bits=bits,
+        count=sum(amenities.popcount(column) for column in bits),
+        unit_type=(unit_type or '').lower(),
+        night_price=_optional_float(night_price),
+        latitude=_optional_float(latitude),
+        longitude=_optional_float(longitude),
+    )
+
+
+def _allocate(capacity):
+    return Features(
+        ids=np.full(capacity, -1, dtype=np.int64),
+        bits=np.zeros((capacity, len(amenities.BIT_COLUMNS)), dtype=np.uint64),
+        counts=np.zeros(capacity, dtype=np.int64),
+        unit_types=np.full(capacity, -1, dtype=np.int64),
+        prices=np.full(capacity, np.nan),
+        latitudes=np.full(capacity, np.nan),
+        longitudes=np.full(capacity, np.nan),
+    )
+
+
+class Index:
+    """
+    the feature matrix of the active rental units, rows of removed units
+    are reused and the arrays are only copied when they have to grow
+    """
+
+    def __init__(self, capacity=0):
+        self.features = _allocate(capacity)
+        self.size = 0
+        self.rows = {}
+        self.free = []
+        self.unit_type_codes = {}
+
+    def detach(self):
+        """copy the arrays before rows are changed in place, queries keep reading the previous ones"""
+        self.features = Features(*(array.copy() for array in self.features))
+
+    def unit_type_code(self, unit_type):
+        return self.unit_type_codes.setdefault(unit_type, len(self.unit_type_codes))
+
+    def _grow(self):
+        capacity = len(self.features.ids)
+        features = _allocate(max(2 * capacity, 1024))
+        for name, array in zip(Features._fields, self.features):
+            getattr(features, name)[:capacity] = array
+        # queries still reading the previous arrays keep a consistent copy
+        self.features = features
+
+    def put(self, rental_unit_id, entry):
+        """write the row of a rental unit"""
+        row = self.rows.get(rental_unit_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                if self.size == len(self.features.ids):
+                    self._grow()
+                row = self.size
+                self.size += 1
+            self.rows[rental_unit_id] = row
+        features = self.features
+        features.bits[row] = entry.bits
+        features.counts[row] = entry.count
+        features.unit_types[row] = self.unit_type_code(entry.unit_type)
+        features.prices[row] = entry.night_price
+        features.latitudes[row] = entry.latitude
+        features.longitudes[row] = entry.longitude
+        features.ids[row] = rental_unit_id
+
+    def remove(self, rental_unit_id):
+        """free the row of a rental unit"""
+        row = self.rows.pop(rental_unit_id, None)
+        if row is not None:
+            self.features.ids[row] = -1
+            self.free.append(row)
+
+
+def _rows(queryset):
+    return queryset.filter(status=True).values_list(*FIELDS)
+
+
+def load():
+    """reload the index of every active rental unit"""
+    global _index, _loaded_at
+    rows = list(_rows(RentalUnit.objects.all()).iterator(chunk_size=5000))
+    index = Index(capacity=len(rows) + len(rows) // 8)
+    for row in rows:
+        index.put(row[0], _entry(row))
+    with _lock:
+        _index = index
+        _loaded_at = time.monotonic()
+
+
+def refresh_unit(rental_unit_id):
+    """refresh the index row of one rental unit, dropping it once inactive or deleted"""
+    if _index is None:
+        return
+    row = _rows(RentalUnit.objects.filter(id=rental_unit_id)).first()
+    with _lock:
+        if _index is None:
+            return
+        _index.detach()
+        if row is None:
+            _index.remove(rental_unit_id)
+        else:
+            _index.put(rental_unit_id, _entry(row))
+
+
+def clear():
+    """drop the index, it is loaded again in the background on the next query"""
+    global _index, _loaded_at
+    with _lock:
+        _index = None
+        _loaded_at = None
+
+
+def _get_index():
+    """return the loaded index or None, loading or reloading it in the background when missing or expired"""
+    with _lock:
+        index, loaded_at = _index, _loaded_at
+    if index is None or time.monotonic() - loaded_at > INDEX_TIMEOUT:
+        reloading.reload_in_background(load)
+    return index
+
+
+def _scores(features, size, target, unit_type_code):
+    """return the similarity scores and amenity Jaccard indexes of the first rows of the features"""
+    common = np.bitwise_count(
+        features.bits[:size] & np.array(target.bits, dtype=np.uint64)
+    ).sum(axis=1, dtype=np.int64)
+    union = target.count + features.counts[:size] - common
+    jaccard = np.divide(common, union, out=np.zeros(size), where=union > 0)
+    scores = AMENITIES_WEIGHT * jaccard + UNIT_TYPE_WEIGHT * (features.unit_types[:size] == unit_type_code)
+
+    price = target.night_price
+    if not np.isnan(price):
+        prices = features.prices[:size]
+        highest = np.maximum(prices, price)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            closeness = np.where(highest > 0, 1.0 - np.abs(prices - price) / highest, 1.0)
+        # units without a price get no price score
+        scores += PRICE_WEIGHT * np.nan_to_num(closeness, nan=0.0)
+    return scores, jaccard
+
+
+def _ranked(features, size, target, unit_type_code, rental_unit_id, limit):
+    """
+    return the most similar units of the first rows of the features to a
+    target entry, distance only re-ranks the best candidates of the other
+    criteria so that it is not computed for every row
+    """
+    scores, jaccard = _scores(features, size, target, unit_type_code)
+    ids = features.ids[:size]
+    scores[(ids < 0) | (ids == rental_unit_id)] = -np.inf
+
+    count = min(limit * CANDIDATES_PER_RESULT, size)
+    if count == 0:
+        return []
+    candidates = np.argpartition(-scores, count - 1)[:count]
+    candidates = candidates[np.isfinite(scores[candidates])]
+
+    distances = {}
+    if not np.isnan(target.latitude):
+        located = candidates[~np.isnan(features.latitudes[candidates])]
+        distances = dict(zip(located.tolist(), geo.haversine_km(
+            target.latitude, target.longitude, features.latitudes[located], features.longitudes[located],
+        ).tolist()))
+
+    results = []
+    for candidate in candidates.tolist():
+        score = float(scores[candidate])
+        distance = distances.get(candidate)
+        if distance is not None:
+            score += DISTANCE_WEIGHT * DISTANCE_SCALE_KM / (DISTANCE_SCALE_KM + distance)
+        results.append(Similar(
+            rental_unit_id=int(ids[candidate]),
+            score=round(score, 4),
+            amenities=round(float(jaccard[candidate]), 4),
+            distance=round(distance, 3) if distance is not None else None,
+        ))
+    results.sort(key=lambda similar: (-similar.score, similar.rental_unit_id))
+
+    return results[:limit]
+
+
+def _database_similar(rental_unit_id, target, limit):
+    """return the most similar of the active units of the same type closest in price, read from the database"""
+    candidates = RentalUnit.objects.exclude(id=rental_unit_id).filter(unit_type__iexact=target.unit_type)
+    if np.isnan(target.night_price):
+        candidates = candidates.order_by('-id')
+    else:
+        candidates = candidates.order_by(
+            Abs(F('pricing__night_price') - target.night_price).asc(nulls_last=True), '-id'
+        )
+    index = Index()
+    for row in _rows(candidates)[:limit * CANDIDATES_PER_RESULT]:
+        index.put(row[0], _entry(row))
+    return _ranked(index.features, index.size, target, index.unit_type_code(target.unit_type), rental_unit_id, limit)
+
+
+def similar_units(rental_unit_id, limit=DEFAULT_LIMIT):
+    """
+    return the most similar active rental units to a rental unit, scored by
+    Jaccard similarity of their amenities, same unit type, price band and
+    distance
+    """
+    index = _get_index()
+    target = None
+    if index is not None:
+        with _lock:
+            # the arrays are replaced, never changed, once a query holds them
+            features, size = index.features, index.size
+            row = index.rows.get(rental_unit_id)
+            if row is not None:
+                target = Entry(
+                    bits=tuple(int(column) for column in features.bits[row]),
+                    count=int(features.counts[row]),
+                    unit_type=None,
+                    night_price=float(features.prices[row]),
+                    latitude=float(features.latitudes[row]),
+                    longitude=float(features.longitudes[row]),
+                )
+                unit_type_code = int(features.unit_types[row])
+    if target is None:
+        row = RentalUnit.objects.filter(id=rental_unit_id).values_list(*FIELDS).first()
+        if row is None:
+            return []
+        target = _entry(row)
+        if index is None:
+            return _database_similar(rental_unit_id, target, limit)
+        unit_type_code = index.unit_type_codes.get(target.unit_type, -1)
+
+    return _ranked(features, size, target, unit_type_code, rental_unit_id, limit)
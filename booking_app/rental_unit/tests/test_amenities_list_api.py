@@ -2,8 +2,10 @@
 tests for amenities list API
 """
 from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse 
 
@@ -103,7 +105,7 @@ class PrivateAmenitiesListApiTests(TestCase):
         amenities = AmenitiesList.objects.all().order_by('-rental_unit')
         serializer = AmenitiesListSerializer(amenities, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_amenities_list_detail(self):
         """test get amenities list detail"""
@@ -262,4 +264,53 @@ class AdminAmenitiesListApiTests(TestCase):
         result = self.client.delete(url)
         
         self.assertEqual(result.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(AmenitiesList.objects.filter(rental_unit=amenities_list.rental_unit.id).exists())
\ No newline at end of file
+        self.assertFalse(AmenitiesList.objects.filter(rental_unit=amenities_list.rental_unit.id).exists())
+        
+    def test_compact_representation(self):
+        """test the compact representation lists only enabled amenities"""
+        rental_unit = create_rental_unit(user=self.user)
+        AmenitiesList.objects.create(rental_unit=rental_unit, popular_wifi=True, popular_pool=True)
+        
+        result = self.client.get(detail_url(rental_unit.id), {'representation': 'compact'})
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, {
+            'rental_unit': rental_unit.id,
+            'amenities': ['popular_pool', 'popular_wifi'],
+        })
+        
+        result = self.client.get(AMENITIES_LIST_URL, {'representation': 'compact'})
+        
+        self.assertEqual(result.data['results'][0]['amenities'], ['popular_pool', 'popular_wifi'])
+        
+    def test_compact_write(self):
+        """test the compact shape replaces every amenity on write"""
+        rental_unit = create_rental_unit(user=self.user)
+        amenities_list = AmenitiesList.objects.create(rental_unit=rental_unit, popular_wifi=True)
+        payload = {'amenities': ['popular_pool', 'safety_security_cameras']}
+        
+        result = self.client.patch(detail_url(rental_unit.id), payload, format='json')
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertTrue(result.data['popular_pool'])
+        amenities_list.refresh_from_db()
+        self.assertFalse(amenities_list.popular_wifi)
+        self.assertTrue(amenities_list.popular_pool)
+        self.assertTrue(amenities_list.safety_security_cameras)
+        
+    def test_compact_write_unknown_amenity(self):
+        """test unknown amenities are rejected"""
+        rental_unit = create_rental_unit(user=self.user)
+        AmenitiesList.objects.create(rental_unit=rental_unit)
+        
+        result = self.client.patch(detail_url(rental_unit.id), {'amenities': ['helipad']}, format='json')
+        
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_benchmark_command(self):
+        """test the amenities representation benchmark runs"""
+        out = StringIO()
+        
+        call_command('benchmark_amenities', '--rows', '10', '--repeat', '1', stdout=out)
+        
+        self.assertIn('compact', out.getvalue())
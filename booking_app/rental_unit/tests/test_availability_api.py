@@ -117,7 +117,7 @@ class PrivateAvailabilityApiTests(TestCase):
         availabilitys = Availability.objects.all().order_by('-rental_unit')
         serializer = AvailabilitySerializer(availabilitys, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_availability_detail(self):
         """test get rental unit detail"""
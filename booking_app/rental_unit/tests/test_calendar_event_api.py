@@ -11,7 +11,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, CalendarEvent, Availability
+from core.models import RentalUnit, CalendarEvent, Availability, CALENDAR_EVENT_START
 
 from rental_unit.serializers import (
     CalendarEventSerializer,
@@ -98,11 +98,30 @@ class PrivateCalendarEventApiTests(TestCase):
         
         result = self.client.get(CALENDAR_EVENT_URL)
         
-        calendar_events = CalendarEvent.objects.all().order_by('-start_date')
+        calendar_events = CalendarEvent.objects.annotate(start=CALENDAR_EVENT_START).order_by('-start', '-id')
         serializer = CalendarEventSerializer(calendar_events, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
-        
+        self.assertEqual(result.data['results'], serializer.data)
+
+    def test_calendar_events_without_start_date_paginated(self):
+        """test paging through CalendarEvents with and without a start date"""
+        rental_unit = create_rental_unit(user=self.user)
+        dated = CalendarEvent.objects.create(rental_unit=rental_unit, reason='Blocked', start_date=date(2023, 6, 28))
+        undated = [
+            CalendarEvent.objects.create(rental_unit=rental_unit, reason='Blocked')
+            for _ in range(3)
+        ]
+
+        ids = []
+        url = CALENDAR_EVENT_URL + '?page_size=1'
+        while url:
+            result = self.client.get(url)
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+            ids.extend(event['id'] for event in result.data['results'])
+            url = result.data['next']
+
+        self.assertEqual(ids, [dated.id] + [event.id for event in reversed(undated)])
+
     def test_get_calendar_event_detail(self):
         """test get rental unit detail"""
         rental_unit = create_rental_unit(user=self.user)
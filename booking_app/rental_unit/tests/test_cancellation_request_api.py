@@ -3,15 +3,17 @@ tests for reservation_request API
 """
 from decimal import Decimal
 from datetime import datetime, timezone, date, timedelta
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, ReservationRequest, CalendarEvent, Availability, Pricing, Reservation, CancellationRequest, Rulebook
+from core.models import RentalUnit, ReservationRequest, CalendarEvent, Availability, Pricing, Reservation, CancellationRequest, Rulebook, Refund
 
 from rental_unit.serializers import (
     CancellationRequestSerializer,
@@ -27,6 +29,12 @@ def detail_url(cancellation_request_id):
     """create and return a detailed reservation_request URL"""
     return reverse('rental_unit:cancellationrequest-detail', args=[cancellation_request_id])
 
+def bulk_cancellation_url(rental_unit_id):
+    """create and return a bulk cancellation URL for a rental unit"""
+    return reverse('rental_unit:rentalunit-cancel-reservations', args=[rental_unit_id])
+
+WHAT_IF_URL = reverse('rental_unit:cancellationrequest-what-if')
+
 def create_rental_unit(user, **params):
     """create and return a rental unit object"""
     defaults = {
@@ -128,10 +136,10 @@ class PrivateCancellationRequestApiTests(TestCase):
 
         result = self.client.get(CANCELLATION_REQUEST_URL)
         
-        cancellation_request_list = CancellationRequest.objects.filter(user=self.user).order_by('-creation_date')
+        cancellation_request_list = CancellationRequest.objects.filter(user=self.user).order_by('-creation_date', '-id')
         serializer = CancellationRequestSerializer(cancellation_request_list, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_cancellation_request_detail(self):
         """test getting a detailed cancellation request"""
@@ -854,4 +862,206 @@ class AdminCancellationRequestApiTests(TestCase):
         
         cancellation_request.refresh_from_db()
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(cancellation_request.status, new_status)
\ No newline at end of file
+        self.assertEqual(cancellation_request.status, new_status)
+
+
+class BulkCancellationApiTests(TestCase):
+    """tests for cancelling every reservation of a rental unit in a date range"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_superuser(
+            email='super@example.com', 
+            password='test1234'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.rental_unit = create_rental_unit(user=self.user)
+        Pricing.objects.create(rental_unit=self.rental_unit, currency='gbp')
+        
+    def create_booked_reservation(self, days_ahead, nights=3, total=Decimal('300.00')):
+        """create a reservation and its calendar event"""
+        reservation = create_reservation(
+            user_id=self.user,
+            rental_unit_id=self.rental_unit,
+            check_in=now + timedelta(days=days_ahead),
+            check_out=now + timedelta(days=days_ahead + nights),
+            total=total
+        )
+        CalendarEvent.objects.create(
+            rental_unit=self.rental_unit,
+            reason='Reservation',
+            start_date=reservation.check_in,
+            end_date=reservation.check_out
+        )
+        return reservation
+        
+    def test_bulk_cancellation(self):
+        """test cancelling and refunding every reservation in a date range"""
+        first = self.create_booked_reservation(10)
+        second = self.create_booked_reservation(20, total=Decimal('150.50'))
+        outside = self.create_booked_reservation(40)
+        CancellationRequest.objects.create(user=self.user, reservation=second)
+        
+        payload = {
+            'start_date': now + timedelta(days=5),
+            'end_date': now + timedelta(days=30),
+            'reason': 'Flooding',
+        }
+        result = self.client.post(bulk_cancellation_url(self.rental_unit.id), payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(result.data['cancelled']), [first.id, second.id])
+        self.assertEqual(result.data['refunded'], Decimal('450.50'))
+        self.assertFalse(Reservation.objects.get(id=first.id).status)
+        self.assertFalse(Reservation.objects.get(id=second.id).status)
+        self.assertTrue(Reservation.objects.get(id=outside.id).status)
+        self.assertEqual(CalendarEvent.objects.filter(rental_unit=self.rental_unit).count(), 1)
+        
+        requests = CancellationRequest.objects.filter(reservation__in=[first, second])
+        self.assertEqual(requests.count(), 2)
+        for cancellation_request in requests:
+            self.assertTrue(cancellation_request.status)
+            self.assertEqual(cancellation_request.refund, 1)
+            self.assertEqual(cancellation_request.reason, 'Flooding')
+        
+        refund = Refund.objects.get(reservation=second)
+        self.assertEqual(refund.amount, Decimal('150.50'))
+        self.assertEqual(refund.currency, 'gbp')
+        self.assertEqual(refund.status, 'Pending')
+        self.assertFalse(Refund.objects.filter(reservation=outside).exists())
+        
+    def test_bulk_cancellation_with_policy(self):
+        """test refunds follow a cancellation policy when one is given"""
+        reservation = self.create_booked_reservation(3)
+        
+        payload = {
+            'start_date': now,
+            'end_date': now + timedelta(days=30),
+            'policy': 'Moderate',
+        }
+        result = self.client.post(bulk_cancellation_url(self.rental_unit.id), payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(CancellationRequest.objects.get(reservation=reservation).refund, Decimal('0.5'))
+        self.assertEqual(Refund.objects.get(reservation=reservation).amount, Decimal('150.00'))
+        
+    def test_error_bulk_cancellation_invalid_range(self):
+        """test an end date before the start date returns an error"""
+        payload = {
+            'start_date': now + timedelta(days=30),
+            'end_date': now,
+        }
+        result = self.client.post(bulk_cancellation_url(self.rental_unit.id), payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_error_bulk_cancellation_not_staff(self):
+        """test a user who is not staff cannot cancel reservations in bulk"""
+        self.user.is_staff = False
+        self.user.save()
+        reservation = self.create_booked_reservation(10)
+        
+        payload = {
+            'start_date': now,
+            'end_date': now + timedelta(days=30),
+        }
+        result = self.client.post(bulk_cancellation_url(self.rental_unit.id), payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Reservation.objects.get(id=reservation.id).status)
+
+
+class PolicyWhatIfApiTests(TestCase):
+    """tests for cancellation policy what-if analytics"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_superuser(
+            email='super@example.com', 
+            password='test1234'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.rental_unit = create_rental_unit(user=self.user)
+        Rulebook.objects.create(rental_unit=self.rental_unit, cancellation_policy='Moderate')
+        
+    def create_cancellation(self, days_ahead, total, refund=None, approved=True, cancelled=True):
+        """create a reservation booked a month ago and cancelled today"""
+        reservation = create_reservation(
+            user_id=self.user,
+            rental_unit_id=self.rental_unit,
+            check_in=now + timedelta(days=days_ahead),
+            check_out=now + timedelta(days=days_ahead + 3),
+            total=total
+        )
+        Reservation.objects.filter(id=reservation.id).update(
+            creation_date=datetime.now(timezone.utc) - timedelta(days=30),
+            status=not cancelled,
+        )
+        return CancellationRequest.objects.create(
+            user=self.user, 
+            reservation=reservation, 
+            status=approved, 
+            refund=refund
+        )
+        
+    def test_what_if(self):
+        """test refunds are compared with the refunds under another policy"""
+        self.create_cancellation(10, Decimal('300.00'), refund=Decimal('1'))
+        self.create_cancellation(3, Decimal('200.00'))
+        params = {
+            'policy': 'Firm',
+            'start_date': now - timedelta(days=1),
+            'end_date': now,
+        }
+        
+        result = self.client.get(WHAT_IF_URL, params)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['cancellations'], 2)
+        self.assertEqual(result.data['actual_refunds'], Decimal('400.00'))
+        self.assertEqual(result.data['simulated_refunds'], Decimal('150.00'))
+        self.assertEqual(result.data['delta'], Decimal('-250.00'))
+        self.assertEqual(result.data['by_current_policy']['Moderate']['cancellations'], 2)
+        
+    def test_what_if_guest_cancellations(self):
+        """test cancellations made by guests are analyzed and pending requests are not"""
+        self.create_cancellation(10, Decimal('300.00'), refund=Decimal('1'), approved=False)
+        self.create_cancellation(10, Decimal('200.00'), approved=False, cancelled=False)
+        params = {'policy': 'Firm', 'start_date': now, 'end_date': now}
+        
+        result = self.client.get(WHAT_IF_URL, params)
+        
+        self.assertEqual(result.data['cancellations'], 1)
+        self.assertEqual(result.data['actual_refunds'], Decimal('300.00'))
+        
+    def test_what_if_filters(self):
+        """test the analysis is limited to rental units and dates"""
+        self.create_cancellation(10, Decimal('300.00'))
+        other = create_rental_unit(user=self.user)
+        
+        params = {'policy': 'Firm', 'start_date': now, 'end_date': now, 'rental_unit': str(other.id)}
+        result = self.client.get(WHAT_IF_URL, params)
+        
+        self.assertEqual(result.data['cancellations'], 0)
+        
+        params = {'policy': 'Firm', 'start_date': now - timedelta(days=9), 'end_date': now - timedelta(days=1)}
+        result = self.client.get(WHAT_IF_URL, params)
+        
+        self.assertEqual(result.data['cancellations'], 0)
+        
+    def test_what_if_staff_only(self):
+        """test only staff can analyze cancellation policies"""
+        user = create_user(email='user@example.com', password='test1234', phone_number='+14155552671')
+        self.client.force_authenticate(user=user)
+        params = {'policy': 'Firm', 'start_date': now, 'end_date': now}
+        
+        result = self.client.get(WHAT_IF_URL, params)
+        
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_what_if_command(self):
+        """test the what-if management command"""
+        self.create_cancellation(10, Decimal('300.00'))
+        out = StringIO()
+        
+        call_command('policy_what_if', 'Firm', '--chunk-size', '1', stdout=out)
+        
+        self.assertIn('1 cancellations', out.getvalue())
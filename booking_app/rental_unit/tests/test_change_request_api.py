@@ -114,10 +114,10 @@ class PrivateChangeRequestApiTests(TestCase):
 
         result = self.client.get(CHANGE_REQUEST_URL)
         
-        cancellation_request_list = ChangeRequest.objects.filter(user=self.user).order_by('-creation_date')
+        cancellation_request_list = ChangeRequest.objects.filter(user=self.user).order_by('-creation_date', '-id')
         serializer = ChangeRequestSerializer(cancellation_request_list, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_change_request_detail(self):
         """test getting a detailed change request"""
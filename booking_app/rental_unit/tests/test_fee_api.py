@@ -107,10 +107,10 @@ class PrivateFeeApiTests(TestCase):
         
         result = self.client.get(FEE_URL)
         
-        fees = Fee.objects.all().order_by('-rental_unit')
+        fees = Fee.objects.all().order_by('-id')
         serializer = FeeSerializer(fees, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_fee_detail(self):
         """test get rental unit detail"""
@@ -4,13 +4,15 @@ tests for location API
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, Location
+from core.models import RentalUnit, Location, Pricing, Place
+from rental_unit import autocomplete, reloading
 
 from rental_unit.serializers import (
     LocationSerializer,
@@ -19,6 +21,10 @@ from rental_unit.serializers import (
 
 
 LOCATION_URL = reverse('rental_unit:location-list')
+CLUSTERS_URL = reverse('rental_unit:location-clusters')
+AUTOCOMPLETE_URL = reverse('rental_unit:location-autocomplete')
+# query counts are asserted without the queries of the database cache
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
 ## HELPER FUNCTIONS
 def detail_url(location_id):
@@ -120,7 +126,7 @@ class PrivateLocationApiTests(TestCase):
         locations = Location.objects.all().order_by('-rental_unit')
         serializer = LocationSerializer(locations, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_location_detail(self):
         """test get rental unit detail"""
@@ -314,4 +320,174 @@ class AdminLocationApiTests(TestCase):
         result = self.client.delete(url)
         
         self.assertEqual(result.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(Location.objects.filter(rental_unit=location.rental_unit.id).exists())
\ No newline at end of file
+        self.assertFalse(Location.objects.filter(rental_unit=location.rental_unit.id).exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LocationClustersApiTests(TestCase):
+    """tests for map clusters of locations"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='test1234')
+        
+    def create_located_unit(self, latitude, longitude, night_price):
+        """create a priced rental unit at a coordinate"""
+        rental_unit = create_rental_unit(user=self.user)
+        Pricing.objects.create(rental_unit=rental_unit, night_price=Decimal(night_price))
+        return create_location(rental_unit, latitude=Decimal(latitude), longitude=Decimal(longitude))
+        
+    def test_clusters(self):
+        """test locations are grouped per grid cell of the zoom level"""
+        self.create_located_unit('40.416800', '-3.703800', '90.00')
+        self.create_located_unit('40.420000', '-3.700000', '60.00')
+        self.create_located_unit('41.387400', '2.168600', '120.00')
+        self.create_located_unit('48.856600', '2.352200', '200.00')
+        
+        with self.assertNumQueries(1):
+            result = self.client.get(CLUSTERS_URL, {'bbox': '36.0,-10.0,44.0,5.0', 'zoom': '6'})
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(result.data), 2)
+        madrid = next(cluster for cluster in result.data if cluster['count'] == 2)
+        self.assertEqual(madrid['cell'], 'ezj')
+        self.assertEqual(madrid['min_price'], Decimal('60.00'))
+        self.assertEqual(madrid['latitude'], Decimal('40.418400'))
+        
+    def test_clusters_zoom_level(self):
+        """test higher zoom levels split locations into smaller cells"""
+        self.create_located_unit('40.416800', '-3.703800', '90.00')
+        self.create_located_unit('40.420000', '-3.700000', '60.00')
+        
+        result = self.client.get(CLUSTERS_URL, {'bbox': '40.0,-4.0,41.0,-3.0', 'zoom': '18'})
+        
+        self.assertEqual(len(result.data), 2)
+        
+    def test_clusters_viewport_required(self):
+        """test the viewport and zoom are required"""
+        result = self.client.get(CLUSTERS_URL, {'zoom': '6'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        result = self.client.get(CLUSTERS_URL, {'bbox': '36.0,-10.0,44.0,5.0', 'zoom': '40'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LocationAutocompleteApiTests(TestCase):
+    """tests for city, country and place suggestions"""
+    
+    def setUp(self):
+        autocomplete.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='test1234')
+        
+    def tearDown(self):
+        autocomplete.clear()
+        
+    def create_located_unit(self, city, country='ESP'):
+        """create a rental unit in a city"""
+        rental_unit = create_rental_unit(user=self.user)
+        return Location.objects.create(rental_unit=rental_unit, city=city, country=country)
+        
+    def suggestions(self, q, **params):
+        """return the (kind, text) of the suggestions of a prefix"""
+        result = self.client.get(AUTOCOMPLETE_URL, {'q': q, **params})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return [(suggestion['kind'], suggestion['text']) for suggestion in result.data]
+        
+    def test_autocomplete(self):
+        """test cities, countries and places are suggested by prefix, most used first"""
+        self.create_located_unit('Cádiz')
+        self.create_located_unit('Cádiz')
+        location = self.create_located_unit('Calpe')
+        self.create_located_unit('Madrid')
+        Place.objects.create(rental_unit=location.rental_unit, name='Cala Fustera', category='Beach', city='Calpe')
+        autocomplete.load()
+        
+        self.assertEqual(
+            self.suggestions('ca'),
+            [('city', 'Cádiz'), ('city', 'Calpe'), ('place', 'Cala Fustera')],
+        )
+        self.assertEqual(self.suggestions('CAD'), [('city', 'Cádiz')])
+        self.assertEqual(self.suggestions('es'), [('country', 'ESP')])
+        self.assertEqual(self.suggestions('ca', limit=1), [('city', 'Cádiz')])
+        self.assertEqual(self.suggestions('zz'), [])
+        
+    def test_autocomplete_refreshed(self):
+        """test changed and deleted locations and places are applied to loaded suggestions"""
+        location = self.create_located_unit('Sevilla')
+        autocomplete.load()
+        self.assertEqual(self.suggestions('sev'), [('city', 'Sevilla')])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            location.city = 'Segovia'
+            location.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            place = Place.objects.create(
+                rental_unit=location.rental_unit, name='Acueducto', category='Restaurant', city='Segovia'
+            )
+        
+        self.assertEqual(self.suggestions('se'), [('city', 'Segovia')])
+        self.assertEqual(self.suggestions('acu'), [('place', 'Acueducto')])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            place.delete()
+        self.assertEqual(self.suggestions('acu'), [])
+        
+    def test_best_suggestions_updated(self):
+        """test the cached best suggestions follow weight changes without missing uncached ones"""
+        trie = autocomplete.Trie()
+        suggestions = [autocomplete.Suggestion('city', f'Ca{number:03d}', 'ESP') for number in range(100)]
+        for number, suggestion in enumerate(suggestions):
+            trie.add(suggestion, number % 7 + 1)
+        trie.warm(autocomplete.WARM_DEPTH)
+        
+        for number, suggestion in enumerate(suggestions):
+            trie.add(suggestion, -(number % 5))
+            trie.add(suggestions[-number - 1], number % 3)
+            expected = sorted(trie.weights.items(), key=lambda item: (-item[1], item[0]))
+            self.assertEqual(trie.complete('ca', autocomplete.MAX_LIMIT), expected[:autocomplete.MAX_LIMIT])
+        
+    def test_autocomplete_invalid(self):
+        """test a missing prefix or invalid limit returns an error"""
+        self.assertEqual(self.client.get(AUTOCOMPLETE_URL).status_code, status.HTTP_400_BAD_REQUEST)
+        result = self.client.get(AUTOCOMPLETE_URL, {'q': 'ca', 'limit': '100'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LocationAutocompleteReloadTests(TransactionTestCase):
+    """tests for loading suggestions off the request path"""
+    
+    def setUp(self):
+        autocomplete.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='test1234')
+        rental_unit = create_rental_unit(user=self.user)
+        Location.objects.create(rental_unit=rental_unit, city='Sevilla', country='ESP')
+        
+    def tearDown(self):
+        reloading.join()
+        autocomplete.clear()
+        
+    def test_autocomplete_loaded_in_background(self):
+        """test the database suggests until the suggestions are loaded"""
+        result = self.client.get(AUTOCOMPLETE_URL, {'q': 'sev'})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, [{'kind': 'city', 'text': 'Sevilla', 'detail': 'ESP', 'count': 1}])
+        
+        reloading.join()
+        
+        self.assertIsNotNone(autocomplete._index)
+        result = self.client.get(AUTOCOMPLETE_URL, {'q': 'sev'})
+        self.assertEqual(result.data, [{'kind': 'city', 'text': 'Sevilla', 'detail': 'ESP', 'count': 1}])
+        
+    def test_expired_autocomplete_reloaded_in_background(self):
+        """test expired suggestions keep answering while they are reloaded"""
+        autocomplete.load()
+        # a change the signals do not see, only a reload picks it up
+        Location.objects.update(city='Segovia')
+        autocomplete._loaded_at -= autocomplete.INDEX_TIMEOUT + 1
+        
+        self.assertEqual(len(self.client.get(AUTOCOMPLETE_URL, {'q': 'sev'}).data), 1)
+        reloading.join()
+        self.assertEqual(self.client.get(AUTOCOMPLETE_URL, {'q': 'sev'}).data, [])
@@ -5,13 +5,14 @@ from decimal import Decimal
 from datetime import datetime, timezone
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, Place
+from core.models import RentalUnit, Place, Location
 
 from rental_unit.serializers import (
     PlaceSerializer,
@@ -20,11 +21,17 @@ from rental_unit.serializers import (
 
 
 PLACE_URL = reverse('rental_unit:place-list')
+# query counts are asserted without the queries of the database cache
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
 def detail_url(place_id):
     """create and return a detailed place URL"""
     return reverse('rental_unit:place-detail', args=[place_id])
 
+def nearby_places_url(rental_unit_id):
+    """create and return a nearby places URL for a rental unit"""
+    return reverse('rental_unit:rentalunit-nearby-places', args=[rental_unit_id])
+
 def create_rental_unit(user, **params):
     """create and return a rental unit object"""
     defaults = {
@@ -105,10 +112,10 @@ class PrivatePlaceApiTests(TestCase):
         
         result = self.client.get(PLACE_URL)
         
-        places = Place.objects.all().order_by('-category')
+        places = Place.objects.all().order_by('-id')
         serializer = PlaceSerializer(places, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_place_detail(self):
         """test get rental unit detail"""
@@ -325,4 +332,72 @@ class AdminPlaceApiTests(TestCase):
         result = self.client.delete(url)
         
         self.assertEqual(result.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(Place.objects.filter(id=place.id).exists())
\ No newline at end of file
+        self.assertFalse(Place.objects.filter(id=place.id).exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class NearbyPlacesApiTests(TestCase):
+    """tests for places near a rental unit"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.rental_unit = create_rental_unit(user=self.user)
+        Location.objects.create(
+            rental_unit=self.rental_unit, 
+            latitude=Decimal('36.529700'), 
+            longitude=Decimal('-6.292700')
+        )
+        self.other_unit = create_rental_unit(user=self.user)
+        
+    def create_place(self, name, latitude, longitude, category='Restaurant', rental_unit=None):
+        """create a place at a coordinate"""
+        return Place.objects.create(
+            rental_unit=rental_unit or self.other_unit,
+            name=name,
+            category=category,
+            latitude=Decimal(latitude),
+            longitude=Decimal(longitude),
+        )
+        
+    def test_nearby_places(self):
+        """test places of any unit within the radius are returned nearest first"""
+        beach = self.create_place('Playa Victoria', '36.520000', '-6.290000', category='Beach')
+        bar = self.create_place('Bar', '36.530000', '-6.293000', rental_unit=self.rental_unit)
+        self.create_place('Far away', '37.389100', '-5.984500')
+        
+        result = self.client.get(nearby_places_url(self.rental_unit.id))
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual([place['id'] for place in result.data], [bar.id, beach.id])
+        self.assertLess(result.data[0]['distance'], 0.1)
+        self.assertAlmostEqual(result.data[1]['distance'], 1.1, places=1)
+        
+    def test_nearby_places_filters(self):
+        """test nearby places are filtered by radius and category"""
+        beach = self.create_place('Playa Victoria', '36.520000', '-6.290000', category='Beach')
+        self.create_place('Bar', '36.530000', '-6.293000')
+        
+        result = self.client.get(nearby_places_url(self.rental_unit.id), {'category': 'Beach'})
+        self.assertEqual([place['id'] for place in result.data], [beach.id])
+        
+        result = self.client.get(nearby_places_url(self.rental_unit.id), {'radius': '0.5'})
+        self.assertEqual(len(result.data), 1)
+        
+        result = self.client.get(nearby_places_url(self.rental_unit.id), {'radius': '500'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_nearby_places_cached(self):
+        """test nearby places are cached per unit and refreshed when places change"""
+        self.create_place('Bar', '36.530000', '-6.293000')
+        self.client.get(nearby_places_url(self.rental_unit.id))
+        
+        with self.assertNumQueries(0):
+            self.client.get(nearby_places_url(self.rental_unit.id))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_place('Cafe', '36.531000', '-6.293000')
+        result = self.client.get(nearby_places_url(self.rental_unit.id))
+        
+        self.assertEqual(len(result.data), 2)
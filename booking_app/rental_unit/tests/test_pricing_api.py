@@ -106,7 +106,7 @@ class PrivatePricingApiTests(TestCase):
         pricing_list = Pricing.objects.all().order_by('-rental_unit')
         serializer = PricingSerializer(pricing_list, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_pricing_detail(self):
         """test that an authenticated request can read a detailed pricing"""
@@ -1,6 +1,7 @@
 """
 tests for rental unit API
 """
+from datetime import date, timedelta
 from decimal import Decimal
 import tempfile
 import os
@@ -8,13 +9,14 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse 
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit
+from core.models import RentalUnit, Location, Pricing, AmenitiesList, Room, Fee, Place, Reservation
 
 from rental_unit.serializers import (
     RentalUnitSerializer,
@@ -23,6 +25,9 @@ from rental_unit.serializers import (
 
 
 RENTAL_UNIT_URL = reverse('rental_unit:rentalunit-list')
+DASHBOARD_URL = reverse('rental_unit:rentalunit-dashboard')
+# query counts are asserted without the queries of the database cache
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
 ## HELPER FUNCTIONS
 def detail_url(rental_unit_id):
@@ -33,6 +38,10 @@ def image_upload_url(rental_unit_id):
     """create and return an image upload URL"""
     return reverse('rental_unit:rentalunit-upload-image', args=[rental_unit_id])
 
+def listing_url(rental_unit_id):
+    """create and return a rental unit listing URL"""
+    return reverse('rental_unit:rentalunit-listing', args=[rental_unit_id])
+
 def create_rental_unit(user, **params):
     """create and return a rental unit object"""
     defaults = {
@@ -108,7 +117,64 @@ class PrivateRentalUnitApiTests(TestCase):
         rental_units = RentalUnit.objects.all().order_by('-id')
         serializer = RentalUnitSerializer(rental_units, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
+
+    def test_list_cursor_pagination(self):
+        """test walking every page of rental units with the cursor"""
+        created = [create_rental_unit(user=self.user).id for _ in range(5)]
+        
+        seen = []
+        url = RENTAL_UNIT_URL + '?page_size=2'
+        while url:
+            result = self.client.get(url)
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(result.data['results']), 2)
+            seen.extend(rental_unit['id'] for rental_unit in result.data['results'])
+            url = result.data['next']
+        
+        self.assertEqual(seen, sorted(created, reverse=True))
+
+    def test_sparse_fields(self):
+        """test only the requested fields are returned"""
+        rental_unit = create_rental_unit(user=self.user)
+        
+        result = self.client.get(RENTAL_UNIT_URL, {'fields': 'title,image'})
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(result.data['results'][0]), {'title', 'image'})
+        
+        result = self.client.get(detail_url(rental_unit.id), {'fields': 'id,max_guests'})
+        
+        self.assertEqual(result.data, {'id': rental_unit.id, 'max_guests': rental_unit.max_guests})
+        
+    def test_expand_related(self):
+        """test related one to one objects are inlined in one query"""
+        rental_unit = create_rental_unit(user=self.user)
+        Pricing.objects.create(rental_unit=rental_unit, night_price=Decimal('80.00'))
+        Location.objects.create(rental_unit=rental_unit, city='Cadiz')
+        create_rental_unit(user=self.user)
+        
+        with self.assertNumQueries(1):
+            result = self.client.get(
+                RENTAL_UNIT_URL, 
+                {'fields': 'title,image', 'expand': 'pricing,location,availability'}
+            )
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        expanded, plain = result.data['results'][1], result.data['results'][0]
+        self.assertEqual(set(expanded), {'title', 'image', 'pricing', 'location', 'availability'})
+        self.assertEqual(expanded['pricing']['night_price'], '80.00')
+        self.assertEqual(expanded['location']['city'], 'Cadiz')
+        self.assertIsNone(expanded['availability'])
+        self.assertIsNone(plain['pricing'])
+        
+    def test_unknown_fields(self):
+        """test unknown fields and expansions return an error"""
+        result = self.client.get(RENTAL_UNIT_URL, {'fields': 'title,secret'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        result = self.client.get(RENTAL_UNIT_URL, {'expand': 'owner'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_get_rental_unit_detail(self):
         """test get rental unit detail"""
@@ -245,6 +311,20 @@ class AdminRentalUnitApiTests(TestCase):
         self.assertEqual(rental_unit.link, original_link)
         self.assertEqual(rental_unit.user, self.user)
 
+    def test_partial_update_ignores_sparse_fields(self):
+        """test ?fields= does not narrow the fields a patch writes"""
+        rental_unit = create_rental_unit(user=self.user, title='sample unit title')
+
+        payload = {'title': 'new unit title', 'link': 'https://example.com/new-unit.pdf'}
+        url = detail_url(rental_unit.id) + '?fields=title'
+        result = self.client.patch(url, payload)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        rental_unit.refresh_from_db()
+        self.assertEqual(rental_unit.title, payload['title'])
+        self.assertEqual(rental_unit.link, payload['link'])
+        self.assertEqual(result.data['link'], payload['link'])
+
     def test_full_update(self):
         """test put of rental unit"""
         rental_unit = create_rental_unit(
@@ -317,4 +397,139 @@ class ImageUploadTests(TestCase):
         payload = {'image': 'notanimage'}
         res = self.client.post(url, payload, format='multipart')
             
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ListingApiTests(TestCase):
+    """tests for the composite listing of a rental unit"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.rental_unit = create_rental_unit(user=self.user, title='Beach house')
+        AmenitiesList.objects.create(rental_unit=self.rental_unit, popular_wifi=True)
+        Location.objects.create(rental_unit=self.rental_unit, city='Cadiz')
+        Room.objects.create(rental_unit=self.rental_unit, name='Main bedroom')
+        Pricing.objects.create(rental_unit=self.rental_unit, night_price=Decimal('80.00'))
+        Fee.objects.create(rental_unit=self.rental_unit, name='Pet', price=Decimal('20.00'))
+        Place.objects.create(rental_unit=self.rental_unit, name='Playa Victoria', category='Beach')
+        
+    def test_listing(self):
+        """test the listing includes every table of the rental unit in a constant number of queries"""
+        with self.assertNumQueries(5):
+            result = self.client.get(listing_url(self.rental_unit.id))
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['title'], 'Beach house')
+        self.assertTrue(result.data['amenities']['popular_wifi'])
+        self.assertEqual(result.data['location']['city'], 'Cadiz')
+        self.assertEqual(result.data['rooms'][0]['name'], 'Main bedroom')
+        self.assertEqual(result.data['pricing']['night_price'], '80.00')
+        self.assertEqual([fee['name'] for fee in result.data['fees']], ['Pet'])
+        self.assertEqual([place['name'] for place in result.data['places']], ['Playa Victoria'])
+        self.assertEqual(result.data['photos'], [])
+        self.assertIsNone(result.data['rulebook'])
+        self.assertNotIn('search_vector', result.data)
+        
+    def test_listing_cached(self):
+        """test the listing is cached until one of its tables changes"""
+        self.client.get(listing_url(self.rental_unit.id))
+        with self.assertNumQueries(0):
+            result = self.client.get(listing_url(self.rental_unit.id))
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Fee.objects.create(rental_unit=self.rental_unit, name='Transport', price=Decimal('10.00'))
+            # invalidated once committed, so a read meanwhile cannot cache the old rows again
+            result = self.client.get(listing_url(self.rental_unit.id))
+            self.assertEqual(len(result.data['fees']), 1)
+        result = self.client.get(listing_url(self.rental_unit.id))
+        
+        self.assertEqual(len(result.data['fees']), 2)
+        
+    def test_listing_cache_scoped_to_rental_unit(self):
+        """test changing another rental unit keeps the cached listing"""
+        other = create_rental_unit(user=self.user)
+        self.client.get(listing_url(self.rental_unit.id))
+        
+        Fee.objects.create(rental_unit=other, name='Transport', price=Decimal('10.00'))
+        with self.assertNumQueries(0):
+            result = self.client.get(listing_url(self.rental_unit.id))
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        
+    def test_listing_not_found(self):
+        """test the listing of a missing rental unit returns not found"""
+        result = self.client.get(listing_url(self.rental_unit.id + 1))
+        
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class HostDashboardApiTests(TestCase):
+    """tests for the portfolio dashboard of a host"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.guest = create_user(email='guest@example.com', password='testpass123', phone_number='+14155552671')
+        self.client.force_authenticate(user=self.user)
+        self.today = date.today()
+        
+    def reserve(self, rental_unit, check_in, nights, total, active=True):
+        """create a reservation starting a number of days from today"""
+        check_in = self.today + timedelta(days=check_in)
+        return Reservation.objects.create(
+            rental_unit=rental_unit, user=self.guest, check_in=check_in,
+            check_out=check_in + timedelta(days=nights), total=Decimal(total), status=active,
+        )
+        
+    def test_dashboard(self):
+        """test per unit reservations, upcoming check-ins, occupancy and revenue in one query"""
+        busy = create_rental_unit(user=self.user, title='Busy')
+        quiet = create_rental_unit(user=self.user, title='Quiet')
+        other = create_rental_unit(user=self.guest, title='Not mine')
+        self.reserve(busy, -40, 5, '500.00')
+        self.reserve(busy, -12, 6, '600.00')
+        self.reserve(busy, -2, 4, '400.00')
+        self.reserve(busy, 5, 2, '200.00')
+        self.reserve(busy, -20, 3, '300.00', active=False)
+        self.reserve(other, 1, 2, '200.00')
+        
+        with self.assertNumQueries(1):
+            result = self.client.get(DASHBOARD_URL)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        units = {unit['id']: unit for unit in result.data['units']}
+        self.assertEqual(set(units), {busy.id, quiet.id})
+        self.assertEqual(units[busy.id]['reservations'], 4)
+        self.assertEqual(units[busy.id]['upcoming_check_ins'], 1)
+        self.assertEqual(units[busy.id]['next_check_in'], self.today + timedelta(days=5))
+        self.assertEqual(units[busy.id]['booked_nights'], 8)
+        self.assertEqual(units[busy.id]['occupancy_rate'], round(8 / 30, 4))
+        self.assertEqual(units[busy.id]['revenue'], Decimal('1700.00'))
+        self.assertEqual(units[quiet.id]['reservations'], 0)
+        self.assertEqual(units[quiet.id]['occupancy_rate'], 0)
+        self.assertEqual(result.data['totals']['revenue'], Decimal('1700.00'))
+        self.assertEqual(result.data['totals']['occupancy_rate'], round(8 / 60, 4))
+        
+    def test_dashboard_cached(self):
+        """test the dashboard is cached briefly"""
+        self.client.get(DASHBOARD_URL)
+        
+        with self.assertNumQueries(0):
+            result = self.client.get(DASHBOARD_URL)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        
+    def test_dashboard_requires_authentication(self):
+        """test anonymous users have no dashboard"""
+        self.client.force_authenticate(user=None)
+        
+        result = self.client.get(DASHBOARD_URL)
+        
+        self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
+
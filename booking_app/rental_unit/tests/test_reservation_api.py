@@ -2,7 +2,7 @@
 tests for reservation API
 """
 from decimal import Decimal
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
@@ -11,7 +11,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, Reservation, CalendarEvent, Availability, Pricing
+from core.models import RentalUnit, Reservation, CalendarEvent, Availability, Pricing, Rulebook, CancellationRequest
 
 from rental_unit.serializers import (
     ReservationSerializer,
@@ -25,6 +25,10 @@ def detail_url(reservation_id):
     """create and return a detailed reservation URL"""
     return reverse('rental_unit:reservation-detail', args=[reservation_id])
 
+def refund_preview_url(reservation_id):
+    """create and return a refund preview URL"""
+    return reverse('rental_unit:reservation-refund-preview', args=[reservation_id])
+
 def create_rental_unit(user, **params):
     """create and return a rental unit object"""
     defaults = {
@@ -124,10 +128,10 @@ class PrivateReservationApiTests(TestCase):
         res_three = create_reservation(user_id=self.user, rental_unit_id=rental_unit_three)
         result = self.client.get(RESERVATION_URL)
         
-        reservation_list = Reservation.objects.filter(user=self.user).order_by('-check_in')
+        reservation_list = Reservation.objects.filter(user=self.user).order_by('-check_in', '-id')
         serializer = ReservationSerializer(reservation_list, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_reservation_detail(self):
         """test get reservation detail"""
@@ -529,4 +533,70 @@ class AdminReservationApiTests(TestCase):
 #             start_date=payload['check_in'],
 #             end_date=payload['check_out']
 #         )[0]
-#         self.assertTrue(CalendarEvent.objects.filter(id=calendar_event.id).exists())
\ No newline at end of file
+#         self.assertTrue(CalendarEvent.objects.filter(id=calendar_event.id).exists())
+
+
+class RefundPreviewApiTests(TestCase):
+    """tests for previewing the refund of a reservation"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com', 
+            password='test1234'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.rental_unit = create_rental_unit(user=self.user)
+        Rulebook.objects.create(rental_unit=self.rental_unit, cancellation_policy='Moderate')
+        self.check_in = datetime.now().date() + timedelta(days=10)
+        self.reservation = create_reservation(
+            user_id=self.user,
+            rental_unit_id=self.rental_unit,
+            check_in=self.check_in,
+            check_out=self.check_in + timedelta(days=4),
+            total=Decimal('401.00')
+        )
+        
+    def test_refund_preview(self):
+        """test previewing a refund for a given date"""
+        url = refund_preview_url(self.reservation.id)
+        result = self.client.get(url, {'date': self.check_in - timedelta(days=3)})
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['policy'], 'Moderate')
+        self.assertEqual(result.data['days_before_check_in'], 3)
+        self.assertEqual(result.data['refund'], Decimal('0.5'))
+        self.assertEqual(result.data['amount'], Decimal('200.50'))
+        self.assertIn('max-age=300', result['Cache-Control'])
+        
+    def test_refund_preview_has_no_side_effects(self):
+        """test previewing a refund does not cancel the reservation"""
+        calendar_event = CalendarEvent.objects.create(
+            rental_unit=self.rental_unit,
+            reason='Reservation',
+            start_date=self.reservation.check_in,
+            end_date=self.reservation.check_out
+        )
+        
+        result = self.client.get(refund_preview_url(self.reservation.id))
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['refund'], Decimal('1'))
+        self.reservation.refresh_from_db()
+        self.assertTrue(self.reservation.status)
+        self.assertFalse(CancellationRequest.objects.filter(reservation=self.reservation).exists())
+        self.assertTrue(CalendarEvent.objects.filter(id=calendar_event.id).exists())
+        
+    def test_refund_preview_invalid_date(self):
+        """test an invalid date returns an error"""
+        result = self.client.get(refund_preview_url(self.reservation.id), {'date': 'tomorrow'})
+        
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        
+    def test_refund_preview_other_user(self):
+        """test a user cannot preview the refund of another user's reservation"""
+        guest = create_user(email='guest@example.com', password='pass1234', phone_number='+14155552671')
+        reservation = create_reservation(user_id=guest, rental_unit_id=self.rental_unit)
+        
+        result = self.client.get(refund_preview_url(reservation.id))
+        
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
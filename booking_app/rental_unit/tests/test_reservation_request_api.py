@@ -11,7 +11,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import RentalUnit, ReservationRequest, CalendarEvent, Availability, Pricing, Reservation
+from core.models import RentalUnit, ReservationRequest, CalendarEvent, Availability, Pricing, Reservation, Fee, LineItem
 
 from rental_unit.serializers import (
     ReservationRequestSerializer,
@@ -129,10 +129,10 @@ class PrivateReservationRequestApiTests(TestCase):
        
         result = self.client.get(RESERVATION_REQUEST_URL)
         
-        reservation_list = ReservationRequest.objects.filter(user=self.user).order_by('-check_in')
+        reservation_list = ReservationRequest.objects.filter(user=self.user).order_by('-check_in', '-id')
         serializer = ReservationRequestSerializer(reservation_list, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_reservation_request_detail(self):
         """test get reservation request detail"""
@@ -491,6 +491,43 @@ class PrivateReservationRequestApiTests(TestCase):
         nights = delta.days
         self.assertEqual(reservation.nights, nights)
         
+    def test_fees_added_to_total(self):
+        """test pet and extra guest fees are added to the total and saved as line items"""
+        rental_unit = create_rental_unit(user=self.user, max_guests=2)
+        availability = Availability.objects.create(rental_unit=rental_unit, instant_booking=True)
+        pricing = Pricing.objects.create(
+            rental_unit=rental_unit, 
+            night_price=Decimal('100.00'),
+            tax=Decimal('10.00')
+        )
+        Fee.objects.create(rental_unit=rental_unit, name='Pet', price=Decimal('25.00'))
+        Fee.objects.create(rental_unit=rental_unit, name='Extra guest', price=Decimal('10.00'))
+        Fee.objects.create(rental_unit=rental_unit, name='Transport', price=Decimal('40.00'))
+        
+        payload = {
+            'rental_unit': rental_unit.id,
+            'user': self.user.id,
+            'check_in': date(2023, 9, 15),
+            'check_out': date(2023, 9, 18),
+            'guests': 3,
+            'pets': True,
+        }
+        result = self.client.post(RESERVATION_REQUEST_URL, payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        reservation = Reservation.objects.get(rental_unit=rental_unit)
+        
+        # 3 nights at 100 + pet fee 25 + 1 extra guest * 3 nights * 10, plus 10% tax
+        self.assertEqual(reservation.subtotal, Decimal('300.00'))
+        self.assertEqual(reservation.total, Decimal('390.50'))
+        self.assertEqual(reservation.guests, 3)
+        
+        line_items = {item.name: item for item in LineItem.objects.filter(reservation=reservation)}
+        self.assertEqual(set(line_items), {'Nights', 'Pet', 'Extra guest', 'Taxes'})
+        self.assertEqual(line_items['Extra guest'].quantity, 3)
+        self.assertEqual(line_items['Extra guest'].amount, Decimal('30.00'))
+        self.assertEqual(line_items['Taxes'].amount, Decimal('35.50'))
+        
         
 class AdminReservationRequestApiTests(TestCase):
     """tests for administrative users"""
@@ -638,6 +675,56 @@ class AdminReservationRequestApiTests(TestCase):
         ).exists())
         
         
+    def test_pricing_change_reprices_pending_requests(self):
+        """test editing the pricing of a rental unit updates the quotes of its pending requests"""
+        rental_unit = create_rental_unit(user=self.user)
+        pricing = Pricing.objects.create(rental_unit=rental_unit, night_price=Decimal('100.00'))
+        availability = Availability.objects.create(rental_unit=rental_unit)
+        
+        for check_in, check_out in [(date(2023, 8, 2), date(2023, 8, 6)), (date(2023, 9, 1), date(2023, 9, 3))]:
+            payload = {
+                'rental_unit': rental_unit.id,
+                'user': self.user.id,
+                'check_in': check_in,
+                'check_out': check_out
+            }
+            result = self.client.post(RESERVATION_REQUEST_URL, payload)
+            self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        
+        self.assertEqual(
+            sorted(ReservationRequest.objects.values_list('total', flat=True)),
+            [Decimal('200.00'), Decimal('400.00')]
+        )
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            pricing.night_price = Decimal('150.00')
+            pricing.save()
+        
+        self.assertEqual(
+            sorted(ReservationRequest.objects.values_list('total', flat=True)),
+            [Decimal('300.00'), Decimal('600.00')]
+        )
+        reservation_request = ReservationRequest.objects.get(check_in=date(2023, 8, 2))
+        self.assertEqual(
+            LineItem.objects.get(reservation_request=reservation_request, name='Nights').amount,
+            Decimal('600.00')
+        )
+        
+        patch_payload = {
+            'rental_unit': rental_unit.id,
+            'user': self.user.id,
+            'check_in': date(2023, 8, 2),
+            'check_out': date(2023, 8, 6),
+            'status': True
+        }
+        url = detail_url(reservation_request.id)
+        result = self.client.patch(url, patch_payload)
+        
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        reservation = Reservation.objects.get(reservation_request=reservation_request)
+        self.assertEqual(reservation.total, Decimal('600.00'))
+        self.assertTrue(LineItem.objects.filter(reservation=reservation, name='Nights').exists())
+        
     def test_delete_reservation(self):
         """test admin deleting a reservation"""
         rental_unit = create_rental_unit(user=self.user)
@@ -68,7 +68,7 @@ class PublicRoomApiTests(TestCase):
         rental_unit = create_rental_unit(user=user)
         room = Room.objects.create(rental_unit=rental_unit)
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.get(url)
         serializer = RoomDetailSerializer(room)
 
@@ -96,17 +96,17 @@ class PrivateRoomApiTests(TestCase):
         
         result = self.client.get(ROOM_URL)
         
-        room = Room.objects.all().order_by('-rental_unit')
+        room = Room.objects.all().order_by('-id')
         serializer = RoomSerializer(room, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_room_detail(self):
         """test get rental unit detail"""
         rental_unit = create_rental_unit(user=self.user)
         room = Room.objects.create(rental_unit=rental_unit)
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.get(url)
 
         serializer = RoomDetailSerializer(room)
@@ -142,7 +142,7 @@ class PrivateRoomApiTests(TestCase):
             'room_type': 'bedroom'
         }
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.patch(url, payload)
         
         self.assertEqual(result.status_code, status.HTTP_403_FORBIDDEN)
@@ -170,7 +170,7 @@ class PrivateRoomApiTests(TestCase):
             'tv': True,
             'accessible': False,
         }
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         
         result = self.client.put(url, payload)
 
@@ -188,7 +188,7 @@ class PrivateRoomApiTests(TestCase):
         rental_unit = create_rental_unit(user=self.user)
         room = Room.objects.create(rental_unit=rental_unit)
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.delete(url)
         
         self.assertEqual(result.status_code, status.HTTP_403_FORBIDDEN)
@@ -234,7 +234,7 @@ class AdminRoomApiTests(TestCase):
             'name': 'a new name'
         }
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.patch(url, payload)
         
         self.assertEqual(result.status_code, status.HTTP_200_OK)
@@ -255,7 +255,7 @@ class AdminRoomApiTests(TestCase):
             'tv': True,
             'accessible': False,
         }
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         
         result = self.client.put(url, payload)
 
@@ -273,8 +273,31 @@ class AdminRoomApiTests(TestCase):
         rental_unit = create_rental_unit(user=self.user)
         room = Room.objects.create(rental_unit=rental_unit)
         
-        url = detail_url(room.rental_unit.id)
+        url = detail_url(room.id)
         result = self.client.delete(url)
         
         self.assertEqual(result.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(Room.objects.filter(rental_unit=room.rental_unit.id).exists())
\ No newline at end of file
+        self.assertFalse(Room.objects.filter(rental_unit=room.rental_unit.id).exists())
+
+    def test_rooms_update_capacity(self):
+        """test a rental unit counts the bedrooms, beds and baths of its rooms"""
+        rental_unit = create_rental_unit(user=self.user)
+        for payload in (
+            {'rental_unit': rental_unit.id, 'room_type': 'Bedroom', 'beds': 2},
+            {'rental_unit': rental_unit.id, 'room_type': 'Bedroom', 'beds': 1},
+            {'rental_unit': rental_unit.id, 'room_type': 'Bathroom (full)'},
+            {'rental_unit': rental_unit.id, 'room_type': 'Bathroom (half)'},
+        ):
+            result = self.client.post(ROOM_URL, payload)
+            self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+
+        rental_unit.refresh_from_db()
+        self.assertEqual(Room.objects.filter(rental_unit=rental_unit).count(), 4)
+        self.assertEqual((rental_unit.bedrooms, rental_unit.beds), (2, 3))
+        self.assertEqual(rental_unit.baths, Decimal('1.5'))
+
+        room = Room.objects.get(rental_unit=rental_unit, beds=2)
+        self.client.delete(detail_url(room.id))
+
+        rental_unit.refresh_from_db()
+        self.assertEqual((rental_unit.bedrooms, rental_unit.beds), (1, 1))
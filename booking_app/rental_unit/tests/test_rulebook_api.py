@@ -119,7 +119,7 @@ class PrivateRulebookApiTests(TestCase):
         rulebooks = Rulebook.objects.all().order_by('-rental_unit')
         serializer = RulebookSerializer(rulebooks, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
         
     def test_get_rulebook_detail(self):
         """test get rental unit detail"""
@@ -0,0 +1,871 @@
+"""
+tests for listing search API
+"""
+from datetime import date, timedelta
+from io import StringIO
+from decimal import Decimal
+import os
+import re
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import listing_documents, ranking
+from core import cache as listing_cache
+from core.models import (
+    UNIT_CHOICES,
+    RentalUnit,
+    Pricing,
+    Location,
+    Guidebook,
+    CalendarEvent,
+    AmenitiesList,
+    Reservation,
+    Room,
+    Fee,
+    ListingDocument,
+)
+from rental_unit import listing_index, reloading, search, similarity
+
+
+RENTAL_UNIT_URL = reverse('rental_unit:rentalunit-list')
+FACETS_URL = reverse('rental_unit:rentalunit-facets')
+# query counts are asserted without the queries of the database cache
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def similar_url(rental_unit_id):
+    """create and return a similar listings URL for a rental unit"""
+    return reverse('rental_unit:rentalunit-similar', args=[rental_unit_id])
+
+
+def create_rental_unit(user, night_price=None, city='', **params):
+    """create and return a rental unit object with a price and a location"""
+    defaults = {
+        'title': 'Title of property',
+        'description': 'A unique description of your home',
+        'unit_type': 'Apartment',
+        'status': True,
+        'max_guests': 2,
+    }
+    defaults.update(params)
+
+    rental_unit = RentalUnit.objects.create(user=user, **defaults)
+    if night_price is not None:
+        Pricing.objects.create(rental_unit=rental_unit, night_price=Decimal(night_price))
+    Location.objects.create(rental_unit=rental_unit, city=city, country='ESP')
+    return rental_unit
+
+
+def create_user(**params):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FacetsApiTests(TestCase):
+    """tests for search facets"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+
+    def test_facet_counts(self):
+        """test price, unit type and guest counts are returned"""
+        create_rental_unit(self.user, night_price='40.00', max_guests=1)
+        create_rental_unit(self.user, night_price='120.00', unit_type='House', max_guests=4)
+        create_rental_unit(self.user, night_price='950.00', unit_type='Villa', max_guests=12)
+
+        result = self.client.get(FACETS_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['total'], 3)
+        prices = {bucket['bucket']: bucket['count'] for bucket in result.data['price']}
+        self.assertEqual(prices['0-50'], 1)
+        self.assertEqual(prices['100-150'], 1)
+        self.assertEqual(prices['500+'], 1)
+        unit_types = {bucket['unit_type']: bucket['count'] for bucket in result.data['unit_type']}
+        self.assertEqual(unit_types['House'], 1)
+        self.assertEqual(unit_types['Hotel'], 0)
+        guests = {bucket['bucket']: bucket['count'] for bucket in result.data['guests']}
+        self.assertEqual(guests['1'], 1)
+        self.assertEqual(guests['4'], 1)
+        self.assertEqual(guests['8+'], 1)
+
+    def test_facets_follow_filters(self):
+        """test facets are computed for the current search filters"""
+        create_rental_unit(self.user, night_price='40.00', city='Madrid')
+        create_rental_unit(self.user, night_price='120.00', city='Sevilla')
+
+        result = self.client.get(FACETS_URL, {'city': 'madrid', 'max_price': '100'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['total'], 1)
+
+        result = self.client.get(RENTAL_UNIT_URL, {'city': 'madrid', 'max_price': '100'})
+
+        self.assertEqual(len(result.data['results']), 1)
+
+    def test_facets_single_query_and_cached(self):
+        """test facets are computed with one query and then served from the cache"""
+        create_rental_unit(self.user, night_price='40.00')
+
+        with self.assertNumQueries(1):
+            self.client.get(FACETS_URL, {'guests': '1'})
+        with self.assertNumQueries(0):
+            self.client.get(FACETS_URL, {'guests': '1'})
+
+    def test_facets_cache_invalidated(self):
+        """test changing a listing invalidates cached facets"""
+        create_rental_unit(self.user, night_price='40.00')
+        self.client.get(FACETS_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_rental_unit(self.user, night_price='60.00')
+        result = self.client.get(FACETS_URL)
+
+        self.assertEqual(result.data['total'], 2)
+
+    def test_facets_cache_kept_for_unsearchable_changes(self):
+        """test changing data that searches do not read keeps cached facets"""
+        rental_unit = create_rental_unit(self.user, night_price='40.00')
+        self.client.get(FACETS_URL)
+
+        Fee.objects.create(rental_unit=rental_unit, name='Pet', price=Decimal('20.00'))
+        with self.assertNumQueries(0):
+            result = self.client.get(FACETS_URL)
+
+        self.assertEqual(result.data['total'], 1)
+
+    def test_invalid_filter(self):
+        """test an invalid filter value returns an error"""
+        result = self.client.get(FACETS_URL, {'guests': 'many'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_status_and_owner_filters(self):
+        """test listings are filtered by status and owner"""
+        other = create_user(email='other@example.com', password='test1234', phone_number='+14155552671')
+        active = create_rental_unit(self.user)
+        create_rental_unit(self.user, status=False)
+        create_rental_unit(other)
+
+        result = self.client.get(RENTAL_UNIT_URL, {'status': 'true', 'owner': self.user.id})
+
+        self.assertEqual([unit['id'] for unit in result.data['results']], [active.id])
+        result = self.client.get(RENTAL_UNIT_URL, {'status': 'maybe'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_capacity_filters(self):
+        """test listings are filtered by their number of bedrooms, beds and baths"""
+        studio = create_rental_unit(self.user)
+        house = create_rental_unit(self.user)
+        Room.objects.create(rental_unit=studio, room_type='Bathroom (full)')
+        Room.objects.create(rental_unit=house, room_type='Bedroom', beds=2)
+        Room.objects.create(rental_unit=house, room_type='Bedroom', beds=1)
+        Room.objects.create(rental_unit=house, room_type='Bathroom (full)')
+        Room.objects.create(rental_unit=house, room_type='Bathroom (half)')
+
+        for params in ({'bedrooms': '2'}, {'beds': '3'}, {'baths': '1.5'}):
+            result = self.client.get(RENTAL_UNIT_URL, params)
+            self.assertEqual([unit['id'] for unit in result.data['results']], [house.id])
+        result = self.client.get(RENTAL_UNIT_URL, {'baths': '1.25'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FullTextSearchApiTests(TestCase):
+    """tests for keyword search of listings"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+
+    def search(self, q):
+        """return the ids of the listings found for keywords"""
+        result = self.client.get(RENTAL_UNIT_URL, {'q': q})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return [rental_unit['id'] for rental_unit in result.data['results']]
+
+    def test_search_listing_text(self):
+        """test keywords match the title, description, location and guidebook"""
+        beach = create_rental_unit(self.user, title='Beach house', city='Cadiz')
+        loft = create_rental_unit(self.user, description='Loft with a rooftop terrace')
+        Guidebook.objects.create(rental_unit=loft, house_manual='The fireplace needs firewood')
+
+        self.assertEqual(self.search('beach'), [beach.id])
+        self.assertEqual(self.search('cadiz'), [beach.id])
+        self.assertEqual(self.search('terraces'), [loft.id])
+        self.assertEqual(self.search('fireplace'), [loft.id])
+        self.assertEqual(self.search('castle'), [])
+
+    def test_search_vector_follows_changes(self):
+        """test the search vector is rebuilt when listing text changes"""
+        rental_unit = create_rental_unit(self.user, city='Madrid')
+        location = Location.objects.get(rental_unit=rental_unit)
+        location.city = 'Toledo'
+        location.save()
+
+        self.assertEqual(self.search('toledo'), [rental_unit.id])
+        self.assertEqual(self.search('madrid'), [])
+
+    def test_search_ranked(self):
+        """test title matches rank above description matches"""
+        in_description = create_rental_unit(self.user, description='Close to the lighthouse')
+        in_title = create_rental_unit(self.user, title='Lighthouse cottage')
+
+        self.assertEqual(self.search('lighthouse'), [in_title.id, in_description.id])
+
+    def test_search_combines_with_filters(self):
+        """test keywords combine with the other search filters"""
+        create_rental_unit(self.user, title='Garden flat', night_price='40.00')
+        expensive = create_rental_unit(self.user, title='Garden villa', night_price='400.00')
+
+        result = self.client.get(RENTAL_UNIT_URL, {'q': 'garden', 'min_price': '100'})
+
+        self.assertEqual([rental_unit['id'] for rental_unit in result.data['results']], [expensive.id])
+        self.assertNotIn('search_vector', result.data['results'][0])
+
+
+class GeoSearchApiTests(TestCase):
+    """tests for radius, bounding box and availability search"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.center = self.create_located_unit('40.416800', '-3.703800')
+        self.near = self.create_located_unit('40.443800', '-3.703800')
+        self.far = self.create_located_unit('41.387400', '2.168600')
+
+    def create_located_unit(self, latitude, longitude):
+        """create a rental unit at a coordinate"""
+        rental_unit = create_rental_unit(self.user)
+        location = Location.objects.get(rental_unit=rental_unit)
+        location.latitude = Decimal(latitude)
+        location.longitude = Decimal(longitude)
+        location.save()
+        return rental_unit
+
+    def search(self, **params):
+        """return the ids of the listings found for search parameters"""
+        result = self.client.get(RENTAL_UNIT_URL, params)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return [rental_unit['id'] for rental_unit in result.data['results']]
+
+    def test_geohash_saved(self):
+        """test locations store the geohash of their coordinates"""
+        location = Location.objects.get(rental_unit=self.center)
+
+        self.assertEqual(location.geohash, 'ezjmgtwuz')
+
+    def test_radius_search(self):
+        """test units within a radius are returned nearest first"""
+        self.assertEqual(
+            self.search(lat='40.4200', lng='-3.7038', radius='5'),
+            [self.center.id, self.near.id],
+        )
+        self.assertEqual(self.search(lat='40.4168', lng='-3.7038', radius='1'), [self.center.id])
+        self.assertEqual(self.search(lat='41.0', lng='-0.5', radius='300'), [self.far.id, self.near.id, self.center.id])
+
+    def test_bbox_search(self):
+        """test units inside a bounding box are returned"""
+        ids = self.search(bbox='40.0,-4.0,40.5,-3.5')
+
+        self.assertEqual(sorted(ids), sorted([self.center.id, self.near.id]))
+
+    def test_availability_search(self):
+        """test units with calendar events overlapping the dates are excluded"""
+        CalendarEvent.objects.create(
+            rental_unit=self.center,
+            reason='Reservation',
+            start_date=date(2030, 5, 1),
+            end_date=date(2030, 5, 5),
+        )
+
+        ids = self.search(lat='40.4168', lng='-3.7038', check_in='2030-05-04', check_out='2030-05-08')
+        self.assertEqual(ids, [self.near.id])
+
+        ids = self.search(lat='40.4168', lng='-3.7038', check_in='2030-05-05', check_out='2030-05-08')
+        self.assertEqual(ids, [self.center.id, self.near.id])
+
+    def test_invalid_geo_filters(self):
+        """test incomplete or invalid geo filters return an error"""
+        for params in (
+            {'lat': '40.4'},
+            {'lat': '91', 'lng': '0'},
+            {'lat': '40.4', 'lng': '-3.7', 'radius': '0'},
+            {'bbox': '40.5,-4.0,40.0,-3.5'},
+            {'check_in': '2030-05-04'},
+            {'check_in': '2030-05-04', 'check_out': '2030-05-01'},
+        ):
+            result = self.client.get(RENTAL_UNIT_URL, params)
+            self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class AmenitiesSearchApiTests(TestCase):
+    """tests for filtering listings by amenities"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+
+    def create_equipped_unit(self, **amenities):
+        """create a rental unit with amenities"""
+        rental_unit = create_rental_unit(self.user)
+        AmenitiesList.objects.create(rental_unit=rental_unit, **amenities)
+        return rental_unit
+
+    def test_amenities_filter(self):
+        """test only units with every requested amenity are returned"""
+        full = self.create_equipped_unit(
+            popular_wifi=True, popular_pool=True, parking_and_facilities_free_parking_on_premise=True
+        )
+        self.create_equipped_unit(popular_wifi=True, popular_pool=True)
+        self.create_equipped_unit(parking_and_facilities_free_parking_on_premise=True)
+        create_rental_unit(self.user)
+
+        result = self.client.get(RENTAL_UNIT_URL, {
+            'amenities': 'popular_wifi,popular_pool,parking_and_facilities_free_parking_on_premise'
+        })
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual([rental_unit['id'] for rental_unit in result.data['results']], [full.id])
+
+    def test_amenities_bits_follow_updates(self):
+        """test updated amenities are found by the filter"""
+        rental_unit = self.create_equipped_unit()
+        amenities_list = AmenitiesList.objects.get(rental_unit=rental_unit)
+        amenities_list.safety_security_cameras = True
+        amenities_list.save(update_fields=['safety_security_cameras'])
+
+        result = self.client.get(RENTAL_UNIT_URL, {'amenities': 'safety_security_cameras'})
+
+        self.assertEqual([rental_unit['id'] for rental_unit in result.data['results']], [rental_unit.id])
+
+    def test_unknown_amenity(self):
+        """test an unknown amenity returns an error"""
+        result = self.client.get(RENTAL_UNIT_URL, {'amenities': 'helipad'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarUnitsApiTests(TestCase):
+    """tests for similar listings"""
+
+    def setUp(self):
+        similarity.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.rental_unit = self.create_equipped_unit(
+            '100.00', popular_wifi=True, popular_pool=True, popular_kitchen=True
+        )
+
+    def tearDown(self):
+        reloading.join()
+        similarity.clear()
+
+    def create_equipped_unit(self, night_price, unit_type='Apartment', **amenities):
+        """create a priced rental unit with amenities"""
+        rental_unit = create_rental_unit(self.user, night_price=night_price, unit_type=unit_type)
+        AmenitiesList.objects.create(rental_unit=rental_unit, **amenities)
+        return rental_unit
+
+    def similar_ids(self, **params):
+        """return the ids of the similar listings of the rental unit"""
+        result = self.client.get(similar_url(self.rental_unit.id), params)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return [rental_unit['id'] for rental_unit in result.data]
+
+    def test_similar_units_ranked(self):
+        """test listings sharing more amenities, type and price rank first"""
+        same = self.create_equipped_unit('110.00', popular_wifi=True, popular_pool=True, popular_kitchen=True)
+        partial = self.create_equipped_unit('100.00', popular_wifi=True)
+        other_type = self.create_equipped_unit(
+            '100.00', unit_type='Villa', popular_wifi=True, popular_pool=True, popular_kitchen=True
+        )
+        create_rental_unit(self.user, night_price='100.00', status=False)
+        similarity.load()
+
+        result = self.client.get(similar_url(self.rental_unit.id))
+
+        self.assertEqual([unit['id'] for unit in result.data], [same.id, other_type.id, partial.id])
+        self.assertEqual(result.data[0]['similarity']['amenities'], 1.0)
+        self.assertAlmostEqual(result.data[2]['similarity']['amenities'], 1 / 3, places=3)
+
+    def test_similar_units_before_index_loaded(self):
+        """test listings of the same type closest in price are ranked until the index is loaded"""
+        same = self.create_equipped_unit('110.00', popular_wifi=True, popular_pool=True, popular_kitchen=True)
+        partial = self.create_equipped_unit('100.00', popular_wifi=True)
+        self.create_equipped_unit(
+            '100.00', unit_type='Villa', popular_wifi=True, popular_pool=True, popular_kitchen=True
+        )
+
+        self.assertEqual(self.similar_ids(), [same.id, partial.id])
+
+    def test_similar_units_limit(self):
+        """test the number of similar listings is limited"""
+        for _ in range(3):
+            self.create_equipped_unit('100.00', popular_wifi=True)
+
+        self.assertEqual(len(self.similar_ids(limit=2)), 2)
+
+        result = self.client.get(similar_url(self.rental_unit.id), {'limit': '0'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similarity_index_refreshed(self):
+        """test the loaded index is refreshed when amenities change"""
+        other = self.create_equipped_unit('100.00')
+        similarity.load()
+        self.assertEqual(self.similar_ids(), [other.id])
+        self.assertEqual(similarity.similar_units(self.rental_unit.id)[0].amenities, 0)
+
+        amenities_list = AmenitiesList.objects.get(rental_unit=other)
+        amenities_list.popular_wifi = True
+        with self.captureOnCommitCallbacks(execute=True):
+            amenities_list.save()
+
+        self.assertAlmostEqual(similarity.similar_units(self.rental_unit.id)[0].amenities, 1 / 3, places=3)
+
+    def test_similarity_rows_reused(self):
+        """test the rows of deactivated units are rewritten in place by new units"""
+        other = self.create_equipped_unit('100.00')
+        similarity.load()
+        self.assertEqual(self.similar_ids(), [other.id])
+        size = similarity._index.size
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.status = False
+            other.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            replacement = self.create_equipped_unit('100.00', popular_wifi=True)
+
+        self.assertEqual(self.similar_ids(), [replacement.id])
+        self.assertEqual(similarity._index.size, size)
+
+    def test_queries_keep_their_arrays(self):
+        """test refreshing a row leaves the arrays a running query holds unchanged"""
+        other = self.create_equipped_unit('100.00')
+        similarity.load()
+        features = similarity._index.features
+        prices = features.prices.copy()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pricing.objects.filter(rental_unit=other).update(night_price=Decimal('250.00'))
+            other.save()
+
+        self.assertIsNot(similarity._index.features, features)
+        np.testing.assert_array_equal(features.prices, prices)
+
+
+class SimilarityIndexReloadTests(TransactionTestCase):
+    """tests for reloading the similar listings index"""
+
+    def setUp(self):
+        similarity.clear()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.rental_unit = create_rental_unit(self.user, night_price='100.00')
+
+    def tearDown(self):
+        reloading.join()
+        similarity.clear()
+
+    def test_index_loaded_in_background(self):
+        """test the database answers until the index is loaded"""
+        other = create_rental_unit(self.user, night_price='100.00')
+
+        similar = similarity.similar_units(self.rental_unit.id)
+
+        self.assertEqual([item.rental_unit_id for item in similar], [other.id])
+        reloading.join()
+        self.assertIn(other.id, similarity._index.rows)
+
+    def test_expired_index_reloaded_in_background(self):
+        """test an expired index keeps answering while it is reloaded"""
+        other = create_rental_unit(self.user, night_price='100.00')
+        similarity.load()
+        # a change the signals do not see, only a reload picks it up
+        RentalUnit.objects.filter(id=other.id).update(status=False)
+        similarity._loaded_at -= similarity.INDEX_TIMEOUT + 1
+
+        similar = similarity.similar_units(self.rental_unit.id)
+
+        self.assertEqual([item.rental_unit_id for item in similar], [other.id])
+        reloading.join()
+        self.assertEqual(similarity.similar_units(self.rental_unit.id), [])
+
+
+@override_settings(LISTING_INDEX_ENABLED=True, LISTING_INDEX_SNAPSHOT='')
+class ListingIndexTests(TestCase):
+    """tests for the in process listing search index"""
+
+    def setUp(self):
+        listing_index.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.cheap = create_rental_unit(self.user, '50.00', title='Cosy beach flat', max_guests=2)
+        self.villa = create_rental_unit(
+            self.user, '300.00', title='Villa with pool', unit_type='Villa', max_guests=8
+        )
+        AmenitiesList.objects.create(rental_unit=self.villa, popular_pool=True, popular_wifi=True)
+        create_rental_unit(self.user, title='Unpriced house', unit_type='House')
+        CalendarEvent.objects.create(
+            rental_unit=self.cheap, reason='Reservation',
+            start_date=date.today(), end_date=date.fromordinal(date.today().toordinal() + 3),
+        )
+
+    def tearDown(self):
+        reloading.join()
+        listing_index.clear()
+
+    def assertMatchesDatabase(self, index, **params):
+        """assert the index finds the same rental units as the database for search parameters"""
+        filters = search.parse_filters(params)
+        expected = search.filter_rental_units(RentalUnit.objects.all(), filters).values_list('id', flat=True)
+        self.assertEqual(sorted(index.search(filters)), sorted(expected))
+
+    def test_search_matches_database(self):
+        """test every filter of the index agrees with the database"""
+        index = listing_index.ListingIndex.build()
+        check_in = date.fromordinal(date.today().toordinal() + 1).isoformat()
+        check_out = date.fromordinal(date.today().toordinal() + 5).isoformat()
+
+        self.assertMatchesDatabase(index, min_price='100')
+        self.assertMatchesDatabase(index, max_price='100')
+        self.assertMatchesDatabase(index, guests='4')
+        self.assertMatchesDatabase(index, unit_type='villa')
+        self.assertMatchesDatabase(index, amenities='popular_pool,popular_wifi')
+        self.assertMatchesDatabase(index, q='pool')
+        self.assertMatchesDatabase(index, q='Pools')
+        self.assertMatchesDatabase(index, q='the')
+        self.assertMatchesDatabase(index, check_in=check_in, check_out=check_out)
+        self.assertEqual(index.search(search.parse_filters({'q': 'beach flat'})), [self.cheap.id])
+        self.assertEqual(index.search(search.parse_filters({'q': 'cosy beaches'})), [self.cheap.id])
+        # alternatives and exclusions are left to the database
+        self.assertIsNone(index.search(search.parse_filters({'q': 'villa or flat'})))
+        self.assertIsNone(index.search(search.parse_filters({'q': 'villa -pool'})))
+
+    def test_event_ending_before_start(self):
+        """test an event ending before it starts books no day of the index"""
+        today = date.today()
+        CalendarEvent.objects.create(
+            rental_unit=self.villa, reason='Blocked',
+            start_date=today + timedelta(days=5), end_date=today + timedelta(days=2),
+        )
+
+        index = listing_index.ListingIndex.build()
+
+        filters = search.parse_filters({
+            'unit_type': 'villa',
+            'check_in': (today + timedelta(days=3)).isoformat(),
+            'check_out': (today + timedelta(days=4)).isoformat(),
+        })
+        self.assertEqual(index.search(filters), [self.villa.id])
+
+    def test_snapshot(self):
+        """test a saved snapshot is memory mapped with the same contents"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'listings.idx')
+            built = listing_index.ListingIndex.build()
+            built.save(path)
+            index = listing_index.ListingIndex.open(path)
+
+            self.assertEqual(list(index.arrays['ids']), list(built.arrays['ids']))
+            self.assertEqual(index.start, built.start)
+            for params in ({'q': 'pool'}, {'max_price': '100'}, {'amenities': 'popular_wifi'}):
+                filters = search.parse_filters(params)
+                self.assertEqual(index.search(filters), built.search(filters))
+
+    def test_snapshot_catches_up(self):
+        """test a snapshot applies the rental units changed since it was built"""
+        index = listing_index.ListingIndex.build()
+        Pricing.objects.filter(rental_unit=self.villa).get().delete()
+
+        index = index.caught_up()
+
+        self.assertEqual(index.search(search.parse_filters({'min_price': '100'})), [])
+
+    def test_changes_applied(self):
+        """test created and deleted rental units are applied to the loaded index"""
+        listing_index.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            added = create_rental_unit(self.user, '400.00', title='Penthouse')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.villa.delete()
+
+        result = self.client.get(RENTAL_UNIT_URL, {'min_price': '100'})
+
+        self.assertEqual([unit['id'] for unit in result.data['results']], [added.id])
+
+    def test_changes_of_other_processes_applied(self):
+        """test changes committed by another process are applied once the listing cache generations move"""
+        listing_index.load()
+        filters = search.parse_filters({'max_price': '100'})
+        # a change made in another process, whose signals only move the shared generations
+        ListingDocument.objects.filter(rental_unit=self.cheap).update(
+            night_price=Decimal('150.00'), updated=timezone.now()
+        )
+        self.assertEqual(listing_index.search(filters), [self.cheap.id])
+
+        listing_cache.bump_generations([listing_cache.SEARCH])
+
+        self.assertEqual(listing_index.search(filters), [])
+
+    def test_pages_read_by_id(self):
+        """test a search answered by the index reads only the rows of the requested page"""
+        added = [create_rental_unit(self.user, '80.00') for _ in range(3)]
+        listing_index.load()
+        expected = sorted([self.cheap.id, self.villa.id] + [unit.id for unit in added], reverse=True)
+
+        pages = []
+        url = RENTAL_UNIT_URL + '?max_price=1000&page_size=1'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                result = self.client.get(url)
+            listed = [query['sql'] for query in queries if 'FROM "core_rentalunit"' in query['sql']]
+            self.assertLessEqual(len(re.search(r'"id" IN \(([^)]*)\)', listed[0]).group(1).split(',')), 2)
+            pages.append(result)
+            url = result.data['next']
+        result = self.client.get(pages[-1].data['previous'])
+
+        self.assertEqual([page.data['results'][0]['id'] for page in pages[:-1]], expected[:-1])
+        self.assertEqual([unit['id'] for unit in pages[-1].data['results']], expected[-1:])
+        self.assertEqual([unit['id'] for unit in result.data['results']], expected[-2:-1])
+
+    def test_unselective_searches_use_database(self):
+        """test searches without filters or with many matches are left to the database"""
+        listing_index.load()
+        filters = search.parse_filters({'max_price': '1000'})
+        self.assertEqual(sorted(listing_index.search(filters)), sorted([self.cheap.id, self.villa.id]))
+
+        self.assertIsNone(listing_index.search({}))
+        with patch.object(listing_index, 'MAX_MATCHES', 1):
+            self.assertIsNone(listing_index.search(filters))
+
+    def test_unsupported_filters(self):
+        """test filters the index cannot answer fall back to the database"""
+        self.assertIsNone(listing_index.search(search.parse_filters({'city': 'cadiz'})))
+        self.assertIsNone(listing_index.search(search.parse_filters({
+            'check_in': '2000-01-01', 'check_out': '2000-01-03',
+        })))
+
+
+@override_settings(LISTING_INDEX_ENABLED=True, LISTING_INDEX_SNAPSHOT='')
+class ListingIndexReloadTests(TransactionTestCase):
+    """tests for loading the listing search index off the request path"""
+
+    def setUp(self):
+        listing_index.clear()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.rental_unit = create_rental_unit(self.user, '50.00')
+
+    def tearDown(self):
+        reloading.join()
+        listing_index.clear()
+
+    def test_index_loaded_in_background(self):
+        """test searches fall back to the database until the index is loaded"""
+        filters = search.parse_filters({'max_price': '100'})
+
+        self.assertIsNone(listing_index.search(filters))
+        reloading.join()
+        self.assertEqual(listing_index.search(filters), [self.rental_unit.id])
+
+    def test_expired_index_reloaded_in_background(self):
+        """test an expired index keeps answering while it is reloaded"""
+        filters = search.parse_filters({'max_price': '100'})
+        listing_index.load()
+        # a change the signals do not see, only a reload picks it up
+        ListingDocument.objects.filter(rental_unit=self.rental_unit).update(night_price=Decimal('150.00'))
+        listing_index._loaded_at -= listing_index.INDEX_TIMEOUT + 1
+
+        self.assertEqual(listing_index.search(filters), [self.rental_unit.id])
+        reloading.join()
+        self.assertEqual(listing_index.search(filters), [])
+
+
+class SearchIndexUsageTests(TestCase):
+    """tests that search filters are answered by indexes"""
+
+    def setUp(self):
+        self.user = create_user(email='test@example.com', password='test1234')
+        other = create_user(email='other@example.com', password='test1234', phone_number='+14155552671')
+        units = RentalUnit.objects.bulk_create([
+            RentalUnit(
+                user=other,
+                unit_type=UNIT_CHOICES[index % len(UNIT_CHOICES)][0],
+                status=index % 50 != 0,
+                max_guests=index % 30 + 1,
+            )
+            for index in range(500)
+        ])
+        Location.objects.bulk_create([
+            Location(rental_unit=unit, city=f'city {index % 100}', country=f'c{index % 100}')
+            for index, unit in enumerate(units)
+        ])
+        Pricing.objects.bulk_create([
+            Pricing(rental_unit=unit, night_price=Decimal(index)) for index, unit in enumerate(units)
+        ])
+        listing_documents.rebuild_documents([unit.id for unit in units])
+        create_rental_unit(self.user, '80.00', city='Cadiz')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_listingdocument')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def plan(self, **params):
+        """return the query plan of the rental units matching search parameters"""
+        filters = search.parse_filters(params)
+        return search.filter_rental_units(RentalUnit.objects.all(), filters).explain()
+
+    def test_filters_use_indexes(self):
+        """test every filter of the listing document is an index condition"""
+        cases = (
+            ({'unit_type': 'villa'}, 'unit_type'),
+            ({'guests': '30'}, 'max_guests'),
+            ({'status': 'false'}, 'status'),
+            ({'owner': str(self.user.id)}, 'user_id'),
+            ({'city': 'cadiz'}, 'city'),
+            ({'country': 'esp'}, 'country'),
+            ({'min_price': '490'}, 'night_price'),
+            ({'max_price': '10'}, 'night_price'),
+        )
+        for params, column in cases:
+            with self.subTest(params=params):
+                plan = self.plan(**params)
+                self.assertNotIn('Seq Scan on core_listingdocument', plan)
+                self.assertTrue(
+                    any('Index Cond' in line and column in line for line in plan.splitlines()),
+                    plan,
+                )
+
+
+class OrderingApiTests(TestCase):
+    """tests for sorting listings"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='test1234')
+        self.cheap = create_rental_unit(self.user, '50.00')
+        self.expensive = create_rental_unit(self.user, '300.00')
+        self.middle = create_rental_unit(self.user, '120.00')
+        self.unpriced = create_rental_unit(self.user)
+
+    def ordered_ids(self, ordering, **params):
+        """return the ids of the listings sorted by an ordering"""
+        result = self.client.get(RENTAL_UNIT_URL, {'ordering': ordering, **params})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return [rental_unit['id'] for rental_unit in result.data['results']]
+
+    def test_order_by_price(self):
+        """test listings are sorted by night price across cursor pages"""
+        result = self.client.get(RENTAL_UNIT_URL, {'ordering': 'price', 'page_size': 2})
+        ids = [rental_unit['id'] for rental_unit in result.data['results']]
+        result = self.client.get(result.data['next'])
+        ids += [rental_unit['id'] for rental_unit in result.data['results']]
+
+        self.assertEqual(ids, [self.cheap.id, self.middle.id, self.expensive.id])
+        self.assertIsNone(result.data['next'])
+
+    def test_order_by_popularity(self):
+        """test listings are sorted by the precomputed popularity of their reservations and views"""
+        today = date.today()
+        Reservation.objects.create(
+            rental_unit=self.middle, user=self.user,
+            check_in=today, check_out=today + timedelta(days=2),
+        )
+        for _ in range(3):
+            self.client.get(reverse('rental_unit:rentalunit-detail', args=[self.cheap.id]))
+
+        self.assertEqual(self.ordered_ids('popular')[0], self.unpriced.id)
+        call_command('update_listing_scores', stdout=StringIO())
+
+        self.assertEqual(self.ordered_ids('popular')[:2], [self.middle.id, self.cheap.id])
+        self.assertEqual(self.ordered_ids('recommended')[:2], [self.middle.id, self.cheap.id])
+
+    def test_views_flushed_by_score_updates(self):
+        """test listing views are buffered in the cache and written once by the score update"""
+        for _ in range(2):
+            self.client.get(reverse('rental_unit:rentalunit-listing', args=[self.cheap.id]))
+        document = ListingDocument.objects.get(rental_unit=self.cheap)
+        self.assertEqual(document.view_count, 0)
+
+        call_command('update_listing_scores', stdout=StringIO())
+        document.refresh_from_db()
+        self.assertEqual(document.view_count, 2)
+
+        call_command('update_listing_scores', stdout=StringIO())
+        document.refresh_from_db()
+        self.assertAlmostEqual(document.view_count, 2 * ranking.VIEW_DECAY)
+
+    def test_ties_paged_by_id(self):
+        """test a run of equal scores is paged by id forwards and backwards"""
+        pages = []
+        url = RENTAL_UNIT_URL + '?ordering=popular&page_size=1'
+        while url:
+            result = self.client.get(url)
+            pages.append(result)
+            url = result.data['next']
+        ids = [page.data['results'][0]['id'] for page in pages]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 4)
+
+        result = self.client.get(pages[-1].data['previous'])
+
+        self.assertEqual([unit['id'] for unit in result.data['results']], ids[-2:-1])
+        self.assertIsNotNone(result.data['next'])
+
+    def test_keyword_rank_ties_paged(self):
+        """test listings of equal keyword rank are all paged"""
+        units = [create_rental_unit(self.user, title='Pool house') for _ in range(3)]
+
+        ids = []
+        url = RENTAL_UNIT_URL + '?q=pool&page_size=1'
+        # a position read back inexactly would serve the same page forever
+        while url and len(ids) <= len(units):
+            result = self.client.get(url)
+            ids.extend(unit['id'] for unit in result.data['results'])
+            url = result.data['next']
+
+        self.assertEqual(ids, sorted((unit.id for unit in units), reverse=True))
+
+    def test_scores_kept_on_listing_changes(self):
+        """test saving a listing keeps its precomputed scores"""
+        self.client.get(reverse('rental_unit:rentalunit-detail', args=[self.expensive.id]))
+        call_command('update_listing_scores', stdout=StringIO())
+
+        self.expensive.title = 'Renamed'
+        self.expensive.save()
+
+        self.assertEqual(self.ordered_ids('popular')[0], self.expensive.id)
+
+    def test_order_by_distance(self):
+        """test sorting by distance requires a point"""
+        result = self.client.get(RENTAL_UNIT_URL, {'ordering': 'distance'})
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ids = self.ordered_ids('distance', lat='0', lng='0', radius='10')
+        self.assertEqual(len(ids), 4)
+
+    def test_invalid_ordering(self):
+        """test an unknown ordering returns an error"""
+        result = self.client.get(RENTAL_UNIT_URL, {'ordering': 'title'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
@@ -1,7 +1,10 @@
 """
 views for the rental unit api
 """
-from django.contrib.auth import get_user_model
+from datetime import date, datetime
+
+from django.utils.cache import patch_cache_control
+from django.core.cache import cache
 
 from rest_framework import viewsets, mixins
 from rest_framework import serializers as drf_serializers
@@ -26,17 +29,21 @@ from core.models import (
     Reservation,
     CancellationRequest,
     ChangeRequest,
-    Photo
+    Photo,
+    CALENDAR_EVENT_START,
 )
-from rental_unit import serializers
+from core import cancellation, fulltext, ranking
+from core.cache import listing_cache_key, rental_unit_scope, DEFAULT_TIMEOUT, CALENDAR, PLACES, SEARCH
+from rental_unit import autocomplete, serializers, listing_index, search, similarity
+from rental_unit.bulk_cancellation import cancel_reservations
+from rental_unit.dashboard import host_dashboard, DASHBOARD_TIMEOUT
+from rental_unit.policy_analytics import policy_what_if
 
 
 ### HELPER FUNCTIONS ###
 def get_rental_units_of_user(user):
-    user = get_user_model().objects.get(user=user)
-    rental_units_of_user = RentalUnit.objects.filter(user=user)
-    
-    return [i for i in rental_units_of_user]
+    """return the rental units owned by a user"""
+    return RentalUnit.objects.filter(user=user)
 
 class RentalUnitViewSet(viewsets.ModelViewSet):
     """view for manage the RentalUnit for the rental unit APIs"""
@@ -47,7 +54,31 @@ class RentalUnitViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve RentalUnit for authenticated users"""
-        return self.queryset.all().order_by('-id')
+        queryset = self.queryset.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.get_serializer_class().narrow_queryset(queryset, self.request.query_params)
+        if self.action == 'listing':
+            queryset = queryset.select_related(
+                'amenitieslist', 'location', 'pricing', 'availability', 'rulebook', 'guidebook'
+            ).prefetch_related('room_set', 'fee_set', 'place_set', 'photo_set')
+        if self.action in ('list', 'facets'):
+            filters = search.parse_filters(self.request.query_params)
+            ordering = search.parse_ordering(self.request.query_params, filters)
+            ids = listing_index.search(filters)
+            if ids is None:
+                queryset = search.filter_rental_units(queryset, filters)
+            else:
+                if self.action == 'list' and ordering is None and 'q' not in filters:
+                    # ordered by id, only the rows of the requested page are read
+                    ids = self.paginator.page_ids(self.request, ids)
+                queryset = queryset.filter(id__in=ids)
+            if ordering is not None and self.action == 'list':
+                return search.order_rental_units(queryset, ordering)
+            if 'q' in filters and self.action == 'list':
+                return fulltext.rank(queryset, filters['q']).order_by('-rank', '-id')
+            if 'lat' in filters and self.action == 'list':
+                return queryset.order_by('distance', '-id')
+        return queryset.order_by('-id')
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -55,8 +86,122 @@ class RentalUnitViewSet(viewsets.ModelViewSet):
             return serializers.RentalUnitSerializer
         elif self.action == 'upload_image':
             return serializers.RentalUnitImageSerializer
+        elif self.action == 'cancel_reservations':
+            return serializers.BulkCancellationSerializer
         return self.serializer_class
 
+    def retrieve(self, request, *args, **kwargs):
+        """retrieve a rental unit, counting a view of its listing"""
+        retrieved = super().retrieve(request, *args, **kwargs)
+        ranking.record_view(int(kwargs['pk']))
+        
+        return retrieved
+
+    @action(methods=['POST'], detail=True, url_path='cancel-reservations')
+    def cancel_reservations(self, request, pk=None):
+        """cancel and refund every active reservation of a rental unit in a date range"""
+        if request.user.is_staff == False:
+            raise drf_serializers.ValidationError(
+                'Not authorized to cancel reservations'
+            )
+        rental_unit = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = cancel_reservations(rental_unit, **serializer.validated_data)
+        
+        return Response({
+            'cancelled': [reservation.id for reservation in result.reservations],
+            'refunded': result.refunded,
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False, url_path='facets')
+    def facets(self, request):
+        """price histogram, unit type and guest capacity counts for the current search filters"""
+        filters = search.parse_filters(request.query_params)
+        scopes = (SEARCH, CALENDAR) if 'check_in' in filters else (SEARCH,)
+        key = listing_cache_key('facets', filters, scopes)
+        facets = cache.get(key)
+        if facets is None:
+            facets = search.facet_counts(self.get_queryset())
+            cache.set(key, facets, DEFAULT_TIMEOUT)
+        
+        return Response(facets, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True, url_path='nearby-places')
+    def nearby_places(self, request, pk=None):
+        """places of interest near a rental unit, including the ones entered for other units"""
+        filters = search.parse_places_filters(request.query_params)
+        key = listing_cache_key(f'nearby-places:{pk}', filters, (rental_unit_scope(pk), PLACES))
+        places = cache.get(key)
+        if places is None:
+            rental_unit = self.get_object()
+            try:
+                location = Location.objects.get(rental_unit=rental_unit)
+            except Location.DoesNotExist:
+                raise drf_serializers.ValidationError('This rental unit has no location')
+            places = search.nearby_places(location, **filters)
+            cache.set(key, places, DEFAULT_TIMEOUT)
+        
+        return Response(places, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False, url_path='dashboard', permission_classes=[permissions.IsAuthenticated])
+    def dashboard(self, request):
+        """reservation, occupancy and revenue stats of the rental units of the user"""
+        key = f'dashboard:{request.user.id}'
+        stats = cache.get(key)
+        if stats is None:
+            stats = host_dashboard(get_rental_units_of_user(request.user))
+            cache.set(key, stats, DASHBOARD_TIMEOUT)
+        
+        return Response(stats, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True, url_path='listing')
+    def listing(self, request, pk=None):
+        """the rental unit with every table of its listing page"""
+        key = listing_cache_key(f'listing:{pk}', scopes=(rental_unit_scope(pk),))
+        listing = cache.get(key)
+        if listing is None:
+            rental_unit = self.get_object()
+            listing = serializers.ListingSerializer(
+                rental_unit, context=self.get_serializer_context()
+            ).data
+            cache.set(key, listing, DEFAULT_TIMEOUT)
+        ranking.record_view(int(pk))
+        
+        return Response(listing, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        """other listings ranked by similarity of amenities, unit type, price and distance"""
+        rental_unit = self.get_object()
+        limit = request.query_params.get('limit', similarity.DEFAULT_LIMIT)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise drf_serializers.ValidationError({'limit': f'Invalid value: {limit}'})
+        if not 1 <= limit <= similarity.MAX_LIMIT:
+            raise drf_serializers.ValidationError({'limit': f'Invalid value: {limit}'})
+        
+        similar = similarity.similar_units(rental_unit.id, limit)
+        rental_units = RentalUnit.objects.in_bulk([item.rental_unit_id for item in similar])
+        
+        results = []
+        for item in similar:
+            if item.rental_unit_id not in rental_units:
+                continue
+            data = serializers.RentalUnitSerializer(
+                rental_units[item.rental_unit_id], context=self.get_serializer_context()
+            ).data
+            data['similarity'] = {
+                'score': item.score,
+                'amenities': item.amenities,
+                'distance': item.distance,
+            }
+            results.append(data)
+        
+        return Response(results, status=status.HTTP_200_OK)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         rental_unit = self.get_object()
@@ -125,13 +270,19 @@ class AmenitiesListViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve amenities list for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')
+        return self.queryset.all().order_by('-rental_unit_id')
     
     def get_serializer_class(self):
         """returns serializer class for request"""
         if self.action == 'list':
             return serializers.AmenitiesListSerializer
         return self.serializer_class
+    
+    def get_serializer_context(self):
+        """pass the requested representation of amenities to the serializer"""
+        context = super().get_serializer_context()
+        context['representation'] = self.request.query_params.get('representation')
+        return context
 
     
 class LocationViewSet(viewsets.ModelViewSet):
@@ -143,7 +294,7 @@ class LocationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve locations for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-rental_unit_id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -151,6 +302,34 @@ class LocationViewSet(viewsets.ModelViewSet):
             return serializers.LocationSerializer
         return self.serializer_class
     
+    @action(methods=['GET'], detail=False, url_path='clusters')
+    def clusters(self, request):
+        """map clusters of the locations in a viewport for a zoom level"""
+        viewport = search.parse_viewport(request.query_params)
+        key = listing_cache_key('clusters', viewport)
+        clusters = cache.get(key)
+        if clusters is None:
+            clusters = search.cluster_locations(Location.objects.all(), viewport['bbox'], viewport['zoom'])
+            cache.set(key, clusters, DEFAULT_TIMEOUT)
+        
+        return Response(clusters, status=status.HTTP_200_OK)
+    
+    @action(methods=['GET'], detail=False, url_path='autocomplete')
+    def autocomplete(self, request):
+        """cities, countries and places starting with the typed text, most used first"""
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            raise drf_serializers.ValidationError({'q': 'This parameter is required.'})
+        limit = request.query_params.get('limit', autocomplete.DEFAULT_LIMIT)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise drf_serializers.ValidationError({'limit': f'Invalid value: {limit}'})
+        if not 1 <= limit <= autocomplete.MAX_LIMIT:
+            raise drf_serializers.ValidationError({'limit': f'Invalid value: {limit}'})
+        
+        return Response(autocomplete.suggest(prefix, limit), status=status.HTTP_200_OK)
+    
     
 class RoomViewSet(viewsets.ModelViewSet):
     """view for manage the Room for the rental unit APIs"""
@@ -161,7 +340,7 @@ class RoomViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve locations for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -179,7 +358,7 @@ class PricingViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve Pricing for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-rental_unit_id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -197,7 +376,7 @@ class FeeViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve Fee for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -215,7 +394,7 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve Availability for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-rental_unit_id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -233,7 +412,7 @@ class CalendarEventViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve CalendarEvent for authenticated users"""
-        return self.queryset.all().order_by('-start_date')   
+        return self.queryset.annotate(start=CALENDAR_EVENT_START).order_by('-start', '-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -251,7 +430,7 @@ class RulebookViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve Rulebook for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-rental_unit_id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -269,7 +448,7 @@ class GuidebookViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve Guidebook for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit')   
+        return self.queryset.all().order_by('-rental_unit_id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -287,7 +466,7 @@ class PlaceViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """retrieve places for authenticated users"""
-        return self.queryset.all().order_by('-rental_unit') 
+        return self.queryset.all().order_by('-id') 
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -347,8 +526,8 @@ class ReservationRequestViewSet(viewsets.ModelViewSet):
         """retrieve Reservation request for authenticated users"""
         user = self.request.user
         if user.is_staff == True:
-            return self.queryset.all().order_by('-check_in')
-        return self.queryset.filter(user=user.id).order_by('-check_in')   
+            return self.queryset.all().order_by('-check_in', '-id')
+        return self.queryset.filter(user=user.id).order_by('-check_in', '-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -389,7 +568,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # if user.is_staff == True:
         #     return self.queryset.all().order_by('-check_in')
-        return self.queryset.filter(user=user.id).order_by('-check_in')   
+        queryset = self.queryset.filter(user=user.id)
+        if self.action == 'refund_preview':
+            queryset = queryset.select_related('rental_unit__rulebook')
+        return queryset.order_by('-check_in', '-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -397,6 +579,34 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return serializers.ReservationSerializer
         return self.serializer_class
     
+    @action(methods=['GET'], detail=True, url_path='refund-preview')
+    def refund_preview(self, request, pk=None):
+        """preview the refund of a reservation if it were cancelled on a date, without cancelling it"""
+        reservation = self.get_object()
+        try:
+            cancellation_date = date.fromisoformat(request.query_params['date'])
+        except KeyError:
+            cancellation_date = datetime.now().date()
+        except ValueError:
+            raise drf_serializers.ValidationError({'date': 'Enter a date as YYYY-MM-DD.'})
+        try:
+            policy = reservation.rental_unit.rulebook.cancellation_policy
+        except (Rulebook.DoesNotExist, AttributeError):
+            raise drf_serializers.ValidationError('Error: this rental unit has no cancellation policy')
+        
+        preview = cancellation.preview_refund(reservation, policy, cancellation_date)
+        refund_preview = Response({
+            'reservation': reservation.id,
+            'date': cancellation_date,
+            'policy': preview.policy,
+            'days_before_check_in': preview.days_before_check_in,
+            'refund': preview.refund,
+            'amount': preview.amount,
+        }, status=status.HTTP_200_OK)
+        patch_cache_control(refund_preview, private=True, max_age=300)
+        
+        return refund_preview
+    
     
 class CancellationRequestViewSet(viewsets.ModelViewSet):
     """view for manage the cancellation request for the rental unit APIs"""
@@ -410,7 +620,7 @@ class CancellationRequestViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # if user.is_staff == True:
         #     return self.queryset.all().order_by('-check_in')
-        return self.queryset.filter(user=user).order_by('-creation_date')   
+        return self.queryset.filter(user=user).order_by('-creation_date', '-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""
@@ -436,6 +646,30 @@ class CancellationRequestViewSet(viewsets.ModelViewSet):
             )
         else:
             instance.delete()
+    
+    @action(methods=['GET'], detail=False, url_path='what-if')
+    def what_if(self, request):
+        """compare past refunds with the refunds under another cancellation policy"""
+        if request.user.is_staff == False:
+            raise drf_serializers.ValidationError(
+                'Not authorized to analyze cancellation policies'
+            )
+        params = {key: request.query_params.get(key) for key in ('policy', 'start_date', 'end_date', 'owner')}
+        params = {key: value for key, value in params.items() if value is not None}
+        if request.query_params.get('rental_unit'):
+            params['rental_unit'] = request.query_params.get('rental_unit').split(',')
+        serializer = serializers.PolicyWhatIfSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        result = policy_what_if(
+            data['policy'],
+            data['start_date'],
+            data['end_date'],
+            rental_units=data.get('rental_unit'),
+            owner=data.get('owner'),
+        )
+        return Response(result, status=status.HTTP_200_OK)
             
             
 class ChangeRequestViewSet(viewsets.ModelViewSet):
@@ -450,7 +684,7 @@ class ChangeRequestViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # if user.is_staff == True:
         #     return self.queryset.all().order_by('-check_in')
-        return self.queryset.filter(user=user).order_by('-creation_date')   
+        return self.queryset.filter(user=user).order_by('-creation_date', '-id')   
     
     def get_serializer_class(self):
         """returns serializer class for request"""